@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 {
     'name': 'Institute CRM',
-    'version': '17.0.1.0.0',
+    'version': '17.0.1.1.0',
     'category': 'CRM/Education',
     'summary': 'Simplified CRM system for educational institutes',
     'description': """
@@ -29,6 +29,7 @@
         'security/ir.model.access.csv',
         # 'data/crm_stage_data.xml',  # Commented out to prevent duplicate stages on upgrade
         'data/crm_actions.xml',
+        'data/ir_cron_data.xml',
         'views/institute_crm_views.xml',
         'views/institute_crm_report_views.xml',
         'views/admission_report_wizard_views.xml',
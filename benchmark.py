@@ -0,0 +1,518 @@
+# -*- coding: utf-8 -*-
+"""Benchmark of the institute_crm hot paths.
+
+Fills a scratch database with synthetic officers, sources, stages, courses,
+leads (with realistic and shared family phone numbers), activities,
+completed activities (messages and ledger rows) and, when Student Management is installed,
+students. The database is grown to each requested lead count in turn, and
+at every size the script times:
+
+* get_dashboard_data, as a salesperson and as a manager (month and all time)
+* _check_duplicate_phones on a sample of existing leads
+* create and write of leads, including the follow-up activity scheduling
+* the crm.lead.report.institute view and its refresh
+* the campus wise and officer detailed QWeb reports (rendered as HTML)
+
+The results are written as JSON, to compare runs before and after an
+upgrade. The generated data is committed: NEVER run this on a production
+database. Run it through the Odoo shell of a scratch database::
+
+    BENCH_DATABASE=crm_bench BENCH_SIZES=10000,100000,1000000 \\
+        odoo-bin shell -d crm_bench --no-http < benchmark.py
+
+Settings, as environment variables:
+
+* BENCH_DATABASE: name of the database, required as a safety check
+* BENCH_SIZES: lead counts to benchmark (default 10000,100000,1000000)
+* BENCH_OFFICERS: number of admission officers (default 20)
+* BENCH_SOURCES: number of lead sources (default 8)
+* BENCH_COURSES: number of courses (default 6)
+* BENCH_DAYS: history covered by the leads, in days (default 730)
+* BENCH_ACTIVITY_RATIO: open activities per open lead (default 0.3)
+* BENCH_MESSAGE_RATIO: completed-activity messages per lead (default 1.0)
+* BENCH_STUDENT_RATIO: students per won lead (default 1.0)
+* BENCH_FAMILY_SHARE: share of leads reusing a family number (default 0.15)
+* BENCH_BATCH: leads created or written by the create/write cases (default 100)
+* BENCH_SAMPLE: leads checked by the duplicate check case (default 1000)
+* BENCH_REPEAT: runs of every case (default 3)
+* BENCH_SEED: random seed (default 42)
+* BENCH_OUTPUT: path of the JSON report (default institute_crm_benchmark.json)
+"""
+
+import json
+import logging
+import os
+import random
+import statistics
+import threading
+import time
+from datetime import datetime, timedelta
+
+from psycopg2.extras import execute_values
+
+import odoo
+from odoo import fields
+from odoo.exceptions import ValidationError
+from odoo.addons.institute_crm.models.crm_lead_institute import normalize_phone_key
+
+_logger = logging.getLogger('institute_crm.benchmark')
+
+# Rows inserted per statement while generating data
+INSERT_PAGE_SIZE = 5000
+BENCH_PREFIX = 'Bench'
+
+FIRST_NAMES = [
+    'Aarav', 'Aditya', 'Akhil', 'Amal', 'Ananya', 'Anjali', 'Arjun', 'Devika', 'Diya', 'Fathima',
+    'Gokul', 'Hari', 'Irfan', 'Jithin', 'Kavya', 'Lakshmi', 'Meera', 'Muhammed', 'Nandana', 'Nikhil',
+    'Priya', 'Rahul', 'Riya', 'Sandra', 'Sneha', 'Sreya', 'Vishnu', 'Varun', 'Zainab', 'Abhinav',
+]
+SURNAMES = [
+    'Nair', 'Menon', 'Pillai', 'Kurian', 'Thomas', 'Varghese', 'Joseph', 'Rahman', 'Ali', 'Krishnan',
+    'Das', 'Iyer', 'Sharma', 'Reddy', 'George', 'Mathew', 'Abraham', 'Basheer', 'Raj', 'Suresh',
+]
+
+
+class _Rollback(Exception):
+    """Raised to roll back the savepoint of a timed case"""
+
+
+def _setting(name, default, type_=int):
+    value = os.environ.get(name)
+    return type_(value) if value else default
+
+
+def _settings():
+    return {
+        'sizes': [int(size) for size in os.environ.get('BENCH_SIZES', '10000,100000,1000000').split(',')],
+        'officers': _setting('BENCH_OFFICERS', 20),
+        'sources': _setting('BENCH_SOURCES', 8),
+        'courses': _setting('BENCH_COURSES', 6),
+        'days': _setting('BENCH_DAYS', 730),
+        'activity_ratio': _setting('BENCH_ACTIVITY_RATIO', 0.3, float),
+        'message_ratio': _setting('BENCH_MESSAGE_RATIO', 1.0, float),
+        'student_ratio': _setting('BENCH_STUDENT_RATIO', 1.0, float),
+        'family_share': _setting('BENCH_FAMILY_SHARE', 0.15, float),
+        'batch': _setting('BENCH_BATCH', 100),
+        'sample': _setting('BENCH_SAMPLE', 1000),
+        'repeat': _setting('BENCH_REPEAT', 3),
+        'seed': _setting('BENCH_SEED', 42),
+        'output': os.environ.get('BENCH_OUTPUT', 'institute_crm_benchmark.json'),
+    }
+
+
+# ----------------------------------------------------------------------
+# Synthetic data
+# ----------------------------------------------------------------------
+
+def _format_phone(rng, number):
+    """Write a 10 digit Indian mobile number the ways officers type them"""
+    return rng.choice([
+        number,
+        f"+91{number}",
+        f"+91 {number}",
+        f"+91-{number[:5]}-{number[5:]}",
+        f"0{number}",
+        f"{number[:5]} {number[5:]}",
+        f"91 {number[:3]} {number[3:6]} {number[6:]}",
+    ])
+
+
+def _new_number(rng):
+    return rng.choice('6789') + ''.join(rng.choice('0123456789') for _ in range(9))
+
+
+class BenchData:
+    """Master data of the benchmark, created once and reused by the sizes"""
+
+    def __init__(self, env, settings):
+        self.env = env
+        self.settings = settings
+        self.rng = random.Random(settings['seed'])
+        self.family_numbers = []
+
+    def setup(self):
+        env = self.env
+        salesman = env.ref('sales_team.group_sale_salesman')
+        manager = env.ref('sales_team.group_sale_manager')
+        Users = env['res.users'].with_context(no_reset_password=True, mail_create_nosubscribe=True)
+        self.officers = env['res.users']
+        for index in range(self.settings['officers']):
+            login = f'bench_officer_{index + 1}'
+            user = Users.search([('login', '=', login)]) or Users.create({
+                'name': f'{BENCH_PREFIX} Officer {index + 1}',
+                'login': login,
+                'groups_id': [fields.Command.set([salesman.id])],
+            })
+            self.officers |= user
+        self.manager = Users.search([('login', '=', 'bench_manager')]) or Users.create({
+            'name': f'{BENCH_PREFIX} Manager',
+            'login': 'bench_manager',
+            'groups_id': [fields.Command.set([manager.id])],
+        })
+
+        Source = env['utm.source']
+        self.sources = Source.search([('name', '=like', f'{BENCH_PREFIX} Source %')])
+        for index in range(len(self.sources), self.settings['sources']):
+            self.sources |= Source.create({'name': f'{BENCH_PREFIX} Source {index + 1}'})
+
+        Product = env['product.product']
+        self.courses = Product.search([('name', '=like', f'{BENCH_PREFIX} Course %')])
+        for index in range(len(self.courses), self.settings['courses']):
+            self.courses |= Product.create({
+                'name': f'{BENCH_PREFIX} Course {index + 1}',
+                'list_price': self.rng.choice([25000, 40000, 60000, 85000, 120000]),
+            })
+
+        Stage = env['crm.stage']
+        for name, sequence, is_won in [('New Inquiry', 1, False), ('Contacted', 2, False),
+                                       ('Interested', 3, False), ('Counselling Done', 4, False),
+                                       ('Admission', 5, True)]:
+            if not Stage.search_count([('name', '=', name)]):
+                Stage.create({'name': name, 'sequence': sequence, 'is_won': is_won})
+        self.open_stages = Stage.search([('is_won', '=', False), ('fold', '=', False)])
+        self.won_stage = Stage.search([('is_won', '=', True)], limit=1)
+
+        LostReason = env['crm.lost.reason']
+        self.lost_reasons = LostReason.search([])
+        if not self.lost_reasons:
+            self.lost_reasons = LostReason.create([{'name': name} for name in
+                                                   ['Too expensive', 'Joined elsewhere', 'Not reachable']])
+
+        self.activity_type = env.ref('mail.mail_activity_data_call')
+        self.activity_subtype = env.ref('mail.mt_activities')
+        self.lead_model_id = env['ir.model']._get_id('crm.lead')
+        env.cr.commit()
+
+    def count_leads(self):
+        self.env.cr.execute("SELECT COUNT(*) FROM crm_lead WHERE name LIKE %s", [f'{BENCH_PREFIX} Lead %'])
+        return self.env.cr.fetchone()[0]
+
+    def _phones(self):
+        """Student and parent numbers of a lead, sharing family numbers"""
+        rng = self.rng
+        if self.family_numbers and rng.random() < self.settings['family_share']:
+            # sibling of an existing lead: same parent number, sometimes the
+            # same number for the student as well
+            parent = rng.choice(self.family_numbers)
+            student = parent if rng.random() < 0.5 else _new_number(rng)
+        else:
+            parent = _new_number(rng)
+            student = _new_number(rng)
+            if len(self.family_numbers) < 100000:
+                self.family_numbers.append(parent)
+        return student, parent
+
+    def generate(self, count):
+        """Insert ``count`` more leads, with their activities, messages and
+        students, straight in the database"""
+        if count <= 0:
+            return {}
+        env, rng, settings = self.env, self.rng, self.settings
+        now = datetime.now().replace(microsecond=0)
+        company_id = env.company.id
+        uid = env.uid
+        start = self.count_leads()
+        stats = {'leads': 0, 'won': 0, 'activities': 0, 'messages': 0, 'students': 0}
+        officer_partners = dict(zip(self.officers.ids, self.officers.partner_id.ids))
+        officer_ids = self.officers.ids
+
+        for offset in range(0, count, INSERT_PAGE_SIZE):
+            leads = []
+            for index in range(start + offset, start + min(offset + INSERT_PAGE_SIZE, count)):
+                student_number, parent_number = self._phones()
+                student_phone = _format_phone(rng, student_number)
+                parent_phone = _format_phone(rng, parent_number)
+                student_name = f"{rng.choice(FIRST_NAMES)} {rng.choice(SURNAMES)}"
+                create_date = now - timedelta(days=rng.random() * settings['days'])
+                outcome = rng.random()
+                won = outcome < 0.12
+                lost = not won and outcome < 0.30
+                stage = self.won_stage if won else rng.choice(self.open_stages)
+                course = rng.choice(self.courses)
+                date_closed = create_date + timedelta(days=rng.random() * 60) if won else None
+                if date_closed and date_closed > now:
+                    date_closed = now
+                leads.append((
+                    f"{BENCH_PREFIX} Lead {index + 1}", 'opportunity', not lost, stage.id,
+                    rng.choice(officer_ids) if rng.random() < 0.95 else None, company_id,
+                    student_name, student_name,
+                    student_phone, parent_phone, student_phone, parent_phone,
+                    normalize_phone_key(student_phone), normalize_phone_key(parent_phone),
+                    normalize_phone_key(student_phone), normalize_phone_key(parent_phone),
+                    rng.choice(['0', '0', '1', '2', '3']), 100 if won else (0 if lost else rng.choice([10, 30, 50, 70, 90])),
+                    course.list_price, rng.choice(self.sources).id, course.id,
+                    rng.choice(self.lost_reasons).id if lost else None,
+                    date_closed, (date_closed - create_date).days if date_closed else None,
+                    create_date, create_date, create_date, create_date, uid, uid,
+                ))
+            rows = execute_values(env.cr._obj, """
+                INSERT INTO crm_lead (
+                    name, type, active, stage_id, user_id, company_id, student_name, contact_name,
+                    phone, mobile, student_phone, alternative_phone,
+                    phone_key, mobile_key, student_phone_key, alternative_phone_key,
+                    priority, probability, expected_revenue, source_id, course_interested, lost_reason_id,
+                    date_closed, day_close, date_open, date_last_stage_update, create_date, write_date,
+                    create_uid, write_uid
+                ) VALUES %s
+                RETURNING id, user_id, active, probability, create_date, date_closed
+            """, leads, page_size=INSERT_PAGE_SIZE, fetch=True)
+            stats['leads'] += len(rows)
+
+            activities, messages, completions, won_leads = [], [], [], []
+            for lead_id, user_id, active, probability, create_date, date_closed in rows:
+                user_id = user_id or rng.choice(officer_ids)
+                if probability == 100:
+                    won_leads.append((lead_id, user_id, date_closed))
+                elif active and rng.random() < settings['activity_ratio']:
+                    activities.append((
+                        self.lead_model_id, 'crm.lead', lead_id, self.activity_type.id, 'Follow-up call',
+                        (now + timedelta(days=rng.randint(-10, 10))).date(), user_id,
+                        now, now, uid, uid,
+                    ))
+                done_count = int(settings['message_ratio']) + (rng.random() < settings['message_ratio'] % 1)
+                for _ in range(done_count):
+                    done_date = create_date + (now - create_date) * rng.random()
+                    messages.append((
+                        'crm.lead', lead_id, 'notification', self.activity_subtype.id, self.activity_type.id,
+                        officer_partners[user_id], done_date, '<p>Call done</p>',
+                        done_date, done_date, uid, uid,
+                    ))
+                    completions.append((
+                        user_id, lead_id, self.activity_type.id, done_date, done_date, done_date, uid, uid,
+                    ))
+            if activities:
+                execute_values(env.cr._obj, """
+                    INSERT INTO mail_activity (
+                        res_model_id, res_model, res_id, activity_type_id, summary, date_deadline, user_id,
+                        create_date, write_date, create_uid, write_uid
+                    ) VALUES %s
+                """, activities, page_size=INSERT_PAGE_SIZE)
+            if messages:
+                execute_values(env.cr._obj, """
+                    INSERT INTO mail_message (
+                        model, res_id, message_type, subtype_id, mail_activity_type_id, author_id, date, body,
+                        create_date, write_date, create_uid, write_uid
+                    ) VALUES %s
+                """, messages, page_size=INSERT_PAGE_SIZE)
+                execute_values(env.cr._obj, """
+                    INSERT INTO crm_activity_done (
+                        user_id, lead_id, activity_type_id, done_date, create_date, write_date, create_uid, write_uid
+                    ) VALUES %s
+                """, completions, page_size=INSERT_PAGE_SIZE)
+            stats['won'] += len(won_leads)
+            stats['activities'] += len(activities)
+            stats['messages'] += len(messages)
+            stats['students'] += self._create_students(won_leads)
+            env.cr.commit()
+            _logger.info("Generated %s/%s leads", stats['leads'], count)
+
+        env.invalidate_all()
+        return stats
+
+    def _create_students(self, won_leads):
+        """Students of the won leads, through the ORM as their model belongs
+        to another module"""
+        if 'student.student' not in self.env or not won_leads:
+            return 0
+        Student = self.env['student.student']
+        rng = self.rng
+        optional = {}
+        for fname in ('branch', 'course_id', 'batch_id'):
+            field = Student._fields.get(fname)
+            if field and field.type == 'many2one':
+                optional[fname] = self.env[field.comodel_name].search([], limit=10).ids
+        vals_list = []
+        for lead_id, user_id, date_closed in won_leads:
+            if rng.random() >= self.settings['student_ratio']:
+                continue
+            vals = {
+                'lead_id': lead_id,
+                'user_id': user_id,
+                'paid_amount': rng.choice([5000, 10000, 25000, 40000]),
+                'enrollment_date': (date_closed or datetime.now()).date(),
+            }
+            if 'name' in Student._fields:
+                vals['name'] = f"{BENCH_PREFIX} Student {lead_id}"
+            for fname, ids in optional.items():
+                if ids:
+                    vals[fname] = rng.choice(ids)
+            vals_list.append({key: value for key, value in vals.items() if key in Student._fields})
+        try:
+            with self.env.cr.savepoint():
+                Student.with_context(tracking_disable=True, mail_create_nolog=True).create(vals_list)
+        except Exception as e:
+            _logger.warning("Could not create the benchmark students, skipping them: %s", e)
+            self.settings['student_ratio'] = 0
+            return 0
+        return len(vals_list)
+
+    def refresh_aggregates(self):
+        """Refresh what the scheduled actions keep up to date in production"""
+        env = self.env
+        env.cr.execute("ANALYZE crm_lead")
+        env.cr.execute("ANALYZE mail_activity")
+        env.cr.execute("ANALYZE mail_message")
+        env.cr.execute("ANALYZE crm_activity_done")
+        env['crm.dashboard.snapshot'].action_rebuild_snapshot()
+        env['crm.leaderboard.month']._rebuild_leaderboard()
+        env['crm.lead']._cron_fill_admitted_campus()
+        env['crm.lead.report.institute']._refresh_report_data()
+        env.cr.commit()
+
+
+# ----------------------------------------------------------------------
+# Timed cases
+# ----------------------------------------------------------------------
+
+def _measure(env, func, repeat):
+    """Run ``func`` ``repeat`` times, each time with cold record caches, and
+    return the wall times and query counts of the runs"""
+    thread = threading.current_thread()
+    if not hasattr(thread, 'query_count'):
+        thread.query_count = 0
+        thread.query_time = 0
+    timings, queries = [], []
+    for _ in range(repeat):
+        env.invalidate_all()
+        query_count = thread.query_count
+        start = time.perf_counter()
+        try:
+            func()
+        except _Rollback:
+            pass
+        timings.append((time.perf_counter() - start) * 1000)
+        queries.append(thread.query_count - query_count)
+    return {
+        'runs_ms': [round(timing, 1) for timing in timings],
+        'min_ms': round(min(timings), 1),
+        'median_ms': round(statistics.median(timings), 1),
+        'max_ms': round(max(timings), 1),
+        'queries': max(queries),
+    }
+
+
+def _rolled_back(env, func):
+    """Run ``func`` in a savepoint rolled back afterwards"""
+    def run():
+        with env.cr.savepoint():
+            func()
+            env.flush_all()
+            raise _Rollback()
+    return run
+
+
+def _cases(env, data, settings):
+    rng = random.Random(settings['seed'])
+    Lead = env['crm.lead']
+    officer = data.officers[0]
+    manager = data.manager
+    Dashboard = env['crm.dashboard.data']
+    sample = Lead.browse(rng.sample(Lead.search([('name', '=like', f'{BENCH_PREFIX} Lead %')]).ids,
+                                    settings['sample']))
+
+    def check_duplicates():
+        try:
+            sample._check_duplicate_phones()
+        except ValidationError:
+            # the sample may hold leads entered twice, which is expected
+            pass
+
+    def create_leads():
+        vals_list = []
+        for index in range(settings['batch']):
+            number = _new_number(rng)
+            vals_list.append({
+                'name': f'{BENCH_PREFIX} Created Lead {index}',
+                'student_name': f"{rng.choice(FIRST_NAMES)} {rng.choice(SURNAMES)}",
+                'student_phone': _format_phone(rng, number),
+                'user_id': rng.choice(data.officers.ids),
+                'source_id': rng.choice(data.sources.ids),
+            })
+        Lead.create(vals_list)
+
+    def write_leads():
+        leads = Lead.browse(rng.sample(sample.ids, min(settings['batch'], len(sample))))
+        leads.write({'user_id': rng.choice(data.officers.ids)})
+
+    wizard = env['institute.admission.report.wizard'].create({
+        'date_from': fields.Date.today() - timedelta(days=settings['days']),
+        'date_to': fields.Date.today(),
+        'report_type': 'college',
+    })
+    Report = env['ir.actions.report']
+    report_fields = ['user_id', 'overdue_count', 'today_count', 'scheduled_count', 'active_count',
+                     'won_count', 'lost_count', 'total_count']
+
+    cases = {
+        'dashboard_salesperson': lambda: Dashboard.with_user(officer).get_dashboard_data('month'),
+        'dashboard_manager_month': lambda: Dashboard.with_user(manager).get_dashboard_data('month'),
+        'dashboard_manager_all': lambda: Dashboard.with_user(manager).get_dashboard_data('all'),
+        'check_duplicate_phones': check_duplicates,
+        'lead_create': _rolled_back(env, create_leads),
+        'lead_write': _rolled_back(env, write_leads),
+        'report_view': lambda: env['crm.lead.report.institute'].with_user(manager).search_read([], report_fields),
+        'report_view_refresh': lambda: env['crm.lead.report.institute']._refresh_report_data(),
+        'report_campus_wise': lambda: Report._render_qweb_html('institute_crm.report_campus_wise', wizard.ids),
+    }
+    if 'student.student' in env:
+        # the PDF conversion is left out, only the rendering is ours
+        cases['report_officer_detailed'] = lambda: Report._render_qweb_html(
+            'institute_crm.report_officer_detailed', wizard.ids)
+    return cases
+
+
+# ----------------------------------------------------------------------
+# Entry point
+# ----------------------------------------------------------------------
+
+def run(env):
+    settings = _settings()
+    if os.environ.get('BENCH_DATABASE') != env.cr.dbname:
+        raise SystemExit(
+            "Set BENCH_DATABASE=%s to confirm that this scratch database may be filled "
+            "with benchmark data." % env.cr.dbname)
+
+    env = env(user=odoo.SUPERUSER_ID, context=dict(env.context, tracking_disable=True))
+    ICP = env['ir.config_parameter'].sudo()
+    cache_ttl = ICP.get_param('institute_crm.dashboard_cache_ttl')
+    report = {
+        'database': env.cr.dbname,
+        'odoo_version': odoo.release.version,
+        'module_version': env['ir.module.module'].search([('name', '=', 'institute_crm')]).installed_version,
+        'started': fields.Datetime.to_string(fields.Datetime.now()),
+        'settings': dict(settings),
+        'sizes': [],
+    }
+    data = BenchData(env, settings)
+    data.setup()
+    # every run computes the dashboards instead of reading them from the cache
+    ICP.set_param('institute_crm.dashboard_cache_ttl', '0')
+    env.cr.commit()
+    try:
+        for size in sorted(settings['sizes']):
+            start = time.perf_counter()
+            generated = data.generate(size - data.count_leads())
+            data.refresh_aggregates()
+            result = {
+                'leads': size,
+                'generated': generated,
+                'generation_s': round(time.perf_counter() - start, 1),
+                'cases': {},
+            }
+            for name, func in _cases(env, data, settings).items():
+                result['cases'][name] = _measure(env, func, settings['repeat'])
+                _logger.info("%s leads - %s: %s ms (median), %s queries", size, name,
+                             result['cases'][name]['median_ms'], result['cases'][name]['queries'])
+            env.cr.rollback()
+            report['sizes'].append(result)
+            with open(settings['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+    finally:
+        ICP.set_param('institute_crm.dashboard_cache_ttl', cache_ttl or False)
+        env.cr.commit()
+    _logger.info("Benchmark report written to %s", settings['output'])
+    return report
+
+
+if __name__ == '__main__':
+    run(env)  # noqa: F821 (provided by the Odoo shell)
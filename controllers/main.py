@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import csv
+import datetime
+import io
+import tempfile
+
+import xlsxwriter
+
+import odoo
+from odoo import http
+from odoo.http import request, content_disposition
+
+from odoo.addons.institute_crm.models.sql_cursor import iter_query_rows
+
+# Rows fetched per round trip from the SQL cursor
+EXPORT_FETCH_SIZE = 2000
+# Size of the chunks of the XLSX file sent to the client
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+def _iter_query_rows(dbname, query):
+    """Yield the rows of the SQL ``query``, fetched in batches.
+
+    The response is streamed after the request cursor is closed, so the
+    rows are read through a cursor of their own.
+    """
+    with odoo.registry(dbname).cursor() as cr:
+        yield from iter_query_rows(cr, query, EXPORT_FETCH_SIZE)
+
+
+def _iter_csv(headers, rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode()
+
+
+def _iter_xlsx(headers, rows):
+    """Yield the XLSX file of the rows.
+
+    A workbook is a zip archive written on close, so the file is not
+    streamed as it is built: it is completed in a temporary file before
+    its first chunk is sent. constant_memory flushes every row to that
+    file as it is written, which keeps the memory bounded; CSV is the
+    format streamed from the first row.
+    """
+    with tempfile.TemporaryFile() as output:
+        workbook = xlsxwriter.Workbook(output, {'constant_memory': True, 'remove_timezone': True})
+        worksheet = workbook.add_worksheet()
+        bold = workbook.add_format({'bold': True})
+        date_format = workbook.add_format({'num_format': 'yyyy-mm-dd'})
+        datetime_format = workbook.add_format({'num_format': 'yyyy-mm-dd hh:mm:ss'})
+        worksheet.write_row(0, 0, headers, bold)
+        for row_index, row in enumerate(rows, 1):
+            for col_index, value in enumerate(row):
+                if isinstance(value, datetime.datetime):
+                    worksheet.write_datetime(row_index, col_index, value, datetime_format)
+                elif isinstance(value, datetime.date):
+                    worksheet.write_datetime(row_index, col_index, value, date_format)
+                else:
+                    worksheet.write(row_index, col_index, value)
+        workbook.close()
+        output.seek(0)
+        while True:
+            chunk = output.read(EXPORT_CHUNK_SIZE)
+            if not chunk:
+                break
+            yield chunk
+
+
+class AdmissionReportExport(http.Controller):
+
+    @http.route('/institute_crm/admission_report/export/<int:wizard_id>', type='http', auth='user')
+    def export_admission_report(self, wizard_id, **kwargs):
+        """Stream the raw rows of an admission report as CSV or XLSX"""
+        wizard = request.env['institute.admission.report.wizard'].browse(wizard_id).exists()
+        if not wizard:
+            raise request.not_found()
+        headers, query = wizard._get_export_query()
+        rows = _iter_query_rows(request.env.cr.dbname, query)
+        if wizard.export_format == 'xlsx':
+            body = _iter_xlsx(headers, rows)
+            content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        else:
+            body = _iter_csv(headers, rows)
+            content_type = 'text/csv; charset=utf-8'
+        return request.make_response(body, headers=[
+            ('Content-Type', content_type),
+            ('Content-Disposition', content_disposition(wizard._get_export_filename())),
+        ])
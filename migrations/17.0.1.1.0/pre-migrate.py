@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+import logging
+
+_logger = logging.getLogger(__name__)
+
+PHONE_KEY_COLUMNS = {
+    'phone': 'phone_key',
+    'mobile': 'mobile_key',
+    'student_phone': 'student_phone_key',
+    'alternative_phone': 'alternative_phone_key',
+}
+
+
+def migrate(cr, version):
+    """Create and backfill the normalized phone keys of crm_lead in SQL.
+
+    The columns exist before the registry loads, so the ORM does not
+    recompute the new stored fields lead by lead; it only adds the indexes.
+    """
+    if not version:
+        return
+    for number_column, key_column in PHONE_KEY_COLUMNS.items():
+        cr.execute("ALTER TABLE crm_lead ADD COLUMN IF NOT EXISTS %s varchar" % key_column)
+        digits = "REGEXP_REPLACE(%s, '\\D', '', 'g')" % number_column
+        cr.execute("""
+            UPDATE crm_lead
+            SET %(key)s = CASE
+                WHEN LENGTH(%(digits)s) >= 10 THEN RIGHT(%(digits)s, 10)
+                WHEN LENGTH(%(digits)s) > 5 THEN %(digits)s
+            END
+            WHERE %(number)s IS NOT NULL
+        """ % {'key': key_column, 'digits': digits, 'number': number_column})
+        _logger.info("Backfilled crm_lead.%s for %s lead(s)", key_column, cr.rowcount)
@@ -3,5 +3,14 @@
 from . import crm_lead_institute
 from . import crm_lead_report_institute
 from . import crm_dashboard
+from . import crm_dashboard_generation
+from . import crm_dashboard_membership
+from . import crm_dashboard_snapshot
+from . import crm_leaderboard
+from . import crm_activity_done
+from . import crm_dashboard_profile
+from . import crm_ai_suggestion_job
+from . import crm_ai_suggestion_cache
+from . import mail_activity
 from . import res_config_settings
 from . import saas_menu_restriction
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""Shared LLM client of the AI suggestions.
+
+One client is kept per worker process and configuration, so that calls
+reuse their keep-alive HTTP connections. Calls are bounded by a timeout,
+retried with exponential backoff on transient errors, and rejected at once
+by a circuit breaker after repeated failures, so that the callers fall back
+to the rule-based suggestions quickly. The ``mock`` backend answers locally,
+for load tests of the whole AI path without OpenRouter.
+"""
+
+import json
+import logging
+import random
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+try:
+    from openai import OpenAI, APIConnectionError, APIStatusError, APITimeoutError
+except ImportError:
+    OpenAI = None
+    APIConnectionError = APIStatusError = APITimeoutError = None
+
+AI_MODEL = "qwen/qwen-2.5-7b-instruct"
+AI_BASE_URL = "https://openrouter.ai/api/v1"
+
+AI_TIMEOUT = 30
+AI_MAX_RETRIES = 2
+AI_RETRY_BACKOFF = 1.0
+AI_CIRCUIT_THRESHOLD = 5
+AI_CIRCUIT_COOLDOWN = 60
+
+
+class CircuitOpenError(Exception):
+    """Raised while the circuit breaker rejects the calls"""
+
+
+class CircuitBreaker:
+    """Reject the calls for ``cooldown`` seconds after ``threshold``
+    consecutive failures; one trial call is let through afterwards."""
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_until = 0.0
+        self.lock = threading.Lock()
+
+    def before_call(self):
+        with self.lock:
+            now = time.monotonic()
+            if self.opened_until > now:
+                raise CircuitOpenError("The AI service is unavailable, retrying in %d seconds."
+                                       % (self.opened_until - now))
+            if self.failures >= self.threshold:
+                # half-open: this call is the trial, the others wait for its outcome
+                self.opened_until = now + self.cooldown
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_until = 0.0
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.failures >= self.threshold:
+                self.opened_until = time.monotonic() + self.cooldown
+                _logger.warning("AI circuit breaker opened for %s seconds after %s failures",
+                                self.cooldown, self.failures)
+
+
+class OpenRouterBackend:
+    """Chat completions on OpenRouter through a single pooled client"""
+
+    def __init__(self, api_key, timeout):
+        if OpenAI is None:
+            raise RuntimeError("The openai library is not installed.")
+        # retries are handled by LLMClient, with the circuit breaker
+        self.client = OpenAI(base_url=AI_BASE_URL, api_key=api_key, timeout=timeout, max_retries=0)
+
+    def complete(self, messages):
+        response = self.client.chat.completions.create(
+            model=AI_MODEL,
+            messages=messages,
+            temperature=0.7,
+            response_format={"type": "json_object"}
+        )
+        return response.choices[0].message.content
+
+
+class MockBackend:
+    """Local backend answering every prompt with canned suggestions"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def complete(self, messages):
+        if self.latency:
+            time.sleep(self.latency)
+        prompt = messages[-1]['content']
+        context = json.loads(prompt.split(':', 1)[1]) if ':' in prompt else {}
+        if isinstance(context, list):
+            return json.dumps({'suggestions': [self._suggest(item) for item in context]})
+        return json.dumps(self._suggest(context))
+
+    def _suggest(self, context):
+        name = context.get('lead_name') or 'the student'
+        suggestion = {
+            'suggested_action': f"Call {name} to confirm their interest.",
+            'draft_message': f"Hi {name}, just checking in about your admission. Any questions?",
+        }
+        if 'lead_id' in context:
+            suggestion.update(lead_id=context['lead_id'], lead_name=context.get('lead_name'))
+        return suggestion
+
+
+class LLMClient:
+    """Complete prompts through a backend with retries and a circuit breaker"""
+
+    def __init__(self, backend, max_retries, breaker):
+        self.backend = backend
+        self.max_retries = max_retries
+        self.breaker = breaker
+
+    def complete(self, messages):
+        self.breaker.before_call()
+        for attempt in range(self.max_retries + 1):
+            try:
+                content = self.backend.complete(messages)
+            except Exception as e:
+                if attempt >= self.max_retries or not _is_transient(e):
+                    self.breaker.record_failure()
+                    raise
+                delay = AI_RETRY_BACKOFF * (2 ** attempt) * (1 + random.random())
+                _logger.info("AI call failed (%s), retrying in %.1fs", e, delay)
+                time.sleep(delay)
+            else:
+                self.breaker.record_success()
+                return content
+
+
+def _is_transient(error):
+    """Timeouts, connection errors, request timeouts, rate limiting and
+    server errors; any other error fails at once"""
+    if OpenAI is None:
+        return False
+    if isinstance(error, (APITimeoutError, APIConnectionError)):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code in (408, 429) or error.status_code >= 500
+    return False
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_llm_client(backend='openrouter', api_key=None, timeout=AI_TIMEOUT, max_retries=AI_MAX_RETRIES,
+                   circuit_threshold=AI_CIRCUIT_THRESHOLD, circuit_cooldown=AI_CIRCUIT_COOLDOWN,
+                   mock_latency=0.0):
+    """Return the client of this worker for the given configuration"""
+    key = (backend, api_key, timeout, max_retries, circuit_threshold, circuit_cooldown, mock_latency)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is None:
+            if backend == 'mock':
+                llm_backend = MockBackend(mock_latency)
+            else:
+                llm_backend = OpenRouterBackend(api_key, timeout)
+            client = _clients[key] = LLMClient(
+                llm_backend, max_retries, CircuitBreaker(circuit_threshold, circuit_cooldown))
+        return client
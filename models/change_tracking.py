@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""Watermarks of the incremental scheduled actions.
+
+The ``write_date`` of a row is the start time of the transaction writing
+it, which may commit long after. A scheduled action re-reading the rows
+written since its previous run therefore stores, rather than the time of
+the run, the start of the oldest transaction still running when it ran,
+and re-reads from a margin before it.
+"""
+
+from datetime import timedelta
+
+# Re-read before the stored watermark, for the transactions committing while
+# the watermark is read
+CHANGE_WATERMARK_MARGIN = timedelta(minutes=5)
+
+
+def read_change_watermark(cr):
+    """Return the UTC start of the oldest transaction running on the
+    database, the current one included"""
+    cr.execute("""
+        SELECT LEAST(NOW(), MIN(xact_start)) AT TIME ZONE 'UTC'
+        FROM pg_stat_activity
+        WHERE datname = current_database() AND xact_start IS NOT NULL
+    """)
+    return cr.fetchone()[0]
+
+
+def changed_since(watermark):
+    """Return the ``write_date`` from which the rows must be re-read after a
+    run having stored ``watermark``"""
+    return watermark - CHANGE_WATERMARK_MARGIN
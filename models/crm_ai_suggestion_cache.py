@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+from datetime import timedelta
+import hashlib
+import json
+import logging
+
+from psycopg2 import IntegrityError
+
+_logger = logging.getLogger(__name__)
+
+AI_CACHE_TTL_HOURS = 24
+AI_CACHE_SIZE = 10000
+# last_used only orders the eviction, so the hits refresh it this coarsely
+AI_CACHE_LAST_USED_RESOLUTION = timedelta(hours=1)
+
+
+class CrmAiSuggestionCache(models.Model):
+    """Answers of the AI model, addressed by a hash of their prompt.
+
+    The prompt holds the lead fields, recent logs and model name, so an
+    unchanged lead hits the cache while any change of its context misses
+    it. Entries expire after ``institute_crm.ai_cache_ttl`` hours, the least
+    recently used ones (to the hour) are evicted beyond
+    ``institute_crm.ai_cache_size`` entries, and the entries of a lead are
+    dropped when a message is posted on it.
+    """
+    _name = 'crm.ai.suggestion.cache'
+    _description = 'AI Suggestion Cache'
+    _order = 'last_used desc'
+
+    key = fields.Char(string='Prompt Hash', required=True, index=True)
+    content = fields.Text(string='Answer', required=True)
+    lead_ids = fields.Many2many('crm.lead', string='Leads')
+    expire_date = fields.Datetime(string='Expires On', required=True)
+    last_used = fields.Datetime(string='Last Used', required=True, default=fields.Datetime.now)
+
+    _sql_constraints = [
+        ('key_unique', 'UNIQUE(key)', 'A prompt can only be cached once.'),
+    ]
+
+    @api.model
+    def _make_key(self, model, messages):
+        payload = json.dumps({'model': model, 'messages': messages}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    @api.model
+    def _get(self, model, messages):
+        """Cached answer of the prompt, or None"""
+        entry = self.sudo().search([
+            ('key', '=', self._make_key(model, messages)),
+            ('expire_date', '>', fields.Datetime.now()),
+        ], limit=1)
+        if not entry:
+            return None
+        now = fields.Datetime.now()
+        if entry.last_used < now - AI_CACHE_LAST_USED_RESOLUTION:
+            entry.last_used = now
+        return entry.content
+
+    @api.model
+    def _set(self, model, messages, content, leads):
+        ttl = int(self.env['ir.config_parameter'].sudo().get_param(
+            'institute_crm.ai_cache_ttl', AI_CACHE_TTL_HOURS) or 0)
+        if ttl <= 0:
+            return
+        now = fields.Datetime.now()
+        key = self._make_key(model, messages)
+        vals = {
+            'content': content,
+            'lead_ids': [fields.Command.set(leads.ids)],
+            'expire_date': now + timedelta(hours=ttl),
+            'last_used': now,
+        }
+        entry = self.sudo().search([('key', '=', key)], limit=1)
+        if entry:
+            entry.write(vals)
+        else:
+            try:
+                with self.env.cr.savepoint():
+                    self.sudo().create(dict(vals, key=key))
+            except IntegrityError:
+                # stored meanwhile by a concurrent runner
+                pass
+
+    @api.model
+    def _invalidate_leads(self, leads):
+        """Drop the answers built from these leads"""
+        if leads:
+            self.sudo().search([('lead_ids', 'in', leads.ids)]).unlink()
+
+    @api.model
+    def _gc_cache(self):
+        """Remove the expired entries and the least recently used ones
+        beyond the configured size"""
+        size = int(self.env['ir.config_parameter'].sudo().get_param(
+            'institute_crm.ai_cache_size', AI_CACHE_SIZE) or AI_CACHE_SIZE)
+        self.flush_model()
+        self.env.cr.execute("""
+            DELETE FROM crm_ai_suggestion_cache
+            WHERE expire_date <= %s
+            OR id IN (
+                SELECT id FROM crm_ai_suggestion_cache
+                ORDER BY last_used DESC
+                OFFSET %s
+            )
+        """, [fields.Datetime.now(), size])
+        if self.env.cr.rowcount:
+            _logger.info("Evicted %s AI suggestion cache entries", self.env.cr.rowcount)
+        self.invalidate_model()
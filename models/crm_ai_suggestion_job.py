@@ -0,0 +1,332 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+from odoo.exceptions import UserError
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import json
+import logging
+
+from .ai_client import (
+    AI_MODEL, AI_TIMEOUT, AI_MAX_RETRIES, AI_CIRCUIT_THRESHOLD, AI_CIRCUIT_COOLDOWN,
+    OpenAI, get_llm_client,
+)
+
+_logger = logging.getLogger(__name__)
+
+AI_MAX_CONCURRENCY = 4
+# Jobs claimed per transaction by the runner
+AI_JOB_BATCH_SIZE = 20
+# Finished jobs are kept that long for the clients polling them
+AI_JOB_RETENTION = timedelta(days=1)
+# Jobs still running after that long were abandoned by a crashed runner
+AI_JOB_STALE_AFTER = timedelta(minutes=30)
+
+
+def parse_llm_json(content):
+    """Parse the JSON answer of the model"""
+    # Strip potential markdown formatting sometimes returned by qwen despite instructions
+    content = content.strip()
+    if content.startswith('```json'):
+        content = content[7:]
+    if content.startswith('```'):
+        content = content[3:]
+    if content.endswith('```'):
+        content = content[:-3]
+    return json.loads(content)
+
+
+class CrmAiSuggestionJob(models.Model):
+    """Queued AI suggestion request.
+
+    Requests are queued by the dashboard and the lead form and processed by
+    a scheduled runner, so that no HTTP worker waits on the LLM. The runner
+    claims a batch of jobs and builds their prompts, then commits before
+    calling the LLM, so that no transaction or lock is held during the
+    calls. These run in a bounded thread pool, through the shared client of
+    ``ai_client``, and the results are stored in a short transaction.
+    """
+    _name = 'crm.ai.suggestion.job'
+    _description = 'AI Suggestion Job'
+    _order = 'id desc'
+
+    kind = fields.Selection([
+        ('dashboard', 'Dashboard Suggestions'),
+        ('lead', 'Lead Suggestion'),
+    ], string='Kind', required=True)
+    user_id = fields.Many2one('res.users', string='Requested By', required=True, index=True, ondelete='cascade')
+    lead_id = fields.Many2one('crm.lead', string='Lead', ondelete='cascade')
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='Status', required=True, default='pending', index=True)
+    force = fields.Boolean(string='Bypass Cache', help='Ask the model even if the prompt has a cached answer')
+    result = fields.Text(string='Result', help='JSON result shown to the user')
+    error = fields.Text(string='Error')
+
+    @api.model
+    def _enqueue(self, kind, lead=None, force=False, trigger=True):
+        """Queue a job for the current user and wake the runner up.
+
+        A job of the same request still waiting is reused, so that repeated
+        clicks do not pile up LLM calls. Unless ``force`` is set, a prompt
+        with a cached answer finishes the job right away.
+        """
+        Job = self.sudo()
+        job = Job.search([
+            ('kind', '=', kind),
+            ('user_id', '=', self.env.uid),
+            ('lead_id', '=', lead.id if lead else False),
+            ('state', 'in', ('pending', 'running')),
+        ], limit=1)
+        if not job:
+            job = Job.create({
+                'kind': kind,
+                'user_id': self.env.uid,
+                'lead_id': lead.id if lead else False,
+                'force': force,
+            })
+            if not force and job._load_from_cache():
+                return job
+            if trigger:
+                self._trigger_runner()
+        return job
+
+    @api.model
+    def _trigger_runner(self):
+        self.env.ref('institute_crm.ir_cron_process_ai_suggestion_jobs')._trigger()
+
+    @api.model
+    def _cron_pregenerate_suggestions(self):
+        """Queue the dashboard suggestions of every salesperson having open
+        leads, so that they are ready when the day starts"""
+        groups = self.env['crm.lead']._read_group([
+            ('user_id', '!=', False),
+            ('user_id.active', '=', True),
+            ('user_id.share', '=', False),
+            ('stage_id.is_won', '=', False),
+        ], ['user_id'])
+        for [user] in groups:
+            self.with_user(user)._enqueue('dashboard', trigger=False)
+        self._trigger_runner()
+        return True
+
+    def _get_status(self):
+        """Status of the job as polled by the clients"""
+        self.ensure_one()
+        finished = self.state in ('done', 'failed')
+        return {
+            'job_id': self.id,
+            'state': self.state,
+            'result': json.loads(self.result) if finished and self.result else False,
+        }
+
+    # ------------------------------------------------------------------
+    # Runner
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _is_ai_configured(self):
+        ICP = self.env['ir.config_parameter'].sudo()
+        if ICP.get_param('institute_crm.ai_backend', 'openrouter') == 'mock':
+            return True
+        return bool(OpenAI and ICP.get_param('institute_crm.openrouter_api_key'))
+
+    @api.model
+    def _get_llm_client(self):
+        """Shared client of this worker for the configured backend"""
+        ICP = self.env['ir.config_parameter'].sudo()
+
+        def param(name, default, type_=int):
+            value = ICP.get_param(name)
+            return type_(value) if value else default
+
+        return get_llm_client(
+            backend=ICP.get_param('institute_crm.ai_backend', 'openrouter'),
+            api_key=ICP.get_param('institute_crm.openrouter_api_key'),
+            timeout=param('institute_crm.ai_timeout', AI_TIMEOUT),
+            max_retries=param('institute_crm.ai_max_retries', AI_MAX_RETRIES),
+            circuit_threshold=param('institute_crm.ai_circuit_threshold', AI_CIRCUIT_THRESHOLD),
+            circuit_cooldown=param('institute_crm.ai_circuit_cooldown', AI_CIRCUIT_COOLDOWN),
+            mock_latency=param('institute_crm.ai_mock_latency', 0.0, float),
+        )
+
+    @api.model
+    def _cron_process_jobs(self):
+        """Process the pending jobs, committing after each claimed batch"""
+        ICP = self.env['ir.config_parameter'].sudo()
+        max_workers = int(ICP.get_param('institute_crm.ai_max_concurrency', AI_MAX_CONCURRENCY) or AI_MAX_CONCURRENCY)
+        now = fields.Datetime.now()
+        self.search([
+            ('state', 'in', ('done', 'failed')),
+            ('write_date', '<', now - AI_JOB_RETENTION),
+        ]).unlink()
+        stale_jobs = self.search([('state', '=', 'running'), ('write_date', '<', now - AI_JOB_STALE_AFTER)])
+        if stale_jobs:
+            _logger.warning("Requeuing %s AI suggestion job(s) left running", len(stale_jobs))
+            stale_jobs.write({'state': 'pending'})
+        self.env['crm.ai.suggestion.cache']._gc_cache()
+        self.env.cr.commit()
+        while True:
+            # concurrent runners skip the jobs claimed by each other
+            self.env.cr.execute("""
+                SELECT id FROM crm_ai_suggestion_job
+                WHERE state = 'pending'
+                ORDER BY id
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            """, [AI_JOB_BATCH_SIZE])
+            jobs = self.browse([row[0] for row in self.env.cr.fetchall()])
+            if not jobs:
+                break
+            jobs.write({'state': 'running'})
+            pending, client, errors = jobs._prepare_calls()
+            # release the claimed rows: the LLM calls run outside any transaction
+            self.env.cr.commit()
+            errors.update(self._call_llm(pending, client, max_workers))
+            self._store_results(pending, errors)
+            self.env.cr.commit()
+        return True
+
+    def _load_from_cache(self):
+        """Finish the job with the cached answers of its prompts, if all of
+        them are cached"""
+        self.ensure_one()
+        prompts = self._prepare_messages()
+        if not prompts:
+            return False
+        Cache = self.env['crm.ai.suggestion.cache']
+        results = []
+        for messages, leads in prompts:
+            content = Cache._get(AI_MODEL, messages)
+            if content is None:
+                return False
+            results.append((leads, content))
+        self._set_done(results, notify=False)
+        return self.state == 'done'
+
+    def _prepare_calls(self):
+        """Build the prompts of the jobs and the client answering them.
+
+        :return: ``(pending, client, errors)`` where ``pending`` maps each job
+                 to its prompts as ``[messages, leads, answer, answered by the
+                 model]`` lists (the answer being filled from the cache when
+                 possible), and ``errors`` maps the jobs which cannot be
+                 answered to their error
+        """
+        Cache = self.env['crm.ai.suggestion.cache']
+        pending = {}
+        for job in self:
+            try:
+                prompts = job._prepare_messages()
+            except Exception as e:
+                _logger.exception("Could not prepare AI suggestion job %s", job.id)
+                job._set_failed(e)
+                continue
+            if not prompts:
+                # nothing to ask the model about
+                job._set_failed(None)
+                continue
+            pending[job] = [
+                [messages, leads, None if job.force else Cache._get(AI_MODEL, messages), False]
+                for messages, leads in prompts
+            ]
+
+        client = None
+        errors = {}
+        if any(prompt[2] is None for prompts in pending.values() for prompt in prompts):
+            try:
+                if not self._is_ai_configured():
+                    raise UserError("OpenRouter API is not configured. Please add the API key in Settings.")
+                client = self._get_llm_client()
+            except Exception as e:
+                errors = {job: e for job in pending}
+        return pending, client, errors
+
+    @api.model
+    def _call_llm(self, pending, client, max_workers):
+        """Fill the missing answers of ``pending`` from the model. Nothing is
+        read from the database here, as no transaction is open.
+
+        :return: the errors of the failed calls, by job
+        """
+        errors = {}
+        if client is None:
+            return errors
+        calls = [(job, prompt) for job, prompts in pending.items() for prompt in prompts if prompt[2] is None]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [(job, prompt, executor.submit(client.complete, prompt[0])) for job, prompt in calls]
+        for job, prompt, future in futures:
+            try:
+                prompt[2] = future.result()
+                prompt[3] = True
+            except Exception as e:
+                _logger.error("OpenRouter AI Suggestion Failed: %s", str(e))
+                errors[job] = e
+        return errors
+
+    @api.model
+    def _store_results(self, pending, errors):
+        """Finish the jobs of ``pending`` with their answers"""
+        Cache = self.env['crm.ai.suggestion.cache']
+        for job, prompts in pending.items():
+            results = [(leads, content) for messages, leads, content, fresh in prompts if content is not None]
+            if not results:
+                job._set_failed(errors.get(job) or "Empty answer from the model")
+                continue
+            try:
+                job._set_done(results)
+            except Exception as e:
+                _logger.error("Could not read the AI suggestion of job %s: %s", job.id, str(e))
+                job._set_failed(e)
+                continue
+            if job.state == 'done':
+                for messages, leads, content, fresh in prompts:
+                    if fresh:
+                        Cache._set(AI_MODEL, messages, content, leads)
+
+    def _get_target(self):
+        """Record building the prompt and reading the answer, as the requester"""
+        self.ensure_one()
+        if self.kind == 'lead':
+            return self.lead_id.with_user(self.user_id)
+        return self.env['crm.dashboard.data'].with_user(self.user_id)
+
+    def _prepare_messages(self):
+        """Prompts of the job, as ``(messages, leads)`` pairs"""
+        return self._get_target()._prepare_ai_suggestion_messages()
+
+    def _set_done(self, results, notify=True):
+        """Store the result read from the ``(leads, answer)`` pairs"""
+        result = self._get_target()._parse_ai_suggestion(results)
+        if not result:
+            return self._set_failed("Empty answer from the model")
+        self.write({'state': 'done', 'result': json.dumps(result), 'error': False})
+        if notify:
+            self._notify_done()
+
+    def _set_failed(self, error):
+        """Finish the job with the rule-based fallback of its kind"""
+        result = self._get_target()._get_fallback_ai_suggestion(error)
+        self.write({
+            'state': 'failed' if error else 'done',
+            'result': json.dumps(result),
+            'error': str(error) if error else False,
+        })
+        self._notify_done()
+
+    def _notify_done(self):
+        if self.kind == 'dashboard':
+            self.env['bus.bus']._sendone(self.user_id.partner_id, 'institute_crm.ai_suggestion_job', {
+                'job_id': self.id,
+                'state': self.state,
+            })
+        elif self.kind == 'lead':
+            self.env['bus.bus']._sendone(self.user_id.partner_id, 'simple_notification', {
+                'title': 'AI Suggestion',
+                'message': f"The suggestion for '{self.lead_id.student_name or self.lead_id.name}' is ready.",
+                'type': 'success' if self.state == 'done' else 'warning',
+                'sticky': False,
+            })
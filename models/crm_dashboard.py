@@ -1,18 +1,112 @@
 from odoo import models, fields, api
-from datetime import datetime, timedelta, time
+from odoo.exceptions import UserError
+from odoo.tools import SQL
+from collections import OrderedDict
+from datetime import date, datetime, timedelta, time
+import calendar
 import random
 import json
 import logging
+import threading
+import time as time_module
 
 _logger = logging.getLogger(__name__)
 
-try:
-    from openai import OpenAI
-except ImportError:
-    OpenAI = None
+from .crm_ai_suggestion_job import parse_llm_json
 
 # Removed ResUsers to avoid postgres schema bootloops
 
+DASHBOARD_CACHE_SIZE = 512
+DASHBOARD_CACHE_TTL = 300
+
+# Sections of the dashboard, fetched one RPC each after the header, in the
+# order of the page
+SALESPERSON_SECTIONS = ['pipeline', 'coaching', 'conversion', 'efficiency', 'leaderboard', 'priority_queue']
+MANAGER_SECTIONS = ['dna', 'alerts', 'revenue', 'heatmap', 'trends', 'sources', 'funnel', 'team_activities']
+# Sections above the fold, fetched before the others
+DASHBOARD_PRIORITY_SECTIONS = {'pipeline', 'coaching', 'conversion', 'efficiency', 'dna', 'alerts', 'revenue'}
+# Sections depending on the timeframe picked by the user
+DASHBOARD_TIMEFRAME_SECTIONS = {'heatmap'}
+# Timeframes of these sections; 'custom' takes its dates from the request
+DASHBOARD_TIMEFRAMES = ['today', 'week', 'month', 'quarter', 'season', 'custom', 'all']
+# First day (MM-DD) of the admission season, overridden by the
+# institute_crm.admission_season_start parameter
+ADMISSION_SEASON_START = '04-01'
+
+# The open dashboards receive the changes on the channel of their user's
+# partner: the changed sections, and the counter deltas patched in place
+DASHBOARD_DELTA_KEY = 'institute_crm.dashboard_delta'
+DASHBOARD_INVALIDATION_KEY = 'institute_crm.dashboard_invalidation'
+# Sections changed by the leads and activities of their owners
+DASHBOARD_DELTA_SECTIONS = {
+    'lead': ['pipeline', 'coaching', 'conversion', 'efficiency', 'priority_queue',
+             'dna', 'alerts', 'revenue', 'heatmap', 'trends', 'sources', 'funnel'],
+    'activity': ['coaching', 'efficiency', 'priority_queue', 'dna', 'trends', 'team_activities'],
+}
+# Sections shown to every salesperson, changed by any won lead
+DASHBOARD_TEAM_SECTIONS = ['leaderboard']
+# Sections patched by the clients from the counter deltas of their leads
+DASHBOARD_COUNTER_SECTIONS = {'pipeline'}
+
+# Leads covered by the AI suggestions of the dashboard
+AI_DASHBOARD_LEAD_COUNT = 5
+# Estimated tokens of lead context packed in one prompt
+AI_PROMPT_TOKEN_BUDGET = 2000
+
+
+class DashboardCache(object):
+    """Per-worker LRU cache of computed dashboard payloads.
+
+    Entries are keyed by (dbname, uid, is_manager, generations, companies,
+    language, timeframe window, date, section) and expire after a
+    time-to-live. The generations of the dashboard are bumped in the
+    database by every change, so that the entries of the workers that did
+    not process the change are not read anymore.
+    """
+
+    def __init__(self, max_size=DASHBOARD_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, payload = entry
+            if expires_at < time_module.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def set(self, key, payload, ttl):
+        with self._lock:
+            self._entries[key] = (time_module.monotonic() + ttl, payload)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, dbname, user_ids=(), company_ids=(), everyone=False):
+        """Drop the entries of ``user_ids`` and of the managers of
+        ``company_ids`` (whose payload covers the whole team, 0 standing
+        for the records without company), or all entries of the database."""
+        user_ids = set(user_ids)
+        company_ids = set(company_ids)
+        with self._lock:
+            for key in list(self._entries):
+                key_dbname, key_uid, key_is_manager, key_generations, key_company_ids = key[:5]
+                if key_dbname != dbname:
+                    continue
+                if everyone or key_uid in user_ids or (
+                        key_is_manager and (0 in company_ids or company_ids.intersection(key_company_ids))):
+                    del self._entries[key]
+
+
+dashboard_cache = DashboardCache()
+
+
 class CrmDashboard(models.AbstractModel):
     _name = 'crm.dashboard.data'
     _description = 'CRM Dashboard Data Provider'
@@ -20,30 +114,421 @@ class CrmDashboard(models.AbstractModel):
     @api.model
     def save_sticky_note(self, text):
         self.env['ir.config_parameter'].sudo().set_param(f'dashboard_sticky_note_{self.env.uid}', text)
+        self._invalidate_dashboard_cache([self.env.uid])
         return True
 
     @api.model
-    def get_dashboard_data(self, timeframe='month'):
-        is_manager = self.env.user.has_group('sales_team.group_sale_manager')
-        uid = self.env.uid
+    def _invalidate_dashboard_cache(self, user_ids=(), company_ids=(), everyone=False):
+        """Invalidate the cached dashboards of ``user_ids`` and of the
+        managers of ``company_ids`` (0 for the records without company), or
+        every cached dashboard, in every worker.
+
+        The entries of this worker are dropped now and once the transaction
+        is committed. The generations read by the other workers are bumped
+        once per transaction, in the transaction itself.
+        """
+        dbname = self.env.cr.dbname
+        user_ids = [u for u in user_ids if u]
+        dashboard_cache.invalidate(dbname, user_ids, company_ids, everyone)
+        invalidation = self.env.cr.precommit.data.get(DASHBOARD_INVALIDATION_KEY)
+        if invalidation is None:
+            invalidation = self.env.cr.precommit.data[DASHBOARD_INVALIDATION_KEY] = {
+                'user_ids': set(), 'company_ids': set(), 'everyone': False,
+            }
+            self.env.cr.precommit.add(self._bump_dashboard_generations)
+        invalidation['user_ids'].update(user_ids)
+        invalidation['company_ids'].update(company_ids)
+        invalidation['everyone'] |= everyone
+
+    @api.model
+    def _bump_dashboard_generations(self):
+        invalidation = self.env.cr.precommit.data.pop(DASHBOARD_INVALIDATION_KEY, None)
+        if not invalidation:
+            return
+        self.env['crm.dashboard.generation'].sudo()._bump(
+            invalidation['user_ids'], invalidation['company_ids'], invalidation['everyone'])
+        dbname = self.env.cr.dbname
+        self.env.cr.postcommit.add(lambda: dashboard_cache.invalidate(
+            dbname, invalidation['user_ids'], invalidation['company_ids'], invalidation['everyone']))
+
+    @api.model
+    def _notify_dashboard_delta(self, kind, user_ids=(), everyone=False, counters=None):
+        """Tell the open dashboards of ``user_ids`` and of the managers which
+        of their sections a change of ``kind`` affected, and every dashboard
+        when the team sections changed.
+
+        ``counters`` holds the counter deltas of the users, as returned by
+        :meth:`_get_lead_counter_deltas`: their dashboards patch the counter
+        sections in place instead of fetching them again.
+
+        The deltas of a transaction are merged and published once, on commit.
+        """
+        delta = self.env.cr.precommit.data.get(DASHBOARD_DELTA_KEY)
+        if delta is None:
+            delta = self.env.cr.precommit.data[DASHBOARD_DELTA_KEY] = {
+                'user_sections': {}, 'counters': {}, 'sections': set(), 'team_sections': set(),
+            }
+            self.env.cr.precommit.add(self._send_dashboard_delta)
+        sections = DASHBOARD_DELTA_SECTIONS[kind]
+        if counters is not None:
+            # the users missing from the counters have nothing to patch
+            for user_id, user_counters in counters.items():
+                merged = delta['counters'].setdefault(user_id, {'open_total': 0, 'open_revenue': 0.0, 'stages': {}})
+                merged['open_total'] += user_counters['open_total']
+                merged['open_revenue'] += user_counters['open_revenue']
+                for stage_id, count in user_counters['stages'].items():
+                    merged['stages'][stage_id] = merged['stages'].get(stage_id, 0) + count
+            sections = [s for s in sections if s not in DASHBOARD_COUNTER_SECTIONS]
+        for user_id in user_ids:
+            if user_id:
+                delta['user_sections'].setdefault(user_id, set()).update(sections)
+        delta['sections'].update(sections)
+        if everyone:
+            delta['team_sections'].update(DASHBOARD_TEAM_SECTIONS)
+
+    @api.model
+    def _send_dashboard_delta(self):
+        delta = self.env.cr.precommit.data.pop(DASHBOARD_DELTA_KEY, None)
+        if not delta:
+            return
+        Membership = self.env['crm.dashboard.membership']
+        manager_ids = set(Membership._get_manager_user_ids())
+        user_ids = set(delta['user_sections']) | manager_ids
+        if delta['team_sections']:
+            user_ids.update(Membership._get_salesman_user_ids())
+        notifications = []
+        for user in self.env['res.users'].sudo().browse(sorted(user_ids)):
+            sections = delta['user_sections'].get(user.id, set()) | delta['team_sections']
+            if user.id in manager_ids:
+                sections |= delta['sections']
+            payload = {'sections': sorted(sections)}
+            counters = delta['counters'].get(user.id)
+            if counters and (counters['open_total'] or counters['open_revenue'] or any(counters['stages'].values())):
+                payload['counters'] = counters
+            elif not sections:
+                continue
+            notifications.append((user.partner_id, 'institute_crm.dashboard_delta', payload))
+        self.env['bus.bus']._sendmany(notifications)
+        # precommit hooks run after the final flush of the transaction
+        self.env['bus.bus'].flush_model()
+
+    @api.model
+    def _read_lead_counters(self, leads):
+        """Counters of the counter sections that ``leads`` account for, as a
+        list of ``(user_id, stage_id, open_total, open_revenue, active_count)``
+        (``stage_id`` being None for the stages out of the funnel)"""
+        if not leads:
+            return []
+        leads.flush_model(['user_id', 'stage_id', 'active', 'expected_revenue'])
+        self.env['crm.stage'].flush_model(['is_won', 'fold'])
+        self.env.cr.execute("""
+            SELECT l.user_id,
+                   CASE WHEN NOT s.fold THEN l.stage_id END AS stage_id,
+                   COUNT(*) FILTER (WHERE s.is_won IS NOT TRUE) AS open_total,
+                   COALESCE(SUM(l.expected_revenue) FILTER (WHERE s.is_won IS NOT TRUE), 0)::float AS open_revenue,
+                   COUNT(*) AS active_count
+            FROM crm_lead l
+            LEFT JOIN crm_stage s ON s.id = l.stage_id
+            WHERE l.id = ANY(%s) AND l.active AND l.user_id IS NOT NULL
+            GROUP BY l.user_id, 2
+        """, [leads.ids])
+        return self.env.cr.fetchall()
+
+    @api.model
+    def _get_lead_counter_deltas(self, removed, added):
+        """Counter deltas per user between the ``removed`` and the ``added``
+        rows, as returned by :meth:`_read_lead_counters`"""
+        deltas = {}
+        for sign, rows in ((-1, removed), (1, added)):
+            for user_id, stage_id, open_total, open_revenue, active_count in rows:
+                delta = deltas.setdefault(user_id, {'open_total': 0, 'open_revenue': 0.0, 'stages': {}})
+                delta['open_total'] += sign * open_total
+                delta['open_revenue'] += sign * open_revenue
+                if stage_id:
+                    delta['stages'][stage_id] = delta['stages'].get(stage_id, 0) + sign * active_count
+        return deltas
+
+    @api.model
+    def get_dashboard_data(self, timeframe='month', date_from=None, date_to=None):
+        """Whole dashboard payload: the header merged with every section"""
+        ctx = self._get_dashboard_context(timeframe, date_from, date_to)
+        data = self._get_dashboard_section_data(ctx, 'header')
+        for section in data['sections']:
+            data.update(self._get_dashboard_section_data(ctx, section))
+        return self._add_debug_timings(ctx, data)
+
+    @api.model
+    def get_dashboard_header(self, timeframe='month', date_from=None, date_to=None):
+        """Header of the dashboard, rendered first by the client, with the
+        sections to fetch afterwards in ``sections`` (above-the-fold ones
+        listed in ``priority_sections``)"""
+        ctx = self._get_dashboard_context(timeframe, date_from, date_to)
+        return self._add_debug_timings(ctx, self._get_dashboard_section_data(ctx, 'header'))
+
+    @api.model
+    def get_dashboard_section(self, section, timeframe='month', date_from=None, date_to=None):
+        """Payload of one section of the dashboard of the current user"""
+        ctx = self._get_dashboard_context(timeframe, date_from, date_to)
+        if section not in self._get_dashboard_sections(ctx['is_manager']):
+            raise UserError(f"Unknown dashboard section: {section}")
+        return self._add_debug_timings(ctx, self._get_dashboard_section_data(ctx, section))
+
+    @api.model
+    def _get_dashboard_sections(self, is_manager):
+        return MANAGER_SECTIONS if is_manager else SALESPERSON_SECTIONS
+
+    @api.model
+    def _get_dashboard_context(self, timeframe, date_from=None, date_to=None):
+        """Parameters shared by the sections of one dashboard request; the
+        intermediate results used by several sections are memoized in it.
+
+        ``window`` holds the first and the day after the last day of the
+        timeframe, or None for all time.
+
+        The sections are timed when ``institute_crm.dashboard_profiling`` is
+        set (the timings are then logged and stored) or when the request
+        has the ``dashboard_debug`` context key (they are then returned).
+        """
+        profiling = bool(self.env['ir.config_parameter'].sudo().get_param('institute_crm.dashboard_profiling'))
         today = fields.Date.context_today(self)
-        end_of_week = today + timedelta(days=7)
-        
-        # Base Data Dictionary
+        return {
+            'uid': self.env.uid,
+            'is_manager': self.env.user.has_group('sales_team.group_sale_manager'),
+            'today': today,
+            'timeframe': timeframe,
+            'window': self._get_timeframe_window(timeframe, today, date_from, date_to),
+            'profiling': profiling,
+            'debug': bool(self.env.context.get('dashboard_debug')),
+            'timings': {},
+        }
+
+    @api.model
+    def _get_timeframe_window(self, timeframe, today, date_from=None, date_to=None):
+        """Return the ``(first day, day after the last day)`` of a timeframe
+        ending today (or of the custom range), or None for all time"""
+        if timeframe not in DASHBOARD_TIMEFRAMES:
+            raise UserError(f"Unknown dashboard timeframe: {timeframe}")
+        end = today + timedelta(days=1)
+        if timeframe == 'all':
+            return None
+        if timeframe == 'today':
+            return today, end
+        if timeframe == 'week':
+            return today - timedelta(days=today.weekday()), end
+        if timeframe == 'month':
+            return today.replace(day=1), end
+        if timeframe == 'quarter':
+            return today.replace(month=(today.month - 1) // 3 * 3 + 1, day=1), end
+        if timeframe == 'season':
+            season_start = self.env['ir.config_parameter'].sudo().get_param(
+                'institute_crm.admission_season_start', ADMISSION_SEASON_START)
+            try:
+                month, day = (int(part) for part in season_start.split('-'))
+                # checked against a leap year, 02-29 being a valid start
+                date(2000, month, day)
+            except ValueError:
+                raise UserError(f"Invalid admission season start '{season_start}', expected MM-DD.")
+
+            def season_start_of(year):
+                # a season starting on 02-29 starts on 02-28 in other years
+                return date(year, month, min(day, calendar.monthrange(year, month)[1]))
+            start = season_start_of(today.year)
+            if start > today:
+                start = season_start_of(today.year - 1)
+            return start, end
+        date_from = fields.Date.to_date(date_from)
+        date_to = fields.Date.to_date(date_to)
+        if not date_from or not date_to or date_from > date_to:
+            raise UserError("A custom timeframe needs a start date before its end date.")
+        return date_from, date_to + timedelta(days=1)
+
+    @api.model
+    def _get_dashboard_section_data(self, ctx, section):
+        """Cached payload of a section, computed on a miss"""
+        ttl = int(self.env['ir.config_parameter'].sudo().get_param(
+            'institute_crm.dashboard_cache_ttl', DASHBOARD_CACHE_TTL))
+        if ttl <= 0:
+            return self._compute_dashboard_section(ctx, section)
+
+        # timeframes covering the same days share their cache entries
+        window = ctx['window'] if section in DASHBOARD_TIMEFRAME_SECTIONS else None
+        Generation = self.env['crm.dashboard.generation'].sudo()
+        company_ids = tuple(self.env.companies.ids)
+        generations = self._memoize(ctx, 'cache_generations', lambda: Generation._read_generations(
+            ctx['uid'], ctx['is_manager'], company_ids))
+        cache_key = (self.env.cr.dbname, ctx['uid'], ctx['is_manager'], generations,
+                     company_ids, self.env.lang, window, ctx['today'], section)
+        data = dashboard_cache.get(cache_key)
+        if data is not None and ctx['debug']:
+            ctx['timings'][section] = {'cached': True}
+        if data is None:
+            data = self._compute_dashboard_section(ctx, section)
+            dashboard_cache.set(cache_key, data, ttl)
+        return dict(data)
+
+    @api.model
+    def _compute_dashboard_section(self, ctx, section):
+        compute = getattr(self, '_compute_dashboard_%s' % section)
+        if not (ctx['profiling'] or ctx['debug']):
+            return compute(ctx)
+
+        # query counters maintained by the cursors of the current thread
+        thread = threading.current_thread()
+        query_count = getattr(thread, 'query_count', 0)
+        query_time = getattr(thread, 'query_time', 0.0)
+        start = time_module.perf_counter()
+        data = compute(ctx)
+        total_time = time_module.perf_counter() - start
+        sql_time = getattr(thread, 'query_time', 0.0) - query_time
+        # intermediate results shared with other sections are counted in the
+        # first section computing them
+        timing = {
+            'queries': getattr(thread, 'query_count', 0) - query_count,
+            'sql_time': round(sql_time * 1000, 1),
+            'python_time': round((total_time - sql_time) * 1000, 1),
+            'total_time': round(total_time * 1000, 1),
+        }
+        ctx['timings'][section] = timing
+        if ctx['profiling']:
+            _logger.info(
+                "Dashboard section %s of user %s: %s queries, %.1f ms SQL, %.1f ms Python",
+                section, ctx['uid'], timing['queries'], timing['sql_time'], timing['python_time'])
+            self.env['crm.dashboard.profile']._record(ctx, section, timing)
+        return data
+
+    @api.model
+    def _add_debug_timings(self, ctx, data):
+        if ctx['debug']:
+            data['_debug_timings'] = ctx['timings']
+        return data
+
+    @api.model
+    def _memoize(self, ctx, key, compute):
+        if key not in ctx:
+            ctx[key] = compute()
+        return ctx[key]
+
+    # ------------------------------------------------------------------
+    # Shared intermediate results
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _get_hidden_user_ids(self, ctx):
+        """Users of the security group hidden from the dashboard"""
+        return self._memoize(ctx, 'hidden_user_ids',
+                             lambda: set(self.env['crm.dashboard.membership']._get_hidden_user_ids()))
+
+    @api.model
+    def _get_lead_metrics(self, ctx):
+        return self._memoize(ctx, 'metrics', lambda: self._get_salesperson_lead_metrics(ctx['uid'], ctx['today']))
+
+    @api.model
+    def _get_lead_breakdown(self, ctx):
+        return self._memoize(ctx, 'breakdown', lambda: self._get_salesperson_lead_breakdown(ctx['uid']))
+
+    @api.model
+    def _get_activity_counts(self, ctx):
+        return self._memoize(ctx, 'activity_counts', lambda: self._get_salesperson_activity_counts(ctx['uid'], ctx['today']))
+
+    @api.model
+    def _get_trend_percent(self, ctx):
+        metrics = self._get_lead_metrics(ctx)
+        this_week_won = metrics['this_week_won']
+        last_week_won = metrics['last_week_won']
+        return round(((this_week_won - last_week_won) / last_week_won * 100) if last_week_won else (100 if this_week_won else 0))
+
+    @api.model
+    def _get_month_leaderboard(self, ctx):
+        """Won leads of this month per salesperson, with their badges"""
+        def compute():
+            hidden_user_ids = self._get_hidden_user_ids(ctx)
+            rows = self.env['crm.leaderboard.month'].sudo()._read_month(ctx['today'].replace(day=1))
+            users = self.env['res.users'].sudo().browse([row['user_id'] for row in rows])
+            user_names = dict(zip(users.ids, users.mapped('name')))
+            leaderboard = []
+            fastest_closer = None
+            min_close_time = float('inf')
+
+            for index, res in enumerate(rows):
+                u_id = res['user_id']
+                if u_id in hidden_user_ids: continue
+                avg_close = res['avg_close'] or 0
+
+                badges = []
+                if index == 0:
+                    badges.append('🔥 Top Closer')
+                if avg_close < min_close_time:
+                    min_close_time = avg_close
+                    fastest_closer = u_id
+
+                leaderboard.append({
+                    'user_id': u_id,
+                    'user_name': user_names[u_id],
+                    'won': res['won_count'],
+                    'badges': badges,
+                    'rank': index + 1
+                })
+
+            for rep in leaderboard:
+                if rep['user_id'] == fastest_closer:
+                    rep['badges'].append('⚡ Fastest Closer')
+            return leaderboard
+        return self._memoize(ctx, 'leaderboard', compute)
+
+    @api.model
+    def _get_lead_totals(self, ctx):
+        """Lifetime counters, read from the daily snapshot plus the live rows
+        created since its last refresh"""
+        return self._memoize(ctx, 'lead_totals', lambda: self.env['crm.dashboard.snapshot']._read_lead_totals())
+
+    @api.model
+    def _get_untouched_leads(self, ctx):
+        """Open leads not updated for three days, and their cutoff"""
+        def compute():
+            three_days_ago = fields.Datetime.now() - timedelta(days=3)
+            count = self.env['crm.lead'].search_count([
+                ('stage_id.is_won', '=', False),
+                ('active', '=', True),
+                ('write_date', '<', three_days_ago),
+                ('stage_id.fold', '=', False)
+            ])
+            return count, three_days_ago
+        return self._memoize(ctx, 'untouched_leads', compute)
+
+    @api.model
+    def _get_unfolded_stages(self, ctx):
+        return self._memoize(ctx, 'unfolded_stages', lambda: self.env['crm.stage'].search([('fold', '=', False)]))
+
+    @api.model
+    def _prepare_funnel(self, ctx, stage_counts):
+        unfolded_stages = self._get_unfolded_stages(ctx)
+        stage_sequences = {s.id: s.sequence for s in unfolded_stages}
+        stage_names = {s.id: s.name for s in unfolded_stages}
+        funnel = [{'stage_id': stage_id, 'stage': stage_names[stage_id], 'count': count}
+                  for stage_id, count in stage_counts.items() if stage_id in stage_names]
+        funnel.sort(key=lambda x: stage_sequences.get(x['stage_id'], 0))
+        return funnel
+
+    # ------------------------------------------------------------------
+    # Sections
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _compute_dashboard_header(self, ctx):
+        uid = ctx['uid']
+        is_manager = ctx['is_manager']
+        sections = self._get_dashboard_sections(is_manager)
         data = {
             'is_manager': is_manager,
-            'today': today.strftime("%Y-%m-%d"),
-            'timeframe': timeframe,
+            'today': ctx['today'].strftime("%Y-%m-%d"),
+            'timeframe': ctx['timeframe'],
+            'current_uid': uid,
+            'sections': sections,
+            'priority_sections': [s for s in sections if s in DASHBOARD_PRIORITY_SECTIONS],
+            'timeframe_sections': [s for s in sections if s in DASHBOARD_TIMEFRAME_SECTIONS],
         }
         user_name = self.env.user.name.split()[0] if self.env.user.name else 'there'
-        
-        # Fetch hidden users from security group
-        hidden_group = self.env.ref('institute_crm.group_hide_from_dashboard', raise_if_not_found=False)
-        if hidden_group:
-            hidden_user_ids = hidden_group.users.ids
-        else:
-            hidden_user_ids = []
-        
+
         # General Data
         welcome_msgs = [
             f"Welcome {user_name}, let's get it done.",
@@ -52,11 +537,11 @@ class CrmDashboard(models.AbstractModel):
             f"Good to have you back, {user_name}!"
         ]
         data['welcome_message'] = random.choice(welcome_msgs)
-        
-        if not is_manager:
-            # NORMAL SALESPERSON LOGIC
-            
-            # 1. Motivational Quote
+
+        if is_manager:
+            data['admin_sticky_note'] = self.env['ir.config_parameter'].sudo().get_param(f'dashboard_sticky_note_{uid}', default='')
+        else:
+            # Motivational Quote
             quotes = [
                 "The secret of getting ahead is getting started.",
                 "Sales are contingent upon the attitude of the salesman.",
@@ -81,560 +566,483 @@ class CrmDashboard(models.AbstractModel):
                 "To build a long-term, successful enterprise, when you don't close a sale, open a relationship."
             ]
             data['quote'] = random.choice(quotes)
-            
-            # --- 1. Personal Conversion Metrics ---
-            # User Win Rate
-            user_total = self.env['crm.lead'].search_count([('user_id', '=', uid)])
-            user_won = self.env['crm.lead'].search_count([('user_id', '=', uid), ('stage_id.is_won', '=', True)])
-            user_win_rate = round((user_won / user_total * 100) if user_total else 0, 1)
-
-            # Team Average
-            team_total = self.env['crm.lead'].search_count([('user_id', '!=', False)])
-            team_won = self.env['crm.lead'].search_count([('user_id', '!=', False), ('stage_id.is_won', '=', True)])
-            team_win_rate = round((team_won / team_total * 100) if team_total else 0, 1)
-
-            # Avg Time to Close
-            user_won_leads = self.env['crm.lead'].search_read([('user_id', '=', uid), ('stage_id.is_won', '=', True)], ['day_close'])
-            avg_close_time = sum(l['day_close'] for l in user_won_leads) / len(user_won_leads) if user_won_leads else 0
-
-            # Top 3 Lost Reasons
-            lost_group = self.env['crm.lead'].read_group(
-                [('user_id', '=', uid), ('active', '=', False), ('lost_reason_id', '!=', False)],
-                ['lost_reason_id'],
-                ['lost_reason_id']
-            )
-            lost_group.sort(key=lambda x: x['lost_reason_id_count'], reverse=True)
-            top_lost_reasons = [{'reason': r['lost_reason_id'][1], 'count': r['lost_reason_id_count']} for r in lost_group[:3]]
-
-            # --- 2. Leaderboard ---
-            first_of_month = today.replace(day=1)
-            won_this_month = self.env['crm.lead'].sudo().read_group(
-                [('stage_id.is_won', '=', True), ('date_closed', '>=', first_of_month)],
-                ['user_id', 'day_close:avg'],
-                ['user_id'],
-                lazy=False
-            )
-            won_this_month.sort(key=lambda x: x['__count'], reverse=True)
-            leaderboard = []
-            top_closer = None
-            fastest_closer = None
-            min_close_time = float('inf')
-            
-            for index, res in enumerate(won_this_month):
-                if not res['user_id']: continue
-                u_id = res['user_id'][0]
-                if u_id in hidden_user_ids: continue
-                u_name = res['user_id'][1]
-                count = res['__count']
-                avg_close = res['day_close'] or 0
-                
-                badges = []
-                if index == 0:
-                    badges.append('🔥 Top Closer')
-                    if top_closer is None: top_closer = u_id
-                if avg_close < min_close_time and count > 0:
-                    min_close_time = avg_close
-                    fastest_closer = u_id
-                
-                leaderboard.append({
-                    'user_id': u_id,
-                    'user_name': u_name,
-                    'won': count,
-                    'badges': badges,
-                    'rank': index + 1
-                })
-            data['leaderboard'] = leaderboard
-            
-            # Last month top 3
-            first_of_last_month = (first_of_month - timedelta(days=1)).replace(day=1)
-            won_last_month = self.env['crm.lead'].sudo().read_group(
-                [('stage_id.is_won', '=', True), ('date_closed', '>=', first_of_last_month), ('date_closed', '<', first_of_month)],
-                ['user_id'],
-                ['user_id'],
-                lazy=False
-            )
-            won_last_month.sort(key=lambda x: x['__count'], reverse=True)
-            last_month_leaderboard = []
-            for res in won_last_month:
-                if not res['user_id']: continue
-                u_id = res['user_id'][0]
-                if u_id in hidden_user_ids: continue
-                last_month_leaderboard.append({
-                    'name': res['user_id'][1],
-                    'won': res['__count']
-                })
-                if len(last_month_leaderboard) == 3:
-                    break
-            data['last_month_leaderboard'] = last_month_leaderboard
-            
-            for rep in leaderboard:
-                if rep['user_id'] == fastest_closer:
-                    rep['badges'].append('⚡ Fastest Closer')
-
-            # --- 3. Activity Efficiency Score ---
-            try:
-                completed_activities = self.env['mail.message'].search_count([
-                    ('author_id.user_ids', 'in', [uid]),
-                    ('model', '=', 'crm.lead'),
-                    ('subtype_id', '=', self.env.ref('mail.mt_activities').id)
-                ])
-            except ValueError:
-                completed_activities = 0
-            efficiency_score = round((user_won / completed_activities * 100) if completed_activities else 0, 1)
-
-            # --- 4. Personal Trend Data ---
-            last_week_start = today - timedelta(days=14)
-            last_week_end = today - timedelta(days=7)
-            this_week_won = self.env['crm.lead'].search_count([
-                ('user_id', '=', uid), ('stage_id.is_won', '=', True), ('date_closed', '>=', last_week_end)
-            ])
-            last_week_won = self.env['crm.lead'].search_count([
-                ('user_id', '=', uid), ('stage_id.is_won', '=', True),
-                ('date_closed', '>=', last_week_start), ('date_closed', '<', last_week_end)
-            ])
-            trend_percent = round(((this_week_won - last_week_won) / last_week_won * 100) if last_week_won else (100 if this_week_won else 0))
-
-            # --- 5. Micro Coaching Tips ---
-            coaching_tips = []
-            source_group = self.env['crm.lead'].read_group(
-                [('user_id', '=', uid), ('stage_id.is_won', '=', True), ('source_id', '!=', False)],
-                ['source_id'], ['source_id']
-            )
-            if source_group:
-                source_group.sort(key=lambda x: x['source_id_count'], reverse=True)
-                top_source = source_group[0]
-                coaching_tips.append({'msg': f"Leads from {top_source['source_id'][1]} work best for you ({top_source['source_id_count']} wins).", 'icon': 'fa-check-circle text-success'})
-            
-            user_won_leads_dates = self.env['crm.lead'].search_read([('user_id', '=', uid), ('stage_id.is_won', '=', True), ('date_closed', '!=', False)], ['date_closed'], limit=500)
-            if user_won_leads_dates:
-                import pytz
-                user_tz = pytz.timezone(self.env.user.tz or 'UTC')
-                hours = []
-                for l in user_won_leads_dates:
-                    if l['date_closed']:
-                        utc_dt = pytz.utc.localize(l['date_closed'])
-                        user_dt = utc_dt.astimezone(user_tz)
-                        hours.append(user_dt.hour)
-                
-                if hours:
-                    best_hour = max(set(hours), key=hours.count)
-                    time_of_day = "morning" if best_hour < 12 else "afternoon" if best_hour < 17 else "evening"
-                    display_hour = best_hour if best_hour <= 12 else best_hour - 12
-                    display_hour = 12 if display_hour == 0 else display_hour
-                    am_pm = "AM" if best_hour < 12 else "PM"
-                    coaching_tips.append({'msg': f"You close most of your deals in the {time_of_day} (around {display_hour}:00 {am_pm}).", 'icon': 'fa-clock-o text-primary'})
-
-            # --- Advanced Coaching Insights ---
-            user_rank = next((r['rank'] for r in leaderboard if r['user_id'] == uid), None)
-            if user_rank and user_rank > 3:
-                top_3_won = next((r['won'] for r in leaderboard if r['rank'] == 3), 0)
-                diff = top_3_won - user_won
-                if diff > 0 and diff <= 5:
-                    coaching_tips.append({'msg': f"You’re just {diff} deal{'s' if diff > 1 else ''} away from the Top 3!", 'icon': 'fa-bolt text-warning'})
-
-            if trend_percent > 0:
-                coaching_tips.append({'msg': f"Great momentum! Your win rate improved by +{trend_percent}% vs last week.", 'icon': 'fa-line-chart text-success'})
-            elif trend_percent < 0:
-                coaching_tips.append({'msg': f"Your win volume dropped {abs(trend_percent)}% vs last week. Let's push hard!", 'icon': 'fa-line-chart text-danger'})
-
-            # Task Completion
-            today_str = fields.Date.today()
-            due_today_count = self.env['mail.activity'].search_count([
-                ('user_id', '=', uid), ('res_model', '=', 'crm.lead'), ('date_deadline', '=', today_str)
-            ])
-            today_dt = datetime.combine(today, time.min)
-            completed_today_count = self.env['mail.message'].search_count([
-                ('author_id.user_ids', 'in', [uid]), ('model', '=', 'crm.lead'),
-                ('subtype_id', '=', self.env.ref('mail.mt_activities').id),
-                ('date', '>=', today_dt)
-            ])
-            total_today = due_today_count + completed_today_count
-            if total_today > 0:
-                pct = int((completed_today_count / total_today) * 100)
-                if pct > 0:
-                    coaching_tips.append({'msg': f"{pct}% of your scheduled tasks for today are completed.", 'icon': 'fa-flag text-info'})
-
-            # Missed yesterday
-            yesterday = today - timedelta(days=1)
-            missed_yesterday = self.env['mail.activity'].search_count([
-                ('user_id', '=', uid), ('res_model', '=', 'crm.lead'), ('date_deadline', '=', yesterday)
-            ])
-            if missed_yesterday > 0:
-                coaching_tips.append({'msg': f"You missed {missed_yesterday} scheduled follow-up{'s' if missed_yesterday > 1 else ''} yesterday.", 'icon': 'fa-exclamation-triangle text-danger'})
+            data['ai_suggestions'] = []
+        return data
 
-            # Neglected leads
-            two_days_ago = fields.Datetime.now() - timedelta(days=2)
-            neglected_leads = self.env['crm.lead'].search_count([
-                ('user_id', '=', uid), 
-                ('stage_id.is_won', '=', False),
-                ('active', '=', True),
-                ('activity_ids', '=', False),
-                ('write_date', '<', two_days_ago)
-            ])
-            if neglected_leads > 0:
-                coaching_tips.append({'msg': f"{neglected_leads} active leads haven't had any updates in over 48 hours.", 'icon': 'fa-exclamation-triangle text-danger'})
-                
-            # New leads waiting
-            new_leads = self.env['crm.lead'].search_count([
-                ('user_id', '=', uid), ('stage_id.name', 'ilike', 'new'), ('active', '=', True)
-            ])
-            if new_leads > 0:
-                coaching_tips.append({'msg': f"You have {new_leads} leads in 'New' stage waiting to be contacted.", 'icon': 'fa-user-plus text-primary'})
+    # NORMAL SALESPERSON LOGIC
 
-            # High priority win rate
-            high_priority_won = self.env['crm.lead'].search_count([
-                ('user_id', '=', uid), ('priority', '=', '3'), ('stage_id.is_won', '=', True)
-            ])
-            high_priority_total = self.env['crm.lead'].search_count([
-                ('user_id', '=', uid), ('priority', '=', '3')
-            ])
-            if high_priority_total > 0:
-                hp_win_rate = int((high_priority_won / high_priority_total) * 100)
-                if hp_win_rate >= 50:
-                    coaching_tips.append({'msg': f"Awesome! Your win rate on High Priority leads is {hp_win_rate}%.", 'icon': 'fa-fire text-danger'})
-
-            if len(coaching_tips) < 5:
-                coaching_tips.append({'msg': "Pro tip: Contacting new leads within 5 minutes increases conversion odds by 9x.", 'icon': 'fa-lightbulb-o text-warning'})
-
-            if not coaching_tips:
-                coaching_tips.append({'msg': "Keep following up on your activities to discover your best closing strategies.", 'icon': 'fa-lightbulb-o text-warning'})
-            # --- 6. Priority Queue ---
-            Activity = self.env['mail.activity']
-            base_act_domain = [('user_id', '=', uid), ('res_model', '=', 'crm.lead')]
-            
-            overdue_activities = Activity.search_read(
-                base_act_domain + [('date_deadline', '<', today)],
-                ['res_name', 'summary', 'date_deadline', 'res_id', 'activity_type_id'], limit=15
-            )
-            due_today_activities = Activity.search_read(
-                base_act_domain + [('date_deadline', '=', today)],
-                ['res_name', 'summary', 'date_deadline', 'res_id', 'activity_type_id'], limit=15
-            )
-            hot_leads = self.env['crm.lead'].search_read([
-                ('user_id', '=', uid), ('stage_id.is_won', '=', False), ('active', '=', True),
-                '|', ('priority', '=', '3'), ('probability', '>=', 70)
-            ], ['name', 'student_name', 'probability', 'priority'], limit=15)
-
-            all_act_res_ids = [a['res_id'] for a in overdue_activities + due_today_activities]
-            if all_act_res_ids:
-                act_leads = self.env['crm.lead'].search_read([('id', 'in', all_act_res_ids)], ['id', 'student_name', 'name'])
-                act_lead_map = {l['id']: (l['student_name'] or l['name']) for l in act_leads}
-                for act in overdue_activities + due_today_activities:
-                    act['display_name'] = act_lead_map.get(act['res_id'], act['res_name'])
-            else:
-                for act in overdue_activities + due_today_activities:
-                    act['display_name'] = act['res_name']
-
-            data.update({
-                'current_uid': uid,
-                'user_win_rate': user_win_rate,
-                'team_win_rate': team_win_rate,
-                'avg_close_time': round(avg_close_time, 1),
-                'top_lost_reasons': top_lost_reasons,
-                'leaderboard': leaderboard,
-                'efficiency_score': efficiency_score,
-                'trend_percent': trend_percent,
-                'this_week_won': this_week_won,
-                'coaching_tips': coaching_tips,
-                'overdue_activities': overdue_activities,
-                'due_today_activities': due_today_activities,
-                'hot_leads': hot_leads,
-                'domain_hot_leads': [('user_id', '=', uid), ('stage_id.is_won', '=', False), ('active', '=', True), '|', ('priority', '=', '3'), ('probability', '>=', 70)],
-                'domain_overdue': base_act_domain + [('date_deadline', '<', today)],
-                'domain_due_today': base_act_domain + [('date_deadline', '=', today)],
-                'ai_suggestions': [],
-                'converted_leads': user_won,
-            })
-            
-            my_open_leads = self.env['crm.lead'].search([('user_id', '=', uid), ('stage_id.is_won', '=', False), ('active', '=', True)])
-            my_revenue = sum(my_open_leads.mapped('expected_revenue'))
-            my_avg_deal = my_revenue / len(my_open_leads) if my_open_leads else 0
-            
-            data['my_pipeline'] = {
+    @api.model
+    def _compute_dashboard_pipeline(self, ctx):
+        metrics = self._get_lead_metrics(ctx)
+        breakdown = self._get_lead_breakdown(ctx)
+        my_open_count = metrics['open_total']
+        my_revenue = metrics['open_revenue']
+        my_avg_deal = my_revenue / my_open_count if my_open_count else 0
+        return {
+            'my_pipeline': {
                 'expected_revenue': my_revenue,
                 'avg_deal': round(my_avg_deal),
-                'total_leads': len(my_open_leads)
-            }
-            
-            # --- My Funnel ---
-            unfolded_stages = self.env['crm.stage'].search([('fold', '=', False)])
-            unfolded_stage_ids = unfolded_stages.ids
-            stage_sequences = {s.id: s.sequence for s in unfolded_stages}
-            
-            my_stage_group = self.env['crm.lead'].read_group(
-                [('user_id', '=', uid), ('stage_id.fold', '=', False)],
-                ['stage_id'],
-                ['stage_id']
-            )
-            my_funnel = [{'stage_id': res['stage_id'][0], 'stage': res['stage_id'][1] if res['stage_id'] else 'Unknown', 'count': res['stage_id_count']} 
-                      for res in my_stage_group if res.get('stage_id') and res['stage_id'][0] in unfolded_stage_ids]
-            my_funnel.sort(key=lambda x: stage_sequences.get(x['stage_id'], 0))
-            data['my_funnel'] = my_funnel
-            
+                'total_leads': my_open_count
+            },
+            'my_funnel': self._prepare_funnel(ctx, breakdown['stage']),
+        }
+
+    @api.model
+    def _compute_dashboard_conversion(self, ctx):
+        """Personal conversion metrics"""
+        # All per-user lead counters come from a couple of grouped passes
+        # instead of one search_count per metric.
+        metrics = self._get_lead_metrics(ctx)
+        breakdown = self._get_lead_breakdown(ctx)
+
+        # User Win Rate
+        user_total = metrics['user_total']
+        user_won = metrics['user_won']
+        user_win_rate = round((user_won / user_total * 100) if user_total else 0, 1)
+
+        # Team Average
+        team_total = metrics['team_total']
+        team_won = metrics['team_won']
+        team_win_rate = round((team_won / team_total * 100) if team_total else 0, 1)
+
+        # Avg Time to Close
+        avg_close_time = metrics['user_won_day_close'] / user_won if user_won else 0
+
+        # Top 3 Lost Reasons
+        lost_group = sorted(breakdown['lost_reason'].items(), key=lambda x: x[1], reverse=True)[:3]
+        lost_reasons = self.env['crm.lost.reason'].browse([r[0] for r in lost_group])
+        lost_reason_names = {r.id: r.name for r in lost_reasons}
+        top_lost_reasons = [{'reason': lost_reason_names.get(r_id), 'count': count} for r_id, count in lost_group]
+
+        return {
+            'user_win_rate': user_win_rate,
+            'team_win_rate': team_win_rate,
+            'avg_close_time': round(avg_close_time, 1),
+            'top_lost_reasons': top_lost_reasons,
+            'converted_leads': user_won,
+            # Personal Trend Data
+            'trend_percent': self._get_trend_percent(ctx),
+            'this_week_won': metrics['this_week_won'],
+        }
+
+    @api.model
+    def _compute_dashboard_efficiency(self, ctx):
+        """Activity efficiency score"""
+        user_won = self._get_lead_metrics(ctx)['user_won']
+        completed_activities = self._get_activity_counts(ctx)['completed_total']
+        efficiency_score = round((user_won / completed_activities * 100) if completed_activities else 0, 1)
+        return {'efficiency_score': efficiency_score}
+
+    @api.model
+    def _compute_dashboard_leaderboard(self, ctx):
+        hidden_user_ids = self._get_hidden_user_ids(ctx)
+        # Last month top 3
+        first_of_month = ctx['today'].replace(day=1)
+        first_of_last_month = (first_of_month - timedelta(days=1)).replace(day=1)
+        won_last_month = [
+            res for res in self.env['crm.leaderboard.month'].sudo()._read_month(first_of_last_month)
+            if res['user_id'] not in hidden_user_ids
+        ][:3]
+        users = self.env['res.users'].sudo().browse([res['user_id'] for res in won_last_month])
+        last_month_leaderboard = [
+            {'name': user.name, 'won': res['won_count']}
+            for user, res in zip(users, won_last_month)
+        ]
+        return {
+            'leaderboard': self._get_month_leaderboard(ctx),
+            'last_month_leaderboard': last_month_leaderboard,
+        }
+
+    @api.model
+    def _compute_dashboard_coaching(self, ctx):
+        """Micro coaching tips"""
+        uid = ctx['uid']
+        metrics = self._get_lead_metrics(ctx)
+        breakdown = self._get_lead_breakdown(ctx)
+        activity_counts = self._get_activity_counts(ctx)
+        user_won = metrics['user_won']
+
+        coaching_tips = []
+        if breakdown['source']:
+            top_source_id, top_source_count = max(breakdown['source'].items(), key=lambda x: x[1])
+            top_source = self.env['utm.source'].browse(top_source_id)
+            coaching_tips.append({'msg': f"Leads from {top_source.name} work best for you ({top_source_count} wins).", 'icon': 'fa-check-circle text-success'})
+
+        user_won_leads_dates = self.env['crm.lead'].search_read([('user_id', '=', uid), ('stage_id.is_won', '=', True), ('date_closed', '!=', False)], ['date_closed'], limit=500)
+        if user_won_leads_dates:
+            import pytz
+            user_tz = pytz.timezone(self.env.user.tz or 'UTC')
+            hours = []
+            for l in user_won_leads_dates:
+                if l['date_closed']:
+                    utc_dt = pytz.utc.localize(l['date_closed'])
+                    user_dt = utc_dt.astimezone(user_tz)
+                    hours.append(user_dt.hour)
+
+            if hours:
+                best_hour = max(set(hours), key=hours.count)
+                time_of_day = "morning" if best_hour < 12 else "afternoon" if best_hour < 17 else "evening"
+                display_hour = best_hour if best_hour <= 12 else best_hour - 12
+                display_hour = 12 if display_hour == 0 else display_hour
+                am_pm = "AM" if best_hour < 12 else "PM"
+                coaching_tips.append({'msg': f"You close most of your deals in the {time_of_day} (around {display_hour}:00 {am_pm}).", 'icon': 'fa-clock-o text-primary'})
+
+        # --- Advanced Coaching Insights ---
+        leaderboard = self._get_month_leaderboard(ctx)
+        user_rank = next((r['rank'] for r in leaderboard if r['user_id'] == uid), None)
+        if user_rank and user_rank > 3:
+            top_3_won = next((r['won'] for r in leaderboard if r['rank'] == 3), 0)
+            diff = top_3_won - user_won
+            if diff > 0 and diff <= 5:
+                coaching_tips.append({'msg': f"You’re just {diff} deal{'s' if diff > 1 else ''} away from the Top 3!", 'icon': 'fa-bolt text-warning'})
+
+        trend_percent = self._get_trend_percent(ctx)
+        if trend_percent > 0:
+            coaching_tips.append({'msg': f"Great momentum! Your win rate improved by +{trend_percent}% vs last week.", 'icon': 'fa-line-chart text-success'})
+        elif trend_percent < 0:
+            coaching_tips.append({'msg': f"Your win volume dropped {abs(trend_percent)}% vs last week. Let's push hard!", 'icon': 'fa-line-chart text-danger'})
+
+        # Task Completion
+        due_today_count = activity_counts['due_today']
+        completed_today_count = activity_counts['completed_today']
+        total_today = due_today_count + completed_today_count
+        if total_today > 0:
+            pct = int((completed_today_count / total_today) * 100)
+            if pct > 0:
+                coaching_tips.append({'msg': f"{pct}% of your scheduled tasks for today are completed.", 'icon': 'fa-flag text-info'})
+
+        # Missed yesterday
+        missed_yesterday = activity_counts['missed_yesterday']
+        if missed_yesterday > 0:
+            coaching_tips.append({'msg': f"You missed {missed_yesterday} scheduled follow-up{'s' if missed_yesterday > 1 else ''} yesterday.", 'icon': 'fa-exclamation-triangle text-danger'})
+
+        # Neglected leads
+        neglected_leads = metrics['neglected_leads']
+        if neglected_leads > 0:
+            coaching_tips.append({'msg': f"{neglected_leads} active leads haven't had any updates in over 48 hours.", 'icon': 'fa-exclamation-triangle text-danger'})
+
+        # New leads waiting
+        new_leads = metrics['new_leads']
+        if new_leads > 0:
+            coaching_tips.append({'msg': f"You have {new_leads} leads in 'New' stage waiting to be contacted.", 'icon': 'fa-user-plus text-primary'})
+
+        # High priority win rate
+        high_priority_won = metrics['high_priority_won']
+        high_priority_total = metrics['high_priority_total']
+        if high_priority_total > 0:
+            hp_win_rate = int((high_priority_won / high_priority_total) * 100)
+            if hp_win_rate >= 50:
+                coaching_tips.append({'msg': f"Awesome! Your win rate on High Priority leads is {hp_win_rate}%.", 'icon': 'fa-fire text-danger'})
+
+        if len(coaching_tips) < 5:
+            coaching_tips.append({'msg': "Pro tip: Contacting new leads within 5 minutes increases conversion odds by 9x.", 'icon': 'fa-lightbulb-o text-warning'})
+
+        if not coaching_tips:
+            coaching_tips.append({'msg': "Keep following up on your activities to discover your best closing strategies.", 'icon': 'fa-lightbulb-o text-warning'})
+        return {'coaching_tips': coaching_tips}
+
+    @api.model
+    def _compute_dashboard_priority_queue(self, ctx):
+        uid = ctx['uid']
+        today = ctx['today']
+        Activity = self.env['mail.activity']
+        base_act_domain = [('user_id', '=', uid), ('res_model', '=', 'crm.lead')]
+
+        overdue_activities = Activity.search_read(
+            base_act_domain + [('date_deadline', '<', today)],
+            ['res_name', 'summary', 'date_deadline', 'res_id', 'activity_type_id'], limit=15
+        )
+        due_today_activities = Activity.search_read(
+            base_act_domain + [('date_deadline', '=', today)],
+            ['res_name', 'summary', 'date_deadline', 'res_id', 'activity_type_id'], limit=15
+        )
+        hot_leads_domain = [
+            ('user_id', '=', uid), ('stage_id.is_won', '=', False), ('active', '=', True),
+            '|', ('priority', '=', '3'), ('probability', '>=', 70)
+        ]
+        hot_leads = self.env['crm.lead'].search_read(hot_leads_domain, ['name', 'student_name', 'probability', 'priority'], limit=15)
+
+        all_act_res_ids = [a['res_id'] for a in overdue_activities + due_today_activities]
+        if all_act_res_ids:
+            act_leads = self.env['crm.lead'].search_read([('id', 'in', all_act_res_ids)], ['id', 'student_name', 'name'])
+            act_lead_map = {l['id']: (l['student_name'] or l['name']) for l in act_leads}
+            for act in overdue_activities + due_today_activities:
+                act['display_name'] = act_lead_map.get(act['res_id'], act['res_name'])
         else:
-            # NORMAL MANAGER LOGIC
-            
-            # --- 1. Problem Alerts ---
-            three_days_ago = fields.Datetime.now() - timedelta(days=3)
-            untouched_leads = self.env['crm.lead'].search_count([
-                ('stage_id.is_won', '=', False),
-                ('active', '=', True),
-                ('write_date', '<', three_days_ago),
-                ('stage_id.fold', '=', False)
-            ])
-            data['alert_untouched_leads'] = untouched_leads
-            data['domain_untouched_leads'] = [('stage_id.is_won', '=', False), ('active', '=', True), ('write_date', '<', three_days_ago.strftime('%Y-%m-%d %H:%M:%S')), ('stage_id.fold', '=', False)]
-
-            last_week_start = today - timedelta(days=14)
-            last_week_end = today - timedelta(days=7)
-            this_week_won = self.env['crm.lead'].search_count([
-                ('stage_id.is_won', '=', True),
-                ('date_closed', '>=', last_week_end)
-            ])
-            last_week_won = self.env['crm.lead'].search_count([
-                ('stage_id.is_won', '=', True),
-                ('date_closed', '>=', last_week_start),
-                ('date_closed', '<', last_week_end)
-            ])
-            data['alert_conversion_drop'] = last_week_won > this_week_won
-            data['this_week_won'] = this_week_won
-            data['last_week_won'] = last_week_won
-
-            # --- SmartHive DNA: System Health Score ---
-            total_pending = self.env['mail.activity'].search_count([('res_model', '=', 'crm.lead')])
-            thirty_days_ago = today - timedelta(days=30)
-            
-            try:
-                completed_30d = self.env['mail.message'].search_count([
-                    ('model', '=', 'crm.lead'), 
-                    ('subtype_id', '=', self.env.ref('mail.mt_activities').id),
-                    ('date', '>=', thirty_days_ago)
-                ])
-            except ValueError:
-                completed_30d = 0
-                
-            follow_up_score = round((completed_30d / (completed_30d + total_pending) * 100) if (completed_30d + total_pending) else 100)
+            for act in overdue_activities + due_today_activities:
+                act['display_name'] = act['res_name']
 
-            total_active = self.env['crm.lead'].search_count([('stage_id.is_won', '=', False), ('active', '=', True)])
-            response_score = round(100 - ((untouched_leads / total_active) * 100) if total_active else 100)
+        return {
+            'overdue_activities': overdue_activities,
+            'due_today_activities': due_today_activities,
+            'hot_leads': hot_leads,
+            'domain_hot_leads': hot_leads_domain,
+            'domain_overdue': base_act_domain + [('date_deadline', '<', today)],
+            'domain_due_today': base_act_domain + [('date_deadline', '=', today)],
+        }
 
-            total_won = self.env['crm.lead'].search_count([('stage_id.is_won', '=', True)])
-            total_lost = self.env['crm.lead'].search_count([('active', '=', False), ('probability', '=', 0)])
-            conversion_score = round((total_won / (total_won + total_lost) * 100) if (total_won + total_lost) else 0)
+    # NORMAL MANAGER LOGIC
 
-            overdue_pending = self.env['mail.activity'].search_count([('res_model', '=', 'crm.lead'), ('date_deadline', '<', today)])
-            overload_score = round(100 - ((overdue_pending / total_pending) * 100) if total_pending else 100)
+    @api.model
+    def _compute_dashboard_alerts(self, ctx):
+        """Problem alerts"""
+        today = ctx['today']
+        untouched_leads, three_days_ago = self._get_untouched_leads(ctx)
 
-            dna_score = round((follow_up_score + response_score + conversion_score + overload_score) / 4)
+        last_week_start = today - timedelta(days=14)
+        last_week_end = today - timedelta(days=7)
+        this_week_won = self.env['crm.lead'].search_count([
+            ('stage_id.is_won', '=', True),
+            ('date_closed', '>=', last_week_end)
+        ])
+        last_week_won = self.env['crm.lead'].search_count([
+            ('stage_id.is_won', '=', True),
+            ('date_closed', '>=', last_week_start),
+            ('date_closed', '<', last_week_end)
+        ])
+        return {
+            'alert_untouched_leads': untouched_leads,
+            'domain_untouched_leads': [('stage_id.is_won', '=', False), ('active', '=', True), ('write_date', '<', three_days_ago.strftime('%Y-%m-%d %H:%M:%S')), ('stage_id.fold', '=', False)],
+            'alert_conversion_drop': last_week_won > this_week_won,
+            'this_week_won': this_week_won,
+            'last_week_won': last_week_won,
+        }
 
-            data.update({
-                'dna_score': dna_score,
-                'dna_follow_up': follow_up_score,
-                'dna_response': response_score,
-                'dna_conversion': conversion_score,
-                'dna_overload': overload_score
-            })
+    @api.model
+    def _compute_dashboard_dna(self, ctx):
+        """SmartHive DNA: System Health Score"""
+        today = ctx['today']
+        lead_totals = self._get_lead_totals(ctx)
+        untouched_leads = self._get_untouched_leads(ctx)[0]
+
+        total_pending = self.env['mail.activity'].search_count([('res_model', '=', 'crm.lead')])
+        thirty_days_ago = today - timedelta(days=30)
+
+        completed_30d = self.env['crm.activity.done'].sudo().search_count([('done_date', '>=', thirty_days_ago)])
+
+        follow_up_score = round((completed_30d / (completed_30d + total_pending) * 100) if (completed_30d + total_pending) else 100)
 
-            # --- 2. Team Comparison Heatmap & Performance ---
-            heatmap_domain = []
-            if timeframe == 'month':
-                first_of_month = today.replace(day=1)
-                heatmap_domain = [('create_date', '>=', first_of_month)]
+        total_active = self.env['crm.lead'].search_count([('stage_id.is_won', '=', False), ('active', '=', True)])
+        response_score = round(100 - ((untouched_leads / total_active) * 100) if total_active else 100)
+
+        total_won = sum(row['won_count'] for row in lead_totals)
+        total_lost = sum(row['lost_count'] for row in lead_totals)
+        conversion_score = round((total_won / (total_won + total_lost) * 100) if (total_won + total_lost) else 0)
+
+        overdue_pending = self.env['mail.activity'].search_count([('res_model', '=', 'crm.lead'), ('date_deadline', '<', today)])
+        overload_score = round(100 - ((overdue_pending / total_pending) * 100) if total_pending else 100)
+
+        dna_score = round((follow_up_score + response_score + conversion_score + overload_score) / 4)
+
+        return {
+            'dna_score': dna_score,
+            'dna_follow_up': follow_up_score,
+            'dna_response': response_score,
+            'dna_conversion': conversion_score,
+            'dna_overload': overload_score
+        }
 
+    @api.model
+    def _compute_dashboard_heatmap(self, ctx):
+        """Team comparison heatmap & performance"""
+        hidden_user_ids = self._get_hidden_user_ids(ctx)
+        leads_per_user = {}
+        won_per_user = {}
+        if ctx['window']:
+            # plain range predicates on the indexed datetime columns
+            start, end = (datetime.combine(day, time.min) for day in ctx['window'])
             leads_group = self.env['crm.lead'].read_group(
-                heatmap_domain, 
-                ['user_id', 'stage_id'], 
-                ['user_id', 'stage_id'],
-                lazy=False
+                [('create_date', '>=', start), ('create_date', '<', end)],
+                ['user_id'],
+                ['user_id']
             )
-            
-            performance = {}
-            sales_users = self.env['res.users'].search([
-                ('share', '=', False),
-                ('groups_id', 'in', self.env.ref('sales_team.group_sale_salesman').id)
-            ])
-            for u in sales_users:
-                if u.id not in hidden_user_ids:
-                    performance[u.name] = {'user_id': u.id, 'total': 0, 'won': 0, 'stages': {}}
-            
             for res in leads_group:
-                user_id = res['user_id'][0] if res['user_id'] else False
-                if user_id in hidden_user_ids:
-                    continue
-                
-                user_name = res['user_id'][1] if res['user_id'] else 'Unassigned'
-                stage_name = res['stage_id'][1] if res['stage_id'] else 'New'
-                count = res['__count']
-                
-                if user_name not in performance:
-                    performance[user_name] = {'user_id': user_id, 'total': 0, 'won': 0, 'stages': {}}
-                
-                performance[user_name]['total'] += count
-                performance[user_name]['stages'][stage_name] = count
-            
-            won_domain = [('stage_id.is_won', '=', True)]
-            if timeframe == 'month':
-                won_domain.append(('date_closed', '>=', first_of_month))
-                
+                leads_per_user[res['user_id'][0] if res['user_id'] else False] = res['user_id_count']
             won_leads_group = self.env['crm.lead'].read_group(
-                won_domain,
+                [('stage_id.is_won', '=', True), ('date_closed', '>=', start), ('date_closed', '<', end)],
                 ['user_id'],
                 ['user_id']
             )
             for res in won_leads_group:
-                user_name = res['user_id'][1] if res['user_id'] else 'Unassigned'
-                if user_name in performance:
-                    performance[user_name]['won'] = res['user_id_count']
-            
-            perf_list = []
-            low_conversion_reps = 0
-            for user, stats in performance.items():
-                if stats['total'] == 0 and stats['won'] > 0:
-                    stats['total'] = stats['won']
-                win_rate = (stats['won'] / stats['total'] * 100) if stats['total'] > 0 else 0
-                if win_rate < 2 and stats['total'] > 0:
-                    low_conversion_reps += 1
-                perf_list.append({
-                    'user': user,
-                    'user_id': stats.get('user_id'),
-                    'total': stats['total'],
-                    'won': stats['won'],
-                    'win_rate': round(win_rate)
-                })
-            perf_list.sort(key=lambda x: x['won'], reverse=True)
-            data['salesperson_perf'] = perf_list
-            data['alert_low_conversion_reps'] = low_conversion_reps
-            
-            # --- 3. Lead Source Performance ---
-            source_group = self.env['crm.lead'].read_group(
-                [],
-                ['source_id', 'stage_id'],
-                ['source_id', 'stage_id'],
-                lazy=False
-            )
-            source_perf = {}
-            for res in source_group:
-                src_id = res['source_id'][0] if res['source_id'] else False
-                src_name = res['source_id'][1] if res['source_id'] else 'Unknown'
-                count = res['__count']
+                won_per_user[res['user_id'][0] if res['user_id'] else False] = res['user_id_count']
+        else:
+            for row in self._get_lead_totals(ctx):
+                user_id = row['user_id'] or False
+                if row['lead_active']:
+                    leads_per_user[user_id] = leads_per_user.get(user_id, 0) + row['lead_count']
+                if row['won_count']:
+                    won_per_user[user_id] = won_per_user.get(user_id, 0) + row['won_count']
+        user_names = {
+            u.id: u.name for u in self.env['res.users'].with_context(active_test=False).browse(
+                [u_id for u_id in set(leads_per_user) | set(won_per_user) if u_id])
+        }
+
+        performance = {}
+        sales_users = self.env['res.users'].browse(self.env['crm.dashboard.membership']._get_salesman_user_ids())
+        for u in sales_users:
+            if u.id not in hidden_user_ids:
+                performance[u.name] = {'user_id': u.id, 'total': 0, 'won': 0, 'stages': {}}
+
+        for user_id, count in leads_per_user.items():
+            if user_id in hidden_user_ids:
+                continue
+
+            user_name = user_names[user_id] if user_id else 'Unassigned'
+
+            if user_name not in performance:
+                performance[user_name] = {'user_id': user_id, 'total': 0, 'won': 0, 'stages': {}}
+
+            performance[user_name]['total'] += count
+
+        for user_id, count in won_per_user.items():
+            user_name = user_names[user_id] if user_id else 'Unassigned'
+            if user_name in performance:
+                performance[user_name]['won'] = count
+
+        perf_list = []
+        low_conversion_reps = 0
+        for user, stats in performance.items():
+            if stats['total'] == 0 and stats['won'] > 0:
+                stats['total'] = stats['won']
+            win_rate = (stats['won'] / stats['total'] * 100) if stats['total'] > 0 else 0
+            if win_rate < 2 and stats['total'] > 0:
+                low_conversion_reps += 1
+            perf_list.append({
+                'user': user,
+                'user_id': stats.get('user_id'),
+                'total': stats['total'],
+                'won': stats['won'],
+                'win_rate': round(win_rate)
+            })
+        perf_list.sort(key=lambda x: x['won'], reverse=True)
+        return {
+            'salesperson_perf': perf_list,
+            'alert_low_conversion_reps': low_conversion_reps,
+            'total_admissions': sum(stat['won'] for stat in perf_list),
+        }
+
+    @api.model
+    def _compute_dashboard_sources(self, ctx):
+        """Lead source performance"""
+        lead_totals = self._get_lead_totals(ctx)
+        source_names = {
+            src.id: src.name for src in self.env['utm.source'].browse(
+                list({row['source_id'] for row in lead_totals if row['source_id']}))
+        }
+        source_perf = {}
+        for row in sorted(lead_totals, key=lambda r: not r['lead_active']):
+            src_id = row['source_id'] or False
+            src_name = source_names[src_id] if src_id else 'Unknown'
+            if row['lead_active']:
                 if src_name not in source_perf:
                     source_perf[src_name] = {'source_id': src_id, 'total': 0, 'won': 0, 'lost': 0}
-                source_perf[src_name]['total'] += count
-            
-            source_won = self.env['crm.lead'].read_group(
-                [('stage_id.is_won', '=', True)],
-                ['source_id'],
-                ['source_id']
-            )
-            for res in source_won:
-                src_name = res['source_id'][1] if res['source_id'] else 'Unknown'
-                if src_name in source_perf:
-                    source_perf[src_name]['won'] = res['source_id_count']
-            
-            source_lost = self.env['crm.lead'].read_group(
-                [('active', '=', False)],
-                ['source_id'],
-                ['source_id']
-            )
-            for res in source_lost:
-                src_name = res['source_id'][1] if res['source_id'] else 'Unknown'
-                if src_name in source_perf:
-                    source_perf[src_name]['lost'] = res['source_id_count']
-
-            source_list = [{'source': k, **v} for k, v in source_perf.items()]
-            source_list.sort(key=lambda x: x['won'], reverse=True)
-            data['source_performance'] = source_list[:5]
-
-            # --- 4. Time-based Trends (Last 7 Days) ---
-            trend_dates = [(today - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(6, -1, -1)]
-            trend_admissions = {d: 0 for d in trend_dates}
-            trend_activities = {d: 0 for d in trend_dates}
-            
-            recent_won = self.env['crm.lead'].search_read([
-                ('stage_id.is_won', '=', True),
-                ('date_closed', '>=', trend_dates[0])
-            ], ['date_closed'])
-            for rw in recent_won:
-                d = rw['date_closed'].strftime('%Y-%m-%d') if rw['date_closed'] else None
-                if d in trend_admissions:
-                    trend_admissions[d] += 1
-                    
-            recent_activities = self.env['mail.message'].search_read([
-                ('model', '=', 'crm.lead'),
-                ('mail_activity_type_id', '!=', False),
-                ('date', '>=', trend_dates[0])
-            ], ['date'])
-            for ra in recent_activities:
-                d = ra['date'].strftime('%Y-%m-%d') if ra['date'] else None
-                if d in trend_activities:
-                    trend_activities[d] += 1
-
-            data['time_trends'] = {
+                source_perf[src_name]['total'] += row['lead_count']
+                source_perf[src_name]['won'] += row['won_count']
+            elif src_name in source_perf:
+                source_perf[src_name]['lost'] += row['lead_count']
+
+        source_list = [{'source': k, **v} for k, v in source_perf.items()]
+        source_list.sort(key=lambda x: x['won'], reverse=True)
+        return {'source_performance': source_list[:5]}
+
+    @api.model
+    def _compute_dashboard_trends(self, ctx):
+        """Time-based trends (last 7 days)"""
+        today = ctx['today']
+        trend_dates = [(today - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(6, -1, -1)]
+        trend_admissions = {d: 0 for d in trend_dates}
+        trend_activities = {d: 0 for d in trend_dates}
+
+        recent_won = self.env['crm.lead'].search_read([
+            ('stage_id.is_won', '=', True),
+            ('date_closed', '>=', trend_dates[0])
+        ], ['date_closed'])
+        for rw in recent_won:
+            d = rw['date_closed'].strftime('%Y-%m-%d') if rw['date_closed'] else None
+            if d in trend_admissions:
+                trend_admissions[d] += 1
+
+        recent_activities = self.env['crm.activity.done'].sudo()._read_daily_counts(trend_dates[0])
+        for day, count in recent_activities.items():
+            d = day.strftime('%Y-%m-%d')
+            if d in trend_activities:
+                trend_activities[d] += count
+
+        return {
+            'time_trends': {
                 'labels': [d[-5:] for d in trend_dates],
                 'admissions': [trend_admissions[d] for d in trend_dates],
                 'activities': [trend_activities[d] for d in trend_dates]
             }
+        }
 
-            # --- 5. Funnel Conversion View ---
-            unfolded_stages = self.env['crm.stage'].search([('fold', '=', False)])
-            unfolded_stage_ids = unfolded_stages.ids
-            stage_sequences = {s.id: s.sequence for s in unfolded_stages}
-            
-            stage_group = self.env['crm.lead'].read_group(
-                [('stage_id.fold', '=', False)],
-                ['stage_id'],
-                ['stage_id']
-            )
-            funnel = [{'stage_id': res['stage_id'][0], 'stage': res['stage_id'][1] if res['stage_id'] else 'Unknown', 'count': res['stage_id_count']} 
-                      for res in stage_group if res.get('stage_id') and res['stage_id'][0] in unfolded_stage_ids]
-            funnel.sort(key=lambda x: stage_sequences.get(x['stage_id'], 0))
-            data['funnel'] = funnel
-
-            # --- 6. Revenue Intelligence ---
-            students = self.env['student.student'].search_read(
-                [('lead_id', '!=', False)],
-                ['paid_amount', 'enrollment_date', 'user_id', 'lead_id']
-            )
-            
-            total_revenue = sum(s.get('paid_amount', 0) for s in students)
-            
-            today_str = today.strftime('%Y-%m-%d')
-            month_str = today.strftime('%Y-%m')
-            
-            today_revenue = sum(s.get('paid_amount', 0) for s in students if s.get('enrollment_date') and str(s.get('enrollment_date')).startswith(today_str))
-            month_revenue = sum(s.get('paid_amount', 0) for s in students if s.get('enrollment_date') and str(s.get('enrollment_date')).startswith(month_str))
-            
-            revenue_per_rep = {}
-            for s in students:
-                rep_name = s['user_id'][1] if s.get('user_id') else 'Unassigned'
-                if rep_name not in revenue_per_rep:
-                    revenue_per_rep[rep_name] = 0
-                revenue_per_rep[rep_name] += s.get('paid_amount', 0)
-                
-            rev_rep_list = [{'rep': k, 'revenue': v} for k, v in revenue_per_rep.items()]
-            rev_rep_list.sort(key=lambda x: x['revenue'], reverse=True)
-            
-            avg_deal_value = total_revenue / len(students) if students else 0
-            
-            open_leads = self.env['crm.lead'].search_read(
-                [('stage_id.is_won', '=', False), ('active', '=', True)],
-                ['expected_revenue', 'course_interested']
-            )
-            
-            forecasted_revenue = 0
-            course_ids = [l['course_interested'][0] for l in open_leads if l.get('course_interested')]
-            course_prices = {}
-            if course_ids:
-                courses = self.env['product.product'].search_read([('id', 'in', course_ids)], ['id', 'list_price'])
-                course_prices = {c['id']: c['list_price'] for c in courses}
-                
-            for l in open_leads:
-                if l.get('course_interested') and l['course_interested'][0] in course_prices:
-                    forecasted_revenue += course_prices[l['course_interested'][0]]
-                elif l.get('expected_revenue'):
-                    forecasted_revenue += l['expected_revenue']
-                    
-            data['revenue'] = {
+    @api.model
+    def _compute_dashboard_funnel(self, ctx):
+        """Funnel conversion view"""
+        lead_totals = self._get_lead_totals(ctx)
+        unfolded_stage_ids = self._get_unfolded_stages(ctx).ids
+        stage_counts = {}
+        for row in lead_totals:
+            if row['lead_active'] and row['stage_id'] in unfolded_stage_ids:
+                stage_counts[row['stage_id']] = stage_counts.get(row['stage_id'], 0) + row['lead_count']
+
+        closure_count = sum(row['closure_count'] for row in lead_totals)
+        if closure_count:
+            avg_days = round(sum(row['closure_days'] for row in lead_totals) / closure_count, 1)
+        else:
+            avg_days = 0
+        return {
+            'funnel': self._prepare_funnel(ctx, stage_counts),
+            'avg_lead_closure_days': avg_days,
+        }
+
+    @api.model
+    def _compute_dashboard_revenue(self, ctx):
+        """Revenue intelligence"""
+        today = ctx['today']
+        revenue_totals = self.env['crm.dashboard.snapshot']._read_revenue_totals(today.replace(day=1), today)
+
+        total_revenue = sum(r['revenue'] for r in revenue_totals)
+        student_count = sum(r['student_count'] for r in revenue_totals)
+        today_revenue = sum(r['today_revenue'] for r in revenue_totals)
+        month_revenue = sum(r['month_revenue'] for r in revenue_totals)
+
+        rep_names = {
+            u.id: u.name for u in self.env['res.users'].with_context(active_test=False).browse(
+                [r['user_id'] for r in revenue_totals if r['user_id']])
+        }
+        revenue_per_rep = {}
+        for r in revenue_totals:
+            rep_name = rep_names[r['user_id']] if r['user_id'] else 'Unassigned'
+            if rep_name not in revenue_per_rep:
+                revenue_per_rep[rep_name] = 0
+            revenue_per_rep[rep_name] += r['revenue']
+
+        rev_rep_list = [{'rep': k, 'revenue': v} for k, v in revenue_per_rep.items()]
+        rev_rep_list.sort(key=lambda x: x['revenue'], reverse=True)
+
+        avg_deal_value = total_revenue / student_count if student_count else 0
+
+        open_leads = self.env['crm.lead'].search_read(
+            [('stage_id.is_won', '=', False), ('active', '=', True)],
+            ['expected_revenue', 'course_interested']
+        )
+
+        forecasted_revenue = 0
+        course_ids = [l['course_interested'][0] for l in open_leads if l.get('course_interested')]
+        course_prices = {}
+        if course_ids:
+            courses = self.env['product.product'].search_read([('id', 'in', course_ids)], ['id', 'list_price'])
+            course_prices = {c['id']: c['list_price'] for c in courses}
+
+        for l in open_leads:
+            if l.get('course_interested') and l['course_interested'][0] in course_prices:
+                forecasted_revenue += course_prices[l['course_interested'][0]]
+            elif l.get('expected_revenue'):
+                forecasted_revenue += l['expected_revenue']
+
+        return {
+            'revenue': {
                 'total': total_revenue,
                 'today': today_revenue,
                 'month': month_revenue,
@@ -642,167 +1050,332 @@ class CrmDashboard(models.AbstractModel):
                 'forecast': forecasted_revenue,
                 'per_rep': rev_rep_list[:5]
             }
+        }
 
-            # Global pending activities
-            Activity = self.env['mail.activity']
-            admin_domain = [('res_model', '=', 'crm.lead')]
-            
-            today_activities = Activity.search_read(
-                admin_domain + [('date_deadline', '<=', today)],
-                ['res_name', 'summary', 'date_deadline', 'res_id', 'user_id'],
-                limit=20
-            )
-            
-            week_activities = Activity.search_read(
-                admin_domain + [('date_deadline', '>', today), ('date_deadline', '<=', end_of_week)],
-                ['res_name', 'summary', 'date_deadline', 'res_id', 'user_id'],
-                limit=20
-            )
-            
-            lead_ids = [act['res_id'] for act in today_activities + week_activities]
-            if lead_ids:
-                leads_data = self.env['crm.lead'].search_read([('id', 'in', lead_ids)], ['id', 'student_name', 'name'])
-                lead_map = {l['id']: (l['student_name'] or l['name']) for l in leads_data}
-            else:
-                lead_map = {}
-                
-            for act in today_activities + week_activities:
-                act['display_name'] = lead_map.get(act['res_id'], act['res_name'])
-                if act.get('user_id'):
-                    act['user_name'] = act['user_id'][1]
-            
-            team_today_count = Activity.search_count(admin_domain + [('date_deadline', '<=', today)])
-            team_week_count = Activity.search_count(admin_domain + [('date_deadline', '>', today), ('date_deadline', '<=', end_of_week)])
-            
-            completed_count = self.env['mail.message'].search_count([
-                ('model', '=', 'crm.lead'),
-                ('mail_activity_type_id', '!=', False)
-            ])
-            
-            data['team_activities_today'] = today_activities
-            data['team_activities_week'] = week_activities
-            data['team_today_count'] = team_today_count
-            data['team_week_count'] = team_week_count
-            data['team_completed_count'] = completed_count
-            
-            won_leads = self.env['crm.lead'].search_read(
-                [('stage_id.is_won', '=', True), ('date_closed', '!=', False), ('create_date', '!=', False)],
-                ['create_date', 'date_closed']
-            )
-            if won_leads:
-                total_seconds = sum((l['date_closed'] - l['create_date']).total_seconds() for l in won_leads)
-                avg_days = (total_seconds / len(won_leads)) / 86400.0
-                data['avg_lead_closure_days'] = round(avg_days, 1)
-            else:
-                data['avg_lead_closure_days'] = 0
-            
-            data['total_admissions'] = sum(stat['won'] for stat in perf_list)
-            data['admin_sticky_note'] = self.env['ir.config_parameter'].sudo().get_param(f'dashboard_sticky_note_{uid}', default='')
-            
-        return data
+    @api.model
+    def _compute_dashboard_team_activities(self, ctx):
+        """Global pending activities"""
+        today = ctx['today']
+        end_of_week = today + timedelta(days=7)
+        Activity = self.env['mail.activity']
+        admin_domain = [('res_model', '=', 'crm.lead')]
+
+        today_activities = Activity.search_read(
+            admin_domain + [('date_deadline', '<=', today)],
+            ['res_name', 'summary', 'date_deadline', 'res_id', 'user_id'],
+            limit=20
+        )
+
+        week_activities = Activity.search_read(
+            admin_domain + [('date_deadline', '>', today), ('date_deadline', '<=', end_of_week)],
+            ['res_name', 'summary', 'date_deadline', 'res_id', 'user_id'],
+            limit=20
+        )
+
+        lead_ids = [act['res_id'] for act in today_activities + week_activities]
+        if lead_ids:
+            leads_data = self.env['crm.lead'].search_read([('id', 'in', lead_ids)], ['id', 'student_name', 'name'])
+            lead_map = {l['id']: (l['student_name'] or l['name']) for l in leads_data}
+        else:
+            lead_map = {}
+
+        for act in today_activities + week_activities:
+            act['display_name'] = lead_map.get(act['res_id'], act['res_name'])
+            if act.get('user_id'):
+                act['user_name'] = act['user_id'][1]
+
+        return {
+            'team_activities_today': today_activities,
+            'team_activities_week': week_activities,
+            'team_today_count': Activity.search_count(admin_domain + [('date_deadline', '<=', today)]),
+            'team_week_count': Activity.search_count(admin_domain + [('date_deadline', '>', today), ('date_deadline', '<=', end_of_week)]),
+            'team_completed_count': self.env['crm.dashboard.snapshot']._read_completed_activity_count(),
+        }
+
+    def _get_lead_selection(self, domain, active_test=True):
+        """SQL selecting the ids of the leads matching ``domain`` and the
+        access rules of the user (the multi-company ones included), for the
+        aggregate queries of the dashboard to filter on"""
+        Lead = self.env['crm.lead'].with_context(active_test=active_test)
+        query = Lead._where_calc(domain)
+        Lead._apply_ir_rules(query, 'read')
+        return query.subselect()
+
+    def _get_salesperson_lead_metrics(self, uid, today):
+        """Compute every scalar per-user lead counter of the salesperson
+        dashboard in a single pass over the assigned active leads."""
+        self.env['crm.lead'].flush_model()
+        self.env['mail.activity'].flush_model(['res_model', 'res_id', 'active'])
+        new_stage_ids = self.env['crm.stage'].search([('name', 'ilike', 'new')]).ids
+        last_week_start = today - timedelta(days=14)
+        last_week_end = today - timedelta(days=7)
+        # leads without stage are open leads
+        self.env.cr.execute(SQL("""
+            SELECT
+                COUNT(*) FILTER (WHERE l.user_id = %(uid)s) AS user_total,
+                COUNT(*) FILTER (WHERE l.user_id = %(uid)s AND s.is_won) AS user_won,
+                COALESCE(SUM(l.day_close) FILTER (WHERE l.user_id = %(uid)s AND s.is_won), 0) AS user_won_day_close,
+                COUNT(*) AS team_total,
+                COUNT(*) FILTER (WHERE s.is_won) AS team_won,
+                COUNT(*) FILTER (
+                    WHERE l.user_id = %(uid)s AND s.is_won AND l.date_closed >= %(last_week_end)s
+                ) AS this_week_won,
+                COUNT(*) FILTER (
+                    WHERE l.user_id = %(uid)s AND s.is_won
+                    AND l.date_closed >= %(last_week_start)s AND l.date_closed < %(last_week_end)s
+                ) AS last_week_won,
+                COUNT(*) FILTER (
+                    WHERE l.user_id = %(uid)s AND s.is_won IS NOT TRUE AND l.write_date < %(two_days_ago)s
+                    AND NOT EXISTS (
+                        SELECT 1 FROM mail_activity a
+                        WHERE a.res_model = 'crm.lead' AND a.res_id = l.id AND a.active
+                    )
+                ) AS neglected_leads,
+                COUNT(*) FILTER (WHERE l.user_id = %(uid)s AND l.stage_id = ANY(%(new_stage_ids)s)) AS new_leads,
+                COUNT(*) FILTER (WHERE l.user_id = %(uid)s AND l.priority = '3') AS high_priority_total,
+                COUNT(*) FILTER (WHERE l.user_id = %(uid)s AND l.priority = '3' AND s.is_won) AS high_priority_won,
+                COUNT(*) FILTER (WHERE l.user_id = %(uid)s AND s.is_won IS NOT TRUE) AS open_total,
+                COALESCE(SUM(l.expected_revenue) FILTER (
+                    WHERE l.user_id = %(uid)s AND s.is_won IS NOT TRUE
+                ), 0)::float AS open_revenue
+            FROM crm_lead l
+            LEFT JOIN crm_stage s ON s.id = l.stage_id
+            WHERE l.id IN (%(leads)s)
+        """,
+            uid=uid,
+            last_week_start=last_week_start,
+            last_week_end=last_week_end,
+            two_days_ago=fields.Datetime.now() - timedelta(days=2),
+            new_stage_ids=new_stage_ids,
+            leads=self._get_lead_selection([('user_id', '!=', False)]),
+        ))
+        return self.env.cr.dictfetchone()
+
+    def _get_salesperson_lead_breakdown(self, uid):
+        """Return the grouped breakdowns of the user's leads (won per source,
+        lost per reason, active per stage) computed in one grouped pass."""
+        self.env.cr.execute(SQL("""
+            SELECT
+                l.source_id,
+                l.lost_reason_id,
+                l.stage_id,
+                GROUPING(l.source_id) AS by_source,
+                GROUPING(l.lost_reason_id) AS by_lost_reason,
+                COUNT(*) FILTER (WHERE l.active AND s.is_won) AS won_count,
+                COUNT(*) FILTER (WHERE NOT l.active) AS inactive_count,
+                COUNT(*) FILTER (WHERE l.active) AS active_count
+            FROM crm_lead l
+            LEFT JOIN crm_stage s ON s.id = l.stage_id
+            WHERE l.id IN (%s)
+            GROUP BY GROUPING SETS ((l.source_id), (l.lost_reason_id), (l.stage_id))
+        """, self._get_lead_selection([('user_id', '=', uid)], active_test=False)))
+        breakdown = {'source': {}, 'lost_reason': {}, 'stage': {}}
+        for row in self.env.cr.dictfetchall():
+            if row['by_source'] == 0:
+                if row['source_id'] and row['won_count']:
+                    breakdown['source'][row['source_id']] = row['won_count']
+            elif row['by_lost_reason'] == 0:
+                if row['lost_reason_id'] and row['inactive_count']:
+                    breakdown['lost_reason'][row['lost_reason_id']] = row['inactive_count']
+            elif row['stage_id'] and row['active_count']:
+                breakdown['stage'][row['stage_id']] = row['active_count']
+        return breakdown
+
+    def _get_salesperson_activity_counts(self, uid, today):
+        """Count the user's due/missed and completed activities in one round
+        trip."""
+        self.env['mail.activity'].flush_model()
+        self.env['crm.activity.done'].flush_model(['user_id', 'done_date'])
+        yesterday = today - timedelta(days=1)
+        Activity = self.env['mail.activity']
+        # archived activities are done ones kept by their type
+        activities = Activity._where_calc([
+            ('res_model', '=', 'crm.lead'),
+            ('user_id', '=', uid),
+            ('date_deadline', 'in', [yesterday, today]),
+        ])
+        Activity._apply_ir_rules(activities, 'read')
+        self.env.cr.execute(SQL("""
+            SELECT
+                (SELECT COUNT(*) FROM mail_activity
+                 WHERE id IN (%(activities)s) AND active AND date_deadline = %(today)s) AS due_today,
+                (SELECT COUNT(*) FROM mail_activity
+                 WHERE id IN (%(activities)s) AND active AND date_deadline = %(yesterday)s) AS missed_yesterday,
+                m.completed_total,
+                m.completed_today
+            FROM (
+                SELECT
+                    COUNT(*) AS completed_total,
+                    COUNT(*) FILTER (WHERE done_date >= %(today_start)s) AS completed_today
+                FROM crm_activity_done
+                WHERE user_id = %(uid)s
+            ) m
+        """,
+            uid=uid,
+            today=today,
+            yesterday=yesterday,
+            today_start=datetime.combine(today, time.min),
+            activities=activities.subselect(),
+        ))
+        return self.env.cr.dictfetchone()
 
     @api.model
     def get_ai_suggestions(self):
-        uid = self.env.uid
-        api_key = self.env['ir.config_parameter'].sudo().get_param('institute_crm.openrouter_api_key')
-        ai_suggestions = []
+        """Queue the AI suggestions of the current user.
+
+        The suggestions are generated in the background; the dashboard waits
+        for the bus notification of the returned job, polling
+        get_ai_suggestion_job as a safety net.
+        """
+        return self.env['crm.ai.suggestion.job']._enqueue('dashboard')._get_status()
+
+    @api.model
+    def get_ai_suggestion_job(self, job_id):
+        """Status and, once finished, suggestions of a queued job"""
+        job = self.env['crm.ai.suggestion.job'].sudo().browse(job_id).exists()
+        if not job or job.user_id != self.env.user:
+            return {'job_id': job_id, 'state': 'failed', 'result': self._get_fallback_ai_suggestion(None)}
+        return job._get_status()
+
+    @api.model
+    def get_ai_suggestion_fallback(self):
+        """Rule-based suggestions, shown by the dashboard when its job is
+        not processed in time"""
+        return {'job_id': False, 'state': 'failed', 'result': self._get_fallback_ai_suggestion(None)}
+
+    @api.model
+    def _prepare_ai_suggestion_messages(self):
+        """Build the prompts of the dashboard suggestions.
+
+        The user's top leads are packed into as few prompts as fit the
+        token budget; returns ``(messages, leads)`` pairs, none without leads.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        lead_count = int(ICP.get_param('institute_crm.ai_dashboard_lead_count', AI_DASHBOARD_LEAD_COUNT) or AI_DASHBOARD_LEAD_COUNT)
+        token_budget = int(ICP.get_param('institute_crm.ai_prompt_token_budget', AI_PROMPT_TOKEN_BUDGET) or AI_PROMPT_TOKEN_BUDGET)
+        # Fetch the top active, non-won leads
+        target_leads = self.env['crm.lead'].search([
+            ('user_id', '=', self.env.uid),
+            ('stage_id.is_won', '=', False),
+            ('active', '=', True)
+        ], limit=lead_count, order='priority desc, write_date desc')
+        
+        # Fetch up to 3 recent logs of every lead at once
+        logs = target_leads._read_ai_recent_logs(3)
+        contexts = []
+        for lead in target_leads:
+            log_text = " \\n ".join([f"({date}) {body}" for date, body in logs.get(lead.id, [])])
+            contexts.append((lead, {
+                'lead_id': lead.id,
+                'lead_name': lead.student_name or lead.name or 'Unknown Lead',
+                'recent_logs': log_text
+            }))
         
-        if OpenAI and api_key:
+        prompts = []
+        batch, batch_size = [], 0
+        for lead, context in contexts:
+            # rough estimate of 4 characters per token
+            size = len(json.dumps(context)) // 4
+            if batch and batch_size + size > token_budget:
+                prompts.append(self._build_ai_suggestion_prompt(batch))
+                batch, batch_size = [], 0
+            batch.append((lead, context))
+            batch_size += size
+        if batch:
+            prompts.append(self._build_ai_suggestion_prompt(batch))
+        return prompts
+
+    @api.model
+    def _build_ai_suggestion_prompt(self, batch):
+        """Prompt asking for the suggestions of a batch of ``(lead, context)``"""
+        prompt_context = [context for lead, context in batch]
+        count = len(prompt_context)
+        salesperson_name = self.env.user.name or 'Salesperson'
+        company_name = self.env.company.name or 'our Institution'
+        sys_prompt = f"You are an AI sales assistant for {company_name}. The salesperson handling these leads is {salesperson_name}, and your goal is to sell admission into our courses (do not refer to 'products' or 'solutions', use 'courses' or 'programs'). Review the context for {count} leads. Suggest a short next action and a very brief, casual draft response (e.g. WhatsApp length) for each. Output carefully structured strict JSON ONLY, resolving into an array of EXACTLY {count} objects with keys: `lead_id` (integer), `lead_name` (string), `suggested_action` (string), and `draft_message` (string). No markdown block backticks around the json."
+        user_prompt = f"Leads Context: {json.dumps(prompt_context)}"
+        leads = self.env['crm.lead'].union(*[lead for lead, context in batch])
+        return [
+            {"role": "system", "content": sys_prompt},
+            {"role": "user", "content": user_prompt}
+        ], leads
+
+    @api.model
+    def _parse_ai_suggestion(self, results):
+        """Map the suggestions of the ``(leads, answer)`` results back to
+        their leads, in the order of the leads"""
+        by_lead = {}
+        for leads, content in results:
             try:
-                # Fetch 2 active, non-won leads
-                target_leads = self.env['crm.lead'].search([
-                    ('user_id', '=', uid),
-                    ('stage_id.is_won', '=', False),
-                    ('active', '=', True)
-                ], limit=2, order='priority desc, write_date desc')
-                
-                if target_leads:
-                    prompt_context = []
-                    for lead in target_leads:
-                        # Fetch up to 3 recent logs
-                        logs = self.env['mail.message'].search_read([
-                            ('model', '=', 'crm.lead'),
-                            ('res_id', '=', lead.id),
-                            ('message_type', 'in', ['comment', 'email'])
-                        ], ['body', 'date'], limit=3, order='date desc')
-                        
-                        log_text = " \\n ".join([f"({log['date']}) {log['body']}" for log in logs])
-                        
-                        prompt_context.append({
-                            'lead_id': lead.id,
-                            'lead_name': lead.student_name or lead.name or 'Unknown Lead',
-                            'recent_logs': log_text
-                        })
-                        
-                    # Build prompt
-                    salesperson_name = self.env.user.name or 'Salesperson'
-                    company_name = self.env.company.name or 'our Institution'
-                    sys_prompt = f"You are an AI sales assistant for {company_name}. The salesperson handling these leads is {salesperson_name}, and your goal is to sell admission into our courses (do not refer to 'products' or 'solutions', use 'courses' or 'programs'). Review the context for 2 leads. Suggest a short next action and a very brief, casual draft response (e.g. WhatsApp length) for each. Output carefully structured strict JSON ONLY, resolving into an array of EXACTLY 2 objects with keys: `lead_id` (integer), `lead_name` (string), `suggested_action` (string), and `draft_message` (string). No markdown block backticks around the json."
-                    user_prompt = f"Leads Context: {json.dumps(prompt_context)}"
-                    
-                    client = OpenAI(
-                        base_url="https://openrouter.ai/api/v1",
-                        api_key=api_key
-                    )
-                    
-                    response = client.chat.completions.create(
-                        model="qwen/qwen-2.5-7b-instruct",
-                        messages=[
-                            {"role": "system", "content": sys_prompt},
-                            {"role": "user", "content": user_prompt}
-                        ],
-                        temperature=0.7,
-                        response_format={"type": "json_object"}
-                    )
-                    
-                    resp_content = response.choices[0].message.content
-                    if resp_content:
-                        # Strip potential markdown formatting sometimes returned by qwen despite instructions
-                        resp_content = resp_content.strip()
-                        if resp_content.startswith('```json'):
-                            resp_content = resp_content[7:]
-                        if resp_content.startswith('```'):
-                            resp_content = resp_content[3:]
-                        if resp_content.endswith('```'):
-                            resp_content = resp_content[:-3]
-                            
-                        parsed_data = json.loads(resp_content)
-                        # Handle both object wrapped array or direct array
-                        if isinstance(parsed_data, dict):
-                            for key, val in parsed_data.items():
-                                if isinstance(val, list):
-                                    ai_suggestions = val
-                                    break
-                            if not ai_suggestions:
-                                ai_suggestions = [parsed_data]
-                        elif isinstance(parsed_data, list):
-                            ai_suggestions = parsed_data
-                            
-            except Exception as e:
-                _logger.error("OpenRouter AI Suggestion Generation Failed: %s", str(e))
+                suggestions = self._read_ai_suggestion_list(content)
+            except ValueError as e:
+                _logger.error("Invalid AI suggestion answer for leads %s: %s", leads.ids, str(e))
+                continue
+            for index, suggestion in enumerate(suggestions):
+                if not isinstance(suggestion, dict):
+                    continue
+                try:
+                    lead_id = int(suggestion.get('lead_id'))
+                except (TypeError, ValueError):
+                    lead_id = None
+                if lead_id not in leads.ids:
+                    # the model lost the lead id: rely on the position
+                    if index >= len(leads):
+                        continue
+                    lead_id = leads[index].id
+                by_lead[lead_id] = dict(suggestion, lead_id=lead_id)
+        ai_suggestions = []
+        for leads, content in results:
+            for lead in leads:
+                if lead.id in by_lead:
+                    suggestion = by_lead.pop(lead.id)
+                    suggestion.setdefault('lead_name', lead.student_name or lead.name)
+                    ai_suggestions.append(suggestion)
+        return ai_suggestions
+
+    @api.model
+    def _read_ai_suggestion_list(self, content):
+        """Read the suggestion list out of the model's answer"""
+        ai_suggestions = []
+        if content:
+            parsed_data = parse_llm_json(content)
+            # Handle both object wrapped array or direct array
+            if isinstance(parsed_data, dict):
+                for key, val in parsed_data.items():
+                    if isinstance(val, list):
+                        ai_suggestions = val
+                        break
+                if not ai_suggestions:
+                    ai_suggestions = [parsed_data]
+            elif isinstance(parsed_data, list):
+                ai_suggestions = parsed_data
+        return ai_suggestions
+
+    @api.model
+    def _get_fallback_ai_suggestion(self, error):
+        """Rule-based suggestions, used when the API fails, the key is
+        missing or openai is absent"""
+        uid = self.env.uid
+        last_week = fields.Datetime.now() - timedelta(days=3)
+        forgotten_lead = self.env['crm.lead'].search([
+            ('user_id', '=', uid),
+            ('stage_id.is_won', '=', False),
+            ('write_date', '<', last_week)
+        ], limit=1, order='priority desc, write_date asc')
         
-        if not ai_suggestions:
-            # Fallback to old basic query if API fails, key missing, or openai absent
-            last_week = fields.Datetime.now() - timedelta(days=3)
-            forgotten_lead = self.env['crm.lead'].search([
-                ('user_id', '=', uid),
-                ('stage_id.is_won', '=', False),
-                ('write_date', '<', last_week)
-            ], limit=1, order='priority desc, write_date asc')
-            
-            if forgotten_lead:
-                ai_suggestions = [{
-                    'lead_id': forgotten_lead.id,
-                    'lead_name': forgotten_lead.student_name or forgotten_lead.name,
-                    'suggested_action': f"Lead '{forgotten_lead.student_name or forgotten_lead.name}' hasn't been updated in over 3 days.",
-                    'draft_message': "Send a follow up WhatsApp to check on their interest."
-                }]
-            else:
-                ai_suggestions = [{
-                     'lead_id': False,
-                     'lead_name': False,
-                     'suggested_action': "Awesome! You're all caught up.",
-                     'draft_message': "Keep finding new prospects and creating leads."
-                }]
+        if forgotten_lead:
+            ai_suggestions = [{
+                'lead_id': forgotten_lead.id,
+                'lead_name': forgotten_lead.student_name or forgotten_lead.name,
+                'suggested_action': f"Lead '{forgotten_lead.student_name or forgotten_lead.name}' hasn't been updated in over 3 days.",
+                'draft_message': "Send a follow up WhatsApp to check on their interest."
+            }]
+        else:
+            ai_suggestions = [{
+                 'lead_id': False,
+                 'lead_name': False,
+                 'suggested_action': "Awesome! You're all caught up.",
+                 'draft_message': "Keep finding new prospects and creating leads."
+            }]
                 
         return ai_suggestions
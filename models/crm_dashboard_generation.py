@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, tools
+
+
+class CrmDashboardGeneration(models.Model):
+    """Generations of the cached dashboards, shared by all the workers.
+
+    The generations of a dashboard are part of its cache keys: the entries
+    cached by any worker before a change are not read anymore once the
+    change is committed.
+
+    A generation is bumped by inserting a row in the transaction of the
+    change, and is the last id of its scope: concurrent changes never wait
+    on each other, and no commit is added. ``scope`` is ``user,<id>`` for
+    the dashboard of one user, ``company,<id>`` for the dashboards of the
+    managers of a company (``company,0`` for the records without company)
+    and ``all`` for every dashboard.
+    """
+    _name = 'crm.dashboard.generation'
+    _description = 'CRM Dashboard Cache Generation'
+    _log_access = False
+
+    scope = fields.Char(string='Scope', required=True)
+
+    def init(self):
+        tools.create_index(self.env.cr, 'crm_dashboard_generation_scope_id_index', self._table, ['scope', 'id'])
+
+    @api.model
+    def _get_scopes(self, uid, is_manager, company_ids):
+        """Scopes of the dashboard of ``uid`` for the allowed ``company_ids``"""
+        scopes = [f'user,{uid}', 'all']
+        if is_manager:
+            scopes += [f'company,{company_id}' for company_id in [0] + sorted(company_ids)]
+        return scopes
+
+    @api.model
+    def _read_generations(self, uid, is_manager, company_ids):
+        """Generations of the dashboard of ``uid``, as a tuple"""
+        # one backward index scan per scope
+        self.env.cr.execute("""
+            SELECT (SELECT MAX(g.id) FROM crm_dashboard_generation g WHERE g.scope = s.scope)
+            FROM unnest(%s::varchar[]) WITH ORDINALITY AS s (scope, position)
+            ORDER BY s.position
+        """, [self._get_scopes(uid, is_manager, company_ids)])
+        return tuple(row[0] or 0 for row in self.env.cr.fetchall())
+
+    @api.model
+    def _bump(self, user_ids=(), company_ids=(), everyone=False):
+        """Bump the generations of the dashboards of ``user_ids`` and of the
+        managers of ``company_ids``, or of every dashboard"""
+        if everyone:
+            scopes = ['all']
+        else:
+            scopes = [f'user,{uid}' for uid in sorted(set(user_ids))]
+            scopes += [f'company,{company_id}' for company_id in sorted(set(company_ids))]
+        if scopes:
+            self.env.cr.execute("""
+                INSERT INTO crm_dashboard_generation (scope) SELECT unnest(%s::varchar[])
+            """, [scopes])
+
+    @api.autovacuum
+    def _gc_generations(self):
+        """Delete the rows superseded by a later one of their scope"""
+        self.env.cr.execute("""
+            DELETE FROM crm_dashboard_generation g
+            WHERE EXISTS (
+                SELECT 1 FROM crm_dashboard_generation n WHERE n.scope = g.scope AND n.id > g.id
+            )
+        """)
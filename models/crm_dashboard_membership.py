@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, api, tools
+
+# res.users fields changing the group memberships of the users
+MEMBERSHIP_USER_FIELDS = {'groups_id', 'active', 'share'}
+
+
+class CrmDashboardMembership(models.AbstractModel):
+    """Group memberships read by the dashboard and the reports.
+
+    They change rarely but are read on every dashboard request, so they are
+    cached in the default cache of the registry. The cache is cleared
+    explicitly, and only when the members of the groups read here may have
+    changed.
+    """
+    _name = 'crm.dashboard.membership'
+    _description = 'CRM Dashboard Group Membership'
+
+    @api.model
+    @tools.ormcache()
+    def _get_hidden_user_ids(self):
+        """Users of the security group hidden from the dashboard"""
+        hidden_group = self.env.ref('institute_crm.group_hide_from_dashboard', raise_if_not_found=False)
+        return tuple(hidden_group.sudo().with_context(active_test=False).users.ids) if hidden_group else ()
+
+    @api.model
+    @tools.ormcache()
+    def _get_salesman_user_ids(self):
+        """Active internal users of the salespersons group, by name"""
+        return tuple(self.env['res.users'].sudo().search([
+            ('share', '=', False),
+            ('groups_id', 'in', self.env.ref('sales_team.group_sale_salesman').id)
+        ]).ids)
+
+    @api.model
+    @tools.ormcache()
+    def _get_manager_user_ids(self):
+        """Active internal users of the sales managers group"""
+        return tuple(self.env['res.users'].sudo().search([
+            ('share', '=', False),
+            ('groups_id', 'in', self.env.ref('sales_team.group_sale_manager').id)
+        ]).ids)
+
+    @api.model
+    def _get_membership_groups(self):
+        """Groups whose members are cached here"""
+        groups = [
+            self.env.ref(xmlid, raise_if_not_found=False)
+            for xmlid in ('institute_crm.group_hide_from_dashboard', 'sales_team.group_sale_salesman',
+                          'sales_team.group_sale_manager')
+        ]
+        return self.env['res.groups'].sudo().browse([group.id for group in groups if group])
+
+    @api.model
+    def _get_members(self, users):
+        """Ids of ``users`` belonging to the cached groups, with the flags
+        deciding their membership"""
+        groups = self._get_membership_groups()
+        return {
+            (user.id, user.active, user.share, frozenset(user.groups_id & groups))
+            for user in users.sudo().with_context(active_test=False)
+            if user.groups_id & groups
+        }
+
+    @api.model
+    def _clear_membership_cache(self):
+        self.env.registry.clear_cache()
+
+
+class ResUsers(models.Model):
+    _inherit = 'res.users'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        users = super().create(vals_list)
+        Membership = self.env['crm.dashboard.membership']
+        if Membership._get_members(users):
+            Membership._clear_membership_cache()
+        return users
+
+    def write(self, vals):
+        # the group checkboxes of the user form are written as reified fields
+        if not any(fname in MEMBERSHIP_USER_FIELDS or fname.startswith(('in_group_', 'sel_groups_')) for fname in vals):
+            return super().write(vals)
+        Membership = self.env['crm.dashboard.membership']
+        members = Membership._get_members(self)
+        res = super().write(vals)
+        if Membership._get_members(self) != members:
+            Membership._clear_membership_cache()
+        return res
+
+    def unlink(self):
+        Membership = self.env['crm.dashboard.membership']
+        members = Membership._get_members(self)
+        res = super().unlink()
+        if members:
+            Membership._clear_membership_cache()
+        return res
+
+
+class ResGroups(models.Model):
+    _inherit = 'res.groups'
+
+    def _affects_dashboard_membership(self):
+        # the users of a group are also added to the groups it implies
+        groups = self.env['crm.dashboard.membership']._get_membership_groups()
+        return bool((self | self.trans_implied_ids) & groups)
+
+    def write(self, vals):
+        res = super().write(vals)
+        if ('users' in vals or 'implied_ids' in vals) and self._affects_dashboard_membership():
+            self.env['crm.dashboard.membership']._clear_membership_cache()
+        return res
+
+    def unlink(self):
+        affected = self._affects_dashboard_membership()
+        res = super().unlink()
+        if affected:
+            self.env['crm.dashboard.membership']._clear_membership_cache()
+        return res
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api, SUPERUSER_ID
+from datetime import timedelta
+import logging
+
+_logger = logging.getLogger(__name__)
+
+DASHBOARD_PROFILE_RETENTION_DAYS = 30
+# key of the timings of the transaction in its postcommit data
+DASHBOARD_PROFILE_BUFFER_KEY = 'crm.dashboard.profile.rows'
+
+
+class CrmDashboardProfile(models.Model):
+    """Timings of the dashboard sections computed while profiling is on.
+
+    One row is stored per computed section (cache hits are not recorded),
+    with the number of SQL queries, the time spent in PostgreSQL and the
+    remaining Python time. The timings of a request are written together,
+    in their own transaction, once the request is committed. Rows older than
+    ``institute_crm.dashboard_profile_retention`` days are removed daily.
+    """
+    _name = 'crm.dashboard.profile'
+    _description = 'CRM Dashboard Section Timing'
+    _order = 'id desc'
+
+    section = fields.Char(string='Section', required=True, index=True)
+    user_id = fields.Many2one('res.users', string='User', ondelete='cascade')
+    is_manager = fields.Boolean(string='Manager Dashboard')
+    timeframe = fields.Char(string='Timeframe')
+    query_count = fields.Integer(string='Queries', group_operator='avg')
+    sql_time = fields.Float(string='SQL Time (ms)', digits=(16, 1), group_operator='avg')
+    python_time = fields.Float(string='Python Time (ms)', digits=(16, 1), group_operator='avg')
+    total_time = fields.Float(string='Total Time (ms)', digits=(16, 1), group_operator='avg')
+
+    @api.model
+    def _record(self, ctx, section, timing):
+        postcommit = self.env.cr.postcommit
+        vals_list = postcommit.data.get(DASHBOARD_PROFILE_BUFFER_KEY)
+        if vals_list is None:
+            vals_list = postcommit.data[DASHBOARD_PROFILE_BUFFER_KEY] = []
+            registry = self.env.registry
+            postcommit.add(lambda: self._write_profiles(registry, vals_list))
+        vals_list.append({
+            'section': section,
+            'user_id': ctx['uid'],
+            'is_manager': ctx['is_manager'],
+            'timeframe': ctx['timeframe'],
+            'query_count': timing['queries'],
+            'sql_time': timing['sql_time'],
+            'python_time': timing['python_time'],
+            'total_time': timing['total_time'],
+        })
+
+    @api.model
+    def _write_profiles(self, registry, vals_list):
+        """Store the buffered timings of a committed transaction"""
+        try:
+            with registry.cursor() as cr:
+                api.Environment(cr, SUPERUSER_ID, {})[self._name].create(vals_list)
+        except Exception:
+            _logger.warning("Could not store %s dashboard timing(s)", len(vals_list), exc_info=True)
+
+    @api.autovacuum
+    def _gc_profiles(self):
+        days = int(self.env['ir.config_parameter'].sudo().get_param(
+            'institute_crm.dashboard_profile_retention', DASHBOARD_PROFILE_RETENTION_DAYS) or DASHBOARD_PROFILE_RETENTION_DAYS)
+        self.flush_model()
+        self.env.cr.execute("DELETE FROM crm_dashboard_profile WHERE create_date < %s",
+                            [fields.Datetime.now() - timedelta(days=days)])
+        if self.env.cr.rowcount:
+            _logger.info("Removed %s dashboard timing(s)", self.env.cr.rowcount)
+        self.invalidate_model()
@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+from datetime import date, datetime, time, timedelta
+import logging
+
+from .change_tracking import read_change_watermark, changed_since
+
+_logger = logging.getLogger(__name__)
+
+SNAPSHOT_LAST_RUN_PARAM = 'institute_crm.dashboard_snapshot_last_run'
+SNAPSHOT_UNTIL_PARAM = 'institute_crm.dashboard_snapshot_until'
+
+SNAPSHOT_COLUMNS = (
+    'kind', 'date', 'company_id', 'user_id', 'source_id', 'stage_id', 'lead_active',
+    'lead_count', 'won_count', 'lost_count', 'closure_days', 'closure_count',
+    'student_count', 'revenue', 'activity_count',
+)
+
+
+class CrmDashboardSnapshot(models.Model):
+    """Precomputed daily KPI aggregates for the manager dashboard.
+
+    Every row aggregates the records of one day: leads by creation day,
+    students by enrollment day and completed activities by completion day.
+    The snapshot covers the days before ``institute_crm.dashboard_snapshot_until``;
+    the dashboard adds the live rows of the later days on top of it. Rows
+    are split by the company of their lead, so that the readers only sum
+    the companies allowed to the current user.
+    """
+    _name = 'crm.dashboard.snapshot'
+    _description = 'CRM Dashboard Daily Snapshot'
+    _order = 'date desc, id'
+
+    kind = fields.Selection([
+        ('lead', 'Leads'),
+        ('revenue', 'Revenue'),
+        ('activity', 'Activities'),
+    ], string='Kind', required=True, index=True)
+    date = fields.Date(string='Day', required=True, index=True)
+    company_id = fields.Many2one('res.company', string='Company', ondelete='cascade')
+    user_id = fields.Many2one('res.users', string='Salesperson', ondelete='set null')
+    source_id = fields.Many2one('utm.source', string='Source', ondelete='set null')
+    stage_id = fields.Many2one('crm.stage', string='Stage', ondelete='set null')
+    lead_active = fields.Boolean(string='Active Leads')
+    lead_count = fields.Integer(string='Leads')
+    won_count = fields.Integer(string='Won', help='Active leads in a won stage')
+    lost_count = fields.Integer(string='Lost', help='Archived leads with a zero probability')
+    closure_days = fields.Float(string='Closure Days', help='Sum of the days taken to close the won leads')
+    closure_count = fields.Integer(string='Closed Leads', help='Won leads having a closing date')
+    student_count = fields.Integer(string='Students')
+    revenue = fields.Float(string='Revenue')
+    activity_count = fields.Integer(string='Completed Activities')
+    dirty = fields.Boolean(string='To Refresh', help='Set when a record of this day was deleted')
+
+    # ------------------------------------------------------------------
+    # Bucket queries, shared by the refresh and the live delta
+    # ------------------------------------------------------------------
+
+    def _lead_bucket_query(self, where):
+        return """
+            SELECT
+                'lead' AS kind,
+                l.create_date::date AS date,
+                l.company_id,
+                l.user_id,
+                l.source_id,
+                l.stage_id,
+                l.active AS lead_active,
+                COUNT(*) AS lead_count,
+                COUNT(*) FILTER (WHERE l.active AND s.is_won) AS won_count,
+                COUNT(*) FILTER (WHERE NOT l.active AND l.probability = 0) AS lost_count,
+                COALESCE(SUM(EXTRACT(EPOCH FROM (l.date_closed - l.create_date)) / 86400.0)
+                    FILTER (WHERE l.active AND s.is_won AND l.date_closed IS NOT NULL), 0) AS closure_days,
+                COUNT(*) FILTER (WHERE l.active AND s.is_won AND l.date_closed IS NOT NULL) AS closure_count,
+                0 AS student_count,
+                0.0 AS revenue,
+                0 AS activity_count
+            FROM crm_lead l
+            LEFT JOIN crm_stage s ON s.id = l.stage_id
+            WHERE l.create_date IS NOT NULL AND %s
+            GROUP BY l.create_date::date, l.company_id, l.user_id, l.source_id, l.stage_id, l.active
+        """ % where
+
+    def _revenue_bucket_query(self, where):
+        if 'student.student' not in self.env:
+            return None
+        return """
+            SELECT
+                'revenue' AS kind,
+                st.enrollment_date::date AS date,
+                l.company_id,
+                st.user_id,
+                NULL::integer AS source_id,
+                NULL::integer AS stage_id,
+                NULL::boolean AS lead_active,
+                0 AS lead_count,
+                0 AS won_count,
+                0 AS lost_count,
+                0.0 AS closure_days,
+                0 AS closure_count,
+                COUNT(*) AS student_count,
+                COALESCE(SUM(st.paid_amount), 0) AS revenue,
+                0 AS activity_count
+            FROM %s st
+            JOIN crm_lead l ON l.id = st.lead_id
+            WHERE st.enrollment_date IS NOT NULL AND %s
+            GROUP BY st.enrollment_date::date, l.company_id, st.user_id
+        """ % (self.env['student.student']._table, where)
+
+    def _activity_bucket_query(self, where):
+        return """
+            SELECT
+                'activity' AS kind,
+                a.done_date::date AS date,
+                l.company_id,
+                NULL::integer AS user_id,
+                NULL::integer AS source_id,
+                NULL::integer AS stage_id,
+                NULL::boolean AS lead_active,
+                0 AS lead_count,
+                0 AS won_count,
+                0 AS lost_count,
+                0.0 AS closure_days,
+                0 AS closure_count,
+                0 AS student_count,
+                0.0 AS revenue,
+                COUNT(*) AS activity_count
+            FROM crm_activity_done a
+            JOIN crm_lead l ON l.id = a.lead_id
+            WHERE %s
+            GROUP BY a.done_date::date, l.company_id
+        """ % where
+
+    # ------------------------------------------------------------------
+    # Refresh
+    # ------------------------------------------------------------------
+
+    @api.model
+    def _get_snapshot_until(self):
+        """Return the first day not covered by the snapshot"""
+        until = self.env['ir.config_parameter'].sudo().get_param(SNAPSHOT_UNTIL_PARAM)
+        return fields.Date.to_date(until) if until else date(1970, 1, 1)
+
+    @api.model
+    def _cron_refresh_snapshot(self):
+        """Fold the rows changed since the last run into the snapshot.
+
+        Only the days touched by changed records are recomputed, plus the
+        days that were still live during the previous run and the days whose
+        rows were flagged dirty by a deletion of leads, students or
+        completed activities. The changed rows are found by
+        their write date, from the watermark stored by the previous run.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        last_run = ICP.get_param(SNAPSHOT_LAST_RUN_PARAM)
+        watermark = read_change_watermark(self.env.cr)
+        now = fields.Datetime.now()
+        until = now.date()
+        for model_name in ('crm.lead', 'crm.activity.done', 'student.student'):
+            if model_name in self.env:
+                self.env[model_name].flush_model()
+
+        if not last_run:
+            self._rebuild_days(None, until)
+        else:
+            last_run = changed_since(fields.Datetime.to_datetime(last_run))
+            previous_until = self._get_snapshot_until()
+            cr = self.env.cr
+            changed_days = set()
+            cr.execute("""
+                SELECT DISTINCT create_date::date FROM crm_lead
+                WHERE write_date >= %s AND create_date < %s
+            """, (last_run, until))
+            changed_days.update(('lead', row[0]) for row in cr.fetchall())
+            cr.execute("SELECT DISTINCT kind, date FROM crm_dashboard_snapshot WHERE dirty")
+            changed_days.update(cr.fetchall())
+
+            cr.execute("""
+                SELECT DISTINCT done_date::date FROM crm_activity_done
+                WHERE write_date >= %s AND done_date < %s
+            """, (last_run, until))
+            changed_days.update(('activity', row[0]) for row in cr.fetchall())
+
+            if 'student.student' in self.env:
+                cr.execute("""
+                    SELECT DISTINCT enrollment_date::date FROM %s
+                    WHERE write_date >= %%s AND enrollment_date < %%s
+                """ % self.env['student.student']._table, (last_run, until))
+                changed_days.update(('revenue', row[0]) for row in cr.fetchall())
+
+            day = previous_until
+            while day < until:
+                changed_days.update((kind, day) for kind in ('lead', 'activity', 'revenue'))
+                day += timedelta(days=1)
+
+            for kind in ('lead', 'activity', 'revenue'):
+                days = sorted(day for day_kind, day in changed_days if day_kind == kind and day < until)
+                if days:
+                    self._rebuild_days(days, until, kinds=[kind])
+
+        ICP.set_param(SNAPSHOT_UNTIL_PARAM, fields.Date.to_string(until))
+        ICP.set_param(SNAPSHOT_LAST_RUN_PARAM, fields.Datetime.to_string(watermark))
+        self.env['crm.dashboard.data']._invalidate_dashboard_cache(everyone=True)
+        return True
+
+    @api.model
+    def action_rebuild_snapshot(self):
+        """Recompute the whole snapshot from scratch"""
+        ICP = self.env['ir.config_parameter'].sudo()
+        ICP.set_param(SNAPSHOT_LAST_RUN_PARAM, False)
+        return self._cron_refresh_snapshot()
+
+    def _rebuild_days(self, days, until, kinds=('lead', 'activity', 'revenue')):
+        """Replace the snapshot rows of ``days`` (all days before ``until``
+        when ``days`` is None) by freshly aggregated ones."""
+        cr = self.env.cr
+        until_dt = datetime.combine(until, time.min)
+        params = {'days': days, 'until': until_dt, 'kinds': list(kinds)}
+        if days is None:
+            cr.execute("DELETE FROM crm_dashboard_snapshot WHERE kind = ANY(%(kinds)s)", params)
+        else:
+            cr.execute("DELETE FROM crm_dashboard_snapshot WHERE kind = ANY(%(kinds)s) AND date = ANY(%(days)s)", params)
+
+        queries = []
+        if 'lead' in kinds:
+            queries.append(self._lead_bucket_query(self._day_filter('l.create_date', days)))
+        if 'activity' in kinds:
+            queries.append(self._activity_bucket_query(self._day_filter('a.done_date', days)))
+        if 'revenue' in kinds:
+            revenue_query = self._revenue_bucket_query(self._day_filter('st.enrollment_date', days))
+            if revenue_query:
+                queries.append(revenue_query)
+
+        columns = ', '.join(SNAPSHOT_COLUMNS)
+        for query in queries:
+            cr.execute("""
+                INSERT INTO crm_dashboard_snapshot (%s, dirty, create_uid, create_date, write_uid, write_date)
+                SELECT %s, false, %%(uid)s, NOW() AT TIME ZONE 'UTC', %%(uid)s, NOW() AT TIME ZONE 'UTC'
+                FROM (%s) AS buckets
+            """ % (columns, columns, query), dict(params, uid=self.env.uid))
+        self.invalidate_model()
+        _logger.info("Dashboard snapshot refreshed for %s day(s) of %s",
+                     'all' if days is None else len(days), ', '.join(kinds))
+
+    def _day_filter(self, column, days):
+        if days is None:
+            return "%s < %%(until)s" % column
+        return "%s::date = ANY(%%(days)s) AND %s < %%(until)s" % (column, column)
+
+    @api.model
+    def _mark_days_dirty(self, days, kind='lead'):
+        """Flag the ``kind`` rows of ``days`` for recomputation (used on deletion)"""
+        days = list({day.date() if isinstance(day, datetime) else day for day in days if day})
+        if days:
+            self.env.cr.execute("""
+                UPDATE crm_dashboard_snapshot SET dirty = true
+                WHERE kind = %s AND date = ANY(%s) AND NOT dirty
+            """, (kind, days))
+
+    def _register_hook(self):
+        """Flag the revenue days of the deleted students, whose model comes
+        from an optional module and cannot be inherited here"""
+        super()._register_hook()
+        if 'student.student' not in self.env:
+            return
+        Student = self.env.registry['student.student']
+        if getattr(Student.unlink, 'marks_snapshot_dirty', False):
+            return
+        origin = Student.unlink
+
+        def unlink(self):
+            self.env['crm.dashboard.snapshot'].sudo()._mark_days_dirty(
+                [student.enrollment_date for student in self if student.lead_id],
+                kind='revenue')
+            return origin(self)
+
+        unlink.marks_snapshot_dirty = True
+        Student.unlink = unlink
+
+    # ------------------------------------------------------------------
+    # Dashboard readers: snapshot rows + live rows after the snapshot, of the
+    # records without company or of the allowed companies
+    # ------------------------------------------------------------------
+
+    def _reader_params(self, until, **params):
+        return dict(
+            params,
+            until=datetime.combine(until, time.min),
+            until_date=until,
+            company_ids=self.env.companies.ids,
+        )
+
+    @api.model
+    def _read_lead_totals(self):
+        """Return all-time lead counters grouped by user, source, stage and
+        active flag."""
+        self.env['crm.lead'].flush_model()
+        until = self._get_snapshot_until()
+        live_query = self._lead_bucket_query("l.create_date >= %(until)s")
+        self.env.cr.execute("""
+            SELECT user_id, source_id, stage_id, lead_active,
+                   SUM(lead_count)::integer AS lead_count,
+                   SUM(won_count)::integer AS won_count,
+                   SUM(lost_count)::integer AS lost_count,
+                   SUM(closure_days)::float AS closure_days,
+                   SUM(closure_count)::integer AS closure_count
+            FROM (
+                SELECT company_id, user_id, source_id, stage_id, lead_active, lead_count, won_count,
+                       lost_count, closure_days, closure_count
+                FROM crm_dashboard_snapshot
+                WHERE kind = 'lead' AND date < %%(until_date)s
+                UNION ALL
+                SELECT company_id, user_id, source_id, stage_id, lead_active, lead_count, won_count,
+                       lost_count, closure_days, closure_count
+                FROM (%s) AS live
+            ) AS buckets
+            WHERE company_id IS NULL OR company_id = ANY(%%(company_ids)s)
+            GROUP BY user_id, source_id, stage_id, lead_active
+        """ % live_query, self._reader_params(until))
+        return self.env.cr.dictfetchall()
+
+    @api.model
+    def _read_revenue_totals(self, first_of_month, today):
+        """Return the student revenue per user together with the revenue of
+        the current month and day."""
+        live_query = self._revenue_bucket_query("st.enrollment_date >= %(until)s")
+        if not live_query:
+            return []
+        self.env['student.student'].flush_model()
+        self.env['crm.lead'].flush_model(['company_id'])
+        until = self._get_snapshot_until()
+        self.env.cr.execute("""
+            SELECT user_id,
+                   SUM(student_count)::integer AS student_count,
+                   SUM(revenue)::float AS revenue,
+                   COALESCE(SUM(revenue) FILTER (WHERE date >= %%(first_of_month)s), 0)::float AS month_revenue,
+                   COALESCE(SUM(revenue) FILTER (WHERE date = %%(today)s), 0)::float AS today_revenue
+            FROM (
+                SELECT date, company_id, user_id, student_count, revenue
+                FROM crm_dashboard_snapshot
+                WHERE kind = 'revenue' AND date < %%(until_date)s
+                UNION ALL
+                SELECT date, company_id, user_id, student_count, revenue
+                FROM (%s) AS live
+            ) AS buckets
+            WHERE company_id IS NULL OR company_id = ANY(%%(company_ids)s)
+            GROUP BY user_id
+        """ % live_query, self._reader_params(until, first_of_month=first_of_month, today=today))
+        return self.env.cr.dictfetchall()
+
+    @api.model
+    def _read_completed_activity_count(self):
+        """Return the all-time number of completed lead activities"""
+        self.env['crm.activity.done'].flush_model()
+        self.env['crm.lead'].flush_model(['company_id'])
+        until = self._get_snapshot_until()
+        live_query = self._activity_bucket_query("a.done_date >= %(until)s")
+        self.env.cr.execute("""
+            SELECT COALESCE(SUM(activity_count), 0)::integer
+            FROM (
+                SELECT company_id, activity_count
+                FROM crm_dashboard_snapshot
+                WHERE kind = 'activity' AND date < %%(until_date)s
+                UNION ALL
+                SELECT company_id, activity_count
+                FROM (%s) AS live
+            ) AS buckets
+            WHERE company_id IS NULL OR company_id = ANY(%%(company_ids)s)
+        """ % live_query, self._reader_params(until))
+        return self.env.cr.fetchone()[0]
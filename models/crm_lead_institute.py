@@ -1,7 +1,8 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api
-from odoo.exceptions import ValidationError, UserError
+from odoo import models, fields, api, tools
+from odoo.exceptions import AccessError, ValidationError, UserError
+from odoo.tools import split_every
 import datetime
 import re
 import json
@@ -9,11 +10,71 @@ import logging
 
 _logger = logging.getLogger(__name__)
 
-try:
-    from openai import OpenAI
-except ImportError:
-    OpenAI = None
-
+from .crm_ai_suggestion_job import parse_llm_json
+from .crm_leaderboard import LEADERBOARD_LEAD_FIELDS
+from .change_tracking import read_change_watermark, changed_since
+
+DUPLICATE_CHECK_BATCH_SIZE = 1000
+
+STUDENT_SYNC_BATCH_SIZE = 5000
+
+# Lead corrections of action_sync_student_fields:
+# field -> (SQL new value, SQL condition), on the lead l and its partner p
+STUDENT_SYNC_CORRECTIONS = {
+    # Sync student_phone to phone
+    'phone': ('l.student_phone', "COALESCE(l.student_phone, '') != '' AND l.student_phone IS DISTINCT FROM l.phone"),
+    # Sync phone to student_phone if student_phone is empty
+    'student_phone': ('l.phone', "COALESCE(l.student_phone, '') = '' AND COALESCE(l.phone, '') != ''"),
+    # Sync alternative_phone to mobile
+    'mobile': ('l.alternative_phone',
+               "COALESCE(l.alternative_phone, '') != '' AND l.alternative_phone IS DISTINCT FROM l.mobile"),
+    # Sync mobile to alternative_phone if alternative_phone is empty
+    'alternative_phone': ('l.mobile', "COALESCE(l.alternative_phone, '') = '' AND COALESCE(l.mobile, '') != ''"),
+    # Sync partner name to student_name if student_name is empty
+    'student_name': ('p.name', "COALESCE(l.student_name, '') = '' AND COALESCE(p.name, '') != ''"),
+    # No partner but student_name exists - set contact_name
+    'contact_name': ('l.student_name',
+                     "l.partner_id IS NULL AND COALESCE(l.student_name, '') != '' AND COALESCE(l.contact_name, '') = ''"),
+}
+
+ADMITTED_CAMPUS_LAST_RUN_PARAM = 'institute_crm.admitted_campus_last_run'
+
+# Lead fields shown by the dashboard, whose changes are pushed to it
+DASHBOARD_LEAD_FIELDS = {
+    'user_id', 'stage_id', 'active', 'type', 'priority', 'probability', 'expected_revenue',
+    'date_closed', 'source_id', 'lost_reason_id', 'course_interested', 'name', 'student_name',
+}
+
+PHONE_KEY_FIELDS = {
+    'phone': 'phone_key',
+    'mobile': 'mobile_key',
+    'student_phone': 'student_phone_key',
+    'alternative_phone': 'alternative_phone_key',
+}
+
+
+def normalize_phone_key(number):
+    """Return the key used to match a phone number: its last 10 digits, or
+    all its digits for shorter numbers of more than 5 digits."""
+    digits = re.sub(r'\D', '', number or '')
+    if len(digits) >= 10:
+        return digits[-10:]
+    if len(digits) > 5:
+        return digits
+    return False
+
+
+def group_records_by_vals(record_vals):
+    """Group ``(record, vals)`` pairs into ``(records, vals)`` pairs so that
+    records needing the same values can share a single write. Empty values
+    are dropped; the records of a pair must all belong to one model."""
+    groups = {}
+    for record, vals in record_vals:
+        if not vals:
+            continue
+        key = (record._name, tuple(sorted(vals.items())))
+        groups.setdefault(key, [record.browse(), vals])[0] |= record
+    return [tuple(group) for group in groups.values()]
 
 
 class CrmLeadInstitute(models.Model):
@@ -120,6 +181,36 @@ class CrmLeadInstitute(models.Model):
         help='Technical field to show/hide follow-up fields'
     )
 
+    # Normalized phone keys used by the duplicate check
+    phone_key = fields.Char(
+        string='Phone Key',
+        compute='_compute_phone_keys',
+        store=True,
+        index=True,
+        help='Technical field: last 10 digits of the phone number'
+    )
+    mobile_key = fields.Char(
+        string='Mobile Key',
+        compute='_compute_phone_keys',
+        store=True,
+        index=True,
+        help='Technical field: last 10 digits of the mobile number'
+    )
+    student_phone_key = fields.Char(
+        string='Student Number Key',
+        compute='_compute_phone_keys',
+        store=True,
+        index=True,
+        help='Technical field: last 10 digits of the student number'
+    )
+    alternative_phone_key = fields.Char(
+        string='Alternative Number Key',
+        compute='_compute_phone_keys',
+        store=True,
+        index=True,
+        help='Technical field: last 10 digits of the alternative number'
+    )
+
 
 
     @api.depends('contact_status')
@@ -128,6 +219,13 @@ class CrmLeadInstitute(models.Model):
         for record in self:
             record.show_follow_up_fields = record.contact_status == 'connected'
 
+    @api.depends('phone', 'mobile', 'student_phone', 'alternative_phone')
+    def _compute_phone_keys(self):
+        """Compute the normalized keys of the phone numbers"""
+        for record in self:
+            for number_field, key_field in PHONE_KEY_FIELDS.items():
+                record[key_field] = normalize_phone_key(record[number_field])
+
     @api.onchange('contact_status')
     def _onchange_contact_status(self):
         """Clear follow-up fields when contact status changes from connected"""
@@ -136,57 +234,85 @@ class CrmLeadInstitute(models.Model):
             self.follow_up_date = False
 
     def action_sync_student_fields(self):
-        """Sync student fields with standard CRM fields for existing leads"""
-        for record in self:
-            vals = {}
-            # Sync student_phone to phone
-            if record.student_phone and record.student_phone != record.phone:
-                vals['phone'] = record.student_phone
-            # Sync phone to student_phone if student_phone is empty
-            elif record.phone and not record.student_phone:
-                vals['student_phone'] = record.phone
-            
-            # Sync alternative_phone to mobile
-            if record.alternative_phone and record.alternative_phone != record.mobile:
-                vals['mobile'] = record.alternative_phone
-            # Sync mobile to alternative_phone if alternative_phone is empty
-            elif record.mobile and not record.alternative_phone:
-                vals['alternative_phone'] = record.mobile
-            
-            # Sync with partner if exists
-            if record.partner_id:
-                # Sync student_name to partner name
-                if record.student_name and record.student_name != record.partner_id.name:
-                    record.partner_id.name = record.student_name
-                # Sync partner name to student_name if student_name is empty
-                elif record.partner_id.name and not record.student_name:
-                    vals['student_name'] = record.partner_id.name
-                    
-                # Sync phone with partner
-                if record.phone and record.phone != record.partner_id.phone:
-                    record.partner_id.phone = record.phone
-                    
-                # Sync mobile with partner
-                if record.mobile and record.mobile != record.partner_id.mobile:
-                    record.partner_id.mobile = record.mobile
-            # No partner but student_name exists - set contact_name
-            elif record.student_name and not record.contact_name:
-                vals['contact_name'] = record.student_name
-            
-            if vals:
-                record.write(vals)
+        """Sync student fields with standard CRM fields for existing leads.
+
+        The corrections are computed in SQL and applied with one write per
+        distinct set of values; the partners are then corrected the same
+        way, from the lead fields as synced.
+        """
+        lead_count = 0
+        for leads, vals in group_records_by_vals(self._prepare_student_fields_corrections()):
+            leads.with_context(skip_partner_sync=True).write(vals)
+            lead_count += len(leads)
+        partner_updates = self._prepare_student_fields_sync()
+        partner_count = self._sync_partner_values(partner_updates)
         
         return {
             'type': 'ir.actions.client',
             'tag': 'display_notification',
             'params': {
                 'title': 'Sync Complete',
-                'message': f'{len(self)} lead(s) synchronized successfully!',
+                'message': f'{len(self)} lead(s) checked: {lead_count} lead(s) and '
+                           f'{partner_count} contact(s) updated.',
                 'type': 'success',
                 'sticky': False,
             }
         }
 
+    def _prepare_student_fields_corrections(self):
+        """Compute the lead corrections of action_sync_student_fields.
+
+        Returns the ``(lead, vals)`` updates to apply, for the leads needing
+        one only.
+        """
+        self.flush_model(list(STUDENT_SYNC_CORRECTIONS) + ['partner_id'])
+        self.env['res.partner'].flush_model(['name'])
+        columns = ', '.join(
+            'CASE WHEN %s THEN %s END AS %s' % (condition, value, fname)
+            for fname, (value, condition) in STUDENT_SYNC_CORRECTIONS.items())
+        needed = ' OR '.join('(%s)' % condition for value, condition in STUDENT_SYNC_CORRECTIONS.values())
+        lead_updates = []
+        for ids in split_every(STUDENT_SYNC_BATCH_SIZE, self.ids):
+            self.env.cr.execute("""
+                SELECT l.id, %s
+                FROM crm_lead l
+                LEFT JOIN res_partner p ON p.id = l.partner_id
+                WHERE l.id IN %%s AND (%s)
+            """ % (columns, needed), [tuple(ids)])
+            for row in self.env.cr.dictfetchall():
+                lead = self.browse(row.pop('id'))
+                lead_updates.append((lead, {fname: value for fname, value in row.items() if value is not None}))
+        return lead_updates
+
+    def _prepare_student_fields_sync(self):
+        """Compute the partner corrections of action_sync_student_fields,
+        from the lead fields as synced.
+
+        Returns the ``(partner, vals)`` updates to apply.
+        """
+        self.flush_model(['phone', 'mobile', 'student_name', 'partner_id'])
+        Partner = self.env['res.partner']
+        partner_updates = []
+        for ids in split_every(STUDENT_SYNC_BATCH_SIZE, self.ids):
+            self.env.cr.execute("""
+                SELECT l.partner_id, l.phone, l.mobile, l.student_name
+                FROM crm_lead l
+                WHERE l.id IN %s AND l.partner_id IS NOT NULL
+            """, [tuple(ids)])
+            for row in self.env.cr.dictfetchall():
+                partner_vals = {}
+                # Sync student_name to partner name
+                if row['student_name']:
+                    partner_vals['name'] = row['student_name']
+                # Sync phone and mobile with partner
+                if row['phone']:
+                    partner_vals['phone'] = row['phone']
+                if row['mobile']:
+                    partner_vals['mobile'] = row['mobile']
+                if partner_vals:
+                    partner_updates.append((Partner.browse(row['partner_id']), partner_vals))
+        return partner_updates
+
     # Sync student fields with standard CRM fields
     @api.onchange('student_name')
     def _onchange_student_name(self):
@@ -241,6 +367,13 @@ class CrmLeadInstitute(models.Model):
 
 
 
+    def init(self):
+        super().init()
+        # range predicates of the dashboard timeframes
+        tools.create_index(self.env.cr, 'crm_lead_create_date_index', self._table, ['create_date'])
+        tools.create_index(self.env.cr, 'crm_lead_date_closed_index', self._table, ['date_closed'],
+                           where='date_closed IS NOT NULL')
+
     @api.model_create_multi
     def create(self, vals_list):
         """Override create to sync fields and schedule activity"""
@@ -256,227 +389,438 @@ class CrmLeadInstitute(models.Model):
                 vals['mobile'] = vals['alternative_phone']
         
         leads = super().create(vals_list)
+        Leaderboard = self.env['crm.leaderboard.month'].sudo()
+        Leaderboard._apply_contributions([], Leaderboard._read_contributions(leads))
+        Dashboard = self.env['crm.dashboard.data'].sudo()
+        leads._invalidate_dashboard_cache(
+            counters=Dashboard._get_lead_counter_deltas([], Dashboard._read_lead_counters(leads)))
         
-        # Skip activity scheduling and duplicate check during import
+        # Duplicate check, batched over the whole vals_list so it also runs
+        # for imports (and catches duplicates inside the imported file)
+        if not self._context.get('skip_duplicate_check'):
+            leads._check_duplicate_phones()
+
+        # Skip activity scheduling during import
         if not self._context.get('import_file'):
-            # Duplicate check (runs independently — does not block activity scheduling)
-            try:
-                leads._check_duplicate_phones()
-            except ValidationError:
-                raise  # Re-raise so user still sees the duplicate warning
-            
-            # Schedule follow-up call activity for the assigned salesperson
-            for lead in leads:
-                if lead.user_id:
-                    try:
-                        lead._schedule_salesperson_activity(lead.user_id)
-                    except Exception as e:
-                        _logger.warning(
-                            "Could not schedule follow-up activity for lead %s (ID: %s): %s",
-                            lead.name, lead.id, str(e)
-                        )
+            # Schedule follow-up call activities for the assigned salespersons
+            assigned_leads = leads.filtered('user_id')
+            if assigned_leads:
+                assigned_leads._schedule_salesperson_activity(skip_failing=True)
         return leads
 
     def write(self, vals):
         """Override write to sync fields and schedule activity"""
+        # Partner values are collected here and written once the leads are
+        # saved, for all their partners at once
+        partner_vals = {}
         # Sync student_name to partner
-        if vals.get('student_name') and self.partner_id:
-            self.partner_id.name = vals['student_name']
+        if vals.get('student_name'):
+            partner_vals['name'] = vals['student_name']
         # Sync student_phone to phone and partner
         if vals.get('student_phone'):
             vals['phone'] = vals['student_phone']
-            if self.partner_id:
-                self.partner_id.phone = vals['student_phone']
+            partner_vals['phone'] = vals['student_phone']
         # Sync phone to student_phone
         if vals.get('phone') and not vals.get('student_phone'):
             vals['student_phone'] = vals['phone']
         # Sync alternative_phone to mobile and partner
         if vals.get('alternative_phone'):
             vals['mobile'] = vals['alternative_phone']
-            if self.partner_id:
-                self.partner_id.mobile = vals['alternative_phone']
+            partner_vals['mobile'] = vals['alternative_phone']
         # Sync mobile to alternative_phone
         if vals.get('mobile') and not vals.get('alternative_phone'):
             vals['alternative_phone'] = vals['mobile']
 
         # Capture user_id change for activity scheduling
         user_id_changed = 'user_id' in vals
+        previous_user_ids = self.user_id.ids
+        previous_company_ids = {lead.company_id.id or 0 for lead in self} if 'company_id' in vals else ()
+        previously_won = any(self.stage_id.mapped('is_won'))
         
         # Track leads converting to opportunity
         leads_converting = self.filtered(lambda l: l.type == 'lead') if vals.get('type') == 'opportunity' else self.env['crm.lead']
         
+        # Contribution of the leads to the leaderboard, moved after the write
+        Leaderboard = self.env['crm.leaderboard.month'].sudo()
+        leaderboard_changed = not LEADERBOARD_LEAD_FIELDS.isdisjoint(vals)
+        previous_contributions = Leaderboard._read_contributions(self) if leaderboard_changed else []
+        # Counters of the open dashboards, patched with their deltas
+        Dashboard = self.env['crm.dashboard.data'].sudo()
+        notify = not DASHBOARD_LEAD_FIELDS.isdisjoint(vals)
+        previous_counters = Dashboard._read_lead_counters(self) if notify else []
+
         res = super(CrmLeadInstitute, self).write(vals)
+        if leaderboard_changed:
+            Leaderboard._apply_contributions(previous_contributions, Leaderboard._read_contributions(self))
+        counters = Dashboard._get_lead_counter_deltas(
+            previous_counters, Dashboard._read_lead_counters(self)) if notify else None
+        self._invalidate_dashboard_cache(previous_user_ids, previously_won, notify=notify, counters=counters,
+                                         previous_company_ids=previous_company_ids)
+        if partner_vals and not self.env.context.get('skip_partner_sync'):
+            self._sync_partner_values([(partner, partner_vals) for partner in self.partner_id])
         
-        if user_id_changed and vals.get('user_id'):
-            # Schedule activity for the new salesperson
-            new_user = self.env['res.users'].browse(vals['user_id'])
-            for lead in self:
-                lead._schedule_salesperson_activity(new_user)
+        # Schedule activity for the new salesperson
+        leads_to_schedule = self if user_id_changed and vals.get('user_id') else self.env['crm.lead']
         
         # Schedule activity for converted opportunities if not already scheduled by user_id change
-        if leads_converting:
-            for lead in leads_converting:
-                # Only schedule if we didn't just schedule it above due to user_id change
-                if lead.user_id and not (user_id_changed and vals.get('user_id') == lead.user_id.id):
-                    lead._schedule_salesperson_activity(lead.user_id)
+        leads_to_schedule |= leads_converting.filtered(
+            lambda l: l.user_id and not (user_id_changed and vals.get('user_id') == l.user_id.id)
+        )
+        if leads_to_schedule:
+            leads_to_schedule._schedule_salesperson_activity()
                     
         return res
 
-    def _schedule_salesperson_activity(self, user):
-        """Schedule a call activity for the salesperson for the next day"""
+    def unlink(self):
+        """Override unlink to refresh the dashboards and snapshot of the leads"""
+        Dashboard = self.env['crm.dashboard.data'].sudo()
+        self._invalidate_dashboard_cache(
+            counters=Dashboard._get_lead_counter_deltas(Dashboard._read_lead_counters(self), []))
+        Snapshot = self.env['crm.dashboard.snapshot'].sudo()
+        Snapshot._mark_days_dirty([lead.create_date.date() for lead in self if lead.create_date])
+        # the completed activities and students of the leads leave the snapshot with them
+        self.env['crm.activity.done'].sudo().search([('lead_id', 'in', self.ids)]).unlink()
+        if 'student.student' in self.env:
+            students = self.env['student.student'].sudo().search([('lead_id', 'in', self.ids)])
+            Snapshot._mark_days_dirty(students.mapped('enrollment_date'), kind='revenue')
+        Leaderboard = self.env['crm.leaderboard.month'].sudo()
+        Leaderboard._apply_contributions(Leaderboard._read_contributions(self), [])
+        return super().unlink()
+
+    @api.model
+    def _sync_partner_values(self, partner_updates):
+        """Apply ``(partner, vals)`` updates to the partners of leads.
+
+        Values a partner already has are skipped, later updates of a partner
+        override earlier ones, and partners needing the same values are
+        written together, so a mass edit issues one write per distinct set of
+        values instead of one write per field and lead. Returns the number of
+        partners written.
+        """
+        pending = {}
+        for partner, vals in partner_updates:
+            pending.setdefault(partner.id, {}).update(vals)
+        # iterate over one recordset so that the current values are prefetched
+        changes = [
+            (partner, {fname: value for fname, value in pending[partner.id].items()
+                       if partner[fname] != value})
+            for partner in self.env['res.partner'].browse(pending)
+        ]
+        count = 0
+        for partners, vals in group_records_by_vals(changes):
+            partners.write(vals)
+            count += len(partners)
+        return count
+
+    @api.model
+    def _cron_fill_admitted_campus(self):
+        """Fill the admitted campus of won leads from their student's branch.
+
+        A single UPDATE handles the won leads without campus whose lead or
+        student changed since the watermark of the previous run (all of
+        them on the first run). When a lead has several students, the
+        latest one wins.
+        """
+        if 'student.student' not in self.env:
+            return True
+        Student = self.env['student.student']
+        Branch = self.env[Student._fields['branch'].comodel_name]
+        ICP = self.env['ir.config_parameter'].sudo()
+        last_run = ICP.get_param(ADMITTED_CAMPUS_LAST_RUN_PARAM)
+        watermark = read_change_watermark(self.env.cr)
+        self.flush_model(['admitted_campus', 'probability', 'active'])
+        Student.flush_model(['lead_id', 'branch'])
+        Branch.flush_model(['name'])
+
+        branch_name = 'b.name'
+        params = []
+        if Branch._fields['name'].translate:
+            branch_name = "COALESCE(b.name->>%s, b.name->>'en_US')"
+            params.append(self.env.lang or 'en_US')
+        changed = 'TRUE'
+        if last_run:
+            changed = 'l.write_date >= %s OR s.write_date >= %s'
+            last_run = changed_since(fields.Datetime.to_datetime(last_run))
+            params += [last_run, last_run]
+        self.env.cr.execute("""
+            UPDATE crm_lead lead
+            SET admitted_campus = campus.name
+            FROM (
+                SELECT DISTINCT ON (s.lead_id) s.lead_id, %s AS name
+                FROM %s s
+                JOIN %s b ON b.id = s.branch
+                JOIN crm_lead l ON l.id = s.lead_id
+                WHERE COALESCE(l.admitted_campus, '') = ''
+                AND l.probability = 100
+                AND l.active
+                AND (%s)
+                ORDER BY s.lead_id, s.id DESC
+            ) campus
+            WHERE lead.id = campus.lead_id
+            RETURNING lead.id
+        """ % (branch_name, Student._table, Branch._table, changed), params)
+        lead_ids = [row[0] for row in self.env.cr.fetchall()]
+        self.invalidate_model(['admitted_campus'])
+        if lead_ids:
+            _logger.info("Filled the admitted campus of %s won lead(s)", len(lead_ids))
+        ICP.set_param(ADMITTED_CAMPUS_LAST_RUN_PARAM, fields.Datetime.to_string(watermark))
+        return True
+
+    def _invalidate_dashboard_cache(self, previous_user_ids=(), previously_won=False, notify=True, counters=None,
+                                    previous_company_ids=()):
+        """Invalidate the cached dashboards showing these leads, and unless
+        ``notify`` is unset, push the change to the open ones, with the
+        counter deltas of their users if given.
+
+        Owners and the managers of the companies of the leads are always
+        invalidated. Every salesperson is invalidated when a won lead is
+        involved, since the won counters feed the team leaderboard shown to
+        everyone.
+        """
+        everyone = previously_won or any(self.stage_id.mapped('is_won'))
+        user_ids = self.user_id.ids + list(previous_user_ids)
+        company_ids = {lead.company_id.id or 0 for lead in self} | set(previous_company_ids)
+        Dashboard = self.env['crm.dashboard.data']
+        Dashboard._invalidate_dashboard_cache(user_ids, company_ids, everyone=everyone)
+        if notify:
+            Dashboard._notify_dashboard_delta('lead', user_ids, everyone=everyone, counters=counters)
+
+    def _schedule_salesperson_activity(self, user=None, skip_failing=False):
+        """Schedule a call activity for the salesperson for the next day.
+
+        The activities of the whole recordset are created at once. Each lead
+        gets an activity for ``user``, or for its own salesperson if no user
+        is given.
+
+        With ``skip_failing``, a lead whose activity cannot be scheduled only
+        logs a warning: the leads the assignee cannot read are left out
+        before the batch create, and if the batch still fails the activities
+        are created one by one so the other leads keep theirs.
+        """
+        Activity = self.env['mail.activity']
+        if self.env.context.get('mail_activity_automation_skip'):
+            return Activity
+        vals_list = self._prepare_salesperson_activity_vals(user)
+        if not skip_failing:
+            return Activity.create(vals_list)
+
+        vals_list = [vals for vals in vals_list if self._check_salesperson_activity_vals(vals)]
+        try:
+            with self.env.cr.savepoint():
+                return Activity.create(vals_list)
+        except Exception as e:
+            _logger.warning("Could not schedule follow-up activities for leads %s at once: %s",
+                            [vals['res_id'] for vals in vals_list], str(e))
+        activities = Activity
+        for vals in vals_list:
+            try:
+                with self.env.cr.savepoint():
+                    activities |= Activity.create(vals)
+            except Exception as e:
+                _logger.warning("Could not schedule follow-up activity for lead %s: %s",
+                                vals['res_id'], str(e))
+        return activities
+
+    def _check_salesperson_activity_vals(self, vals):
+        """Return whether the assignee of the activity ``vals`` can read its
+        lead, as mail.activity requires; log a warning otherwise"""
+        lead = self.browse(vals['res_id']).with_user(vals['user_id'])
+        try:
+            lead.check_access_rights('read')
+            lead.check_access_rule('read')
+        except AccessError as e:
+            _logger.warning("Could not schedule follow-up activity for lead %s (ID: %s): %s",
+                            lead.sudo().name, lead.id, str(e))
+            return False
+        return True
+
+    def _prepare_salesperson_activity_vals(self, user=None):
+        """Prepare the mail.activity values of the follow-up calls"""
+        activity_type = self.env.ref('mail.mail_activity_data_call', raise_if_not_found=False)
+        date_deadline = fields.Date.today() + datetime.timedelta(days=1)
+        res_model_id = self.env['ir.model']._get_id(self._name)
+        vals_list = []
         for lead in self:
-            date_deadline = fields.Date.today() + datetime.timedelta(days=1)
-            # Use existing activity_schedule method from mail.thread
-            lead.activity_schedule(
-                'mail.mail_activity_data_call',
-                user_id=user.id,
-                date_deadline=date_deadline,
-                summary='Follow-up Call (New Assignment)'
-            )
+            assignee = user or lead.user_id
+            if not assignee:
+                continue
+            vals_list.append({
+                'activity_type_id': activity_type.id if activity_type else False,
+                'summary': 'Follow-up Call (New Assignment)',
+                'note': activity_type.default_note if activity_type else False,
+                'automated': True,
+                'date_deadline': date_deadline,
+                'res_model_id': res_model_id,
+                'res_id': lead.id,
+                'user_id': assignee.id,
+            })
+        return vals_list
 
     def _check_duplicate_phones(self):
         """Check for duplicate phone/name combination across leads and opportunities.
         A record is only blocked if BOTH the phone number AND the name match an existing record.
         Same phone with a different name is allowed (e.g. family members sharing a number).
         """
-        for record in self:
-            if not record.active:
-                continue
+        duplicates = self._get_phone_duplicates()
+        if duplicates:
+            record, dup_id, dup_name, dup_type = duplicates[0]
+            record_type = "Opportunity" if dup_type == 'opportunity' else "Lead"
+            message = (
+                f"Duplicate Prevention: A {record_type} with the same name and phone number already exists!\\n"
+                f"Existing Record: {dup_name}"
+            )
+            if len(duplicates) > 1:
+                message += f"\\n({len(duplicates) - 1} more duplicate lead(s) in this batch)"
+            raise ValidationError(message)
 
-            # Gather all numbers to check
-            numbers = []
-            if record.phone: numbers.append(record.phone)
-            if record.mobile: numbers.append(record.mobile)
-            if record.student_phone: numbers.append(record.student_phone)
-            if record.alternative_phone: numbers.append(record.alternative_phone)
-
-            check_digits = set()
-            for num in numbers:
-                digits = re.sub(r'\D', '', num)
-                if len(digits) >= 10:
-                    check_digits.add(digits[-10:])
-                elif len(digits) > 5:
-                    check_digits.add(digits)
-
-            if not check_digits:
-                continue
+    def _get_phone_duplicates(self):
+        """Resolve the duplicates of the whole recordset with one query per chunk.
 
-            # Determine the name to compare against (student_name takes priority over lead name)
-            record_name = (record.student_name or record.name or '').strip().lower()
+        The (record, phone key, normalized name) tuples of the records are
+        joined as a VALUES list against the indexed phone keys, so records of
+        the same batch are also detected as duplicates of each other.
 
-            for digits in check_digits:
-                # Find existing records with the same phone number
-                self.env.cr.execute(r"""
-                    SELECT id, COALESCE(student_name, name, '') AS display_name, type
-                    FROM crm_lead 
-                    WHERE id != %s 
-                    AND active = true
+        :return: list of (record, duplicate id, duplicate name, duplicate type),
+                 at most one per record
+        """
+        self.env['crm.lead'].flush_model(
+            list(PHONE_KEY_FIELDS.values()) + ['active', 'student_name', 'name', 'type'])
+        duplicates = []
+        for records in split_every(DUPLICATE_CHECK_BATCH_SIZE, self.filtered('active').ids, self.browse):
+            incoming = []
+            for record in records:
+                # Determine the name to compare against (student_name takes priority over lead name)
+                record_name = (record.student_name or record.name or '').strip().lower()
+                if not record_name:
+                    continue
+                keys = {record[key_field] for key_field in PHONE_KEY_FIELDS.values() if record[key_field]}
+                incoming.extend((record.id, key, record_name) for key in keys)
+            if not incoming:
+                continue
+
+            # Only matches where the NAME also matches (same person, not just same phone)
+            self.env.cr.execute("""
+                WITH incoming (record_id, phone_key, record_name) AS (VALUES %s)
+                SELECT DISTINCT ON (i.record_id)
+                    i.record_id, l.id, COALESCE(l.student_name, l.name, '') AS display_name, l.type
+                FROM incoming i
+                JOIN crm_lead l ON l.id != i.record_id
+                    AND l.active = true
                     AND (
-                        REGEXP_REPLACE(phone, '\D', '', 'g') LIKE %s OR 
-                        REGEXP_REPLACE(mobile, '\D', '', 'g') LIKE %s OR
-                        REGEXP_REPLACE(student_phone, '\D', '', 'g') LIKE %s OR
-                        REGEXP_REPLACE(alternative_phone, '\D', '', 'g') LIKE %s
+                        l.phone_key = i.phone_key OR
+                        l.mobile_key = i.phone_key OR
+                        l.student_phone_key = i.phone_key OR
+                        l.alternative_phone_key = i.phone_key
                     )
-                """, (
-                    record.id,
-                    f'%{digits}',
-                    f'%{digits}',
-                    f'%{digits}',
-                    f'%{digits}',
-                ))
-
-                for dup_id, dup_name, dup_type in self.env.cr.fetchall():
-                    # Only block if the NAME also matches (same person, not just same phone)
-                    if dup_name and dup_name.strip().lower() == record_name:
-                        record_type = "Opportunity" if dup_type == 'opportunity' else "Lead"
-                        raise ValidationError(
-                            f"Duplicate Prevention: A {record_type} with the same name and phone number already exists!\\n"
-                            f"Existing Record: {dup_name}"
-                        )
+                WHERE LOWER(BTRIM(COALESCE(l.student_name, l.name, ''), E' \\t\\n\\r')) = i.record_name
+                ORDER BY i.record_id, l.id
+            """ % ', '.join(['(%s, %s, %s)'] * len(incoming)),
+                [value for row in incoming for value in row])
+            for record_id, dup_id, dup_name, dup_type in self.env.cr.fetchall():
+                duplicates.append((self.browse(record_id), dup_id, dup_name, dup_type))
+        return duplicates
 
     def action_get_ai_suggestion(self):
+        """Queue an AI suggestion for this lead and open the suggestion wizard.
+
+        The wizard shows the suggestion once the background job is done; the
+        user is notified when it is ready.
+        """
         self.ensure_one()
-        api_key = self.env['ir.config_parameter'].sudo().get_param('institute_crm.openrouter_api_key')
-        
-        if not OpenAI or not api_key:
+        if not self.env['crm.ai.suggestion.job']._is_ai_configured():
             raise UserError("OpenRouter API is not configured. Please add the API key in Settings.")
             
-        try:
-            # Fetch recent logs
-            logs = self.env['mail.message'].search_read([
-                ('model', '=', 'crm.lead'),
-                ('res_id', '=', self.id),
-                ('message_type', 'in', ['comment', 'email'])
-            ], ['body', 'date'], limit=5, order='date desc')
-            
-            log_text = " \\n ".join([f"({log['date']}) {log['body']}" for log in logs])
-            
-            context_data = {
-                'lead_name': self.student_name or self.name,
-                'course_interested': self.course_interested.name if self.course_interested else 'Unknown Course',
-                'contact_status': dict(self._fields['contact_status'].selection).get(self.contact_status, 'Unknown') if self.contact_status else 'Unknown',
-                'contact_remarks': self.contact_remarks or 'No remarks',
-                'stage': self.stage_id.name if self.stage_id else 'New',
-                'recent_logs': log_text
-            }
-            
-            salesperson_name = self.env.user.name or 'Salesperson'
-            company_name = self.env.company.name or 'our Institution'
-            
-            sys_prompt = (
-                f"You are an AI sales assistant for {company_name}. The salesperson handling this lead is {salesperson_name}. "
-                "Your goal is to sell admission into our courses (do not refer to 'products' or 'solutions', use 'courses' or 'programs'). "
-                "Review the context for this single lead, including their course interested, contact status, stage, and recent communication logs. "
-                "Suggest a short next action for the salesperson and a very brief, casual draft response (extremely short WhatsApp length, 1-2 sentences maximum) ready to copy. "
-                "Output carefully structured strict JSON ONLY, resolving into exactly one object with keys: `suggested_action` (string) and `draft_message` (string). "
-                "No markdown block backticks around the json."
-            )
-            user_prompt = f"Lead Context: {json.dumps(context_data)}"
-            
-            client = OpenAI(
-                base_url="https://openrouter.ai/api/v1",
-                api_key=api_key
-            )
-            
-            response = client.chat.completions.create(
-                model="qwen/qwen-2.5-7b-instruct",
-                messages=[
-                    {"role": "system", "content": sys_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.7,
-                response_format={"type": "json_object"}
-            )
-            
-            resp_content = response.choices[0].message.content
-            if resp_content:
-                resp_content = resp_content.strip()
-                if resp_content.startswith('```json'):
-                    resp_content = resp_content[7:]
-                if resp_content.startswith('```'):
-                    resp_content = resp_content[3:]
-                if resp_content.endswith('```'):
-                    resp_content = resp_content[:-3]
-                    
-                parsed_data = json.loads(resp_content)
-                suggested_action = parsed_data.get('suggested_action', 'Could not generate action.')
-                draft_message = parsed_data.get('draft_message', 'Could not generate message.')
-                
-                wizard = self.env['crm.lead.ai.suggestion.wizard'].create({
-                    'lead_id': self.id,
-                    'suggested_action': suggested_action,
-                    'draft_message': draft_message,
-                    'is_generated': True
-                })
-                
-                return {
-                    'name': 'AI Suggestion',
-                    'type': 'ir.actions.act_window',
-                    'view_mode': 'form',
-                    'res_model': 'crm.lead.ai.suggestion.wizard',
-                    'res_id': wizard.id,
-                    'target': 'new',
-                }
-        except Exception as e:
-            _logger.error("OpenRouter Lead AI Suggestion Failed: %s", str(e))
-            raise UserError(f"Failed to generate suggestion: {str(e)}")
+        job = self.env['crm.ai.suggestion.job']._enqueue('lead', self)
+        wizard = self.env['crm.lead.ai.suggestion.wizard'].create({
+            'lead_id': self.id,
+            'job_id': job.id,
+        })
+        wizard._load_job_result()
+        
+        return {
+            'name': 'AI Suggestion',
+            'type': 'ir.actions.act_window',
+            'view_mode': 'form',
+            'res_model': 'crm.lead.ai.suggestion.wizard',
+            'res_id': wizard.id,
+            'target': 'new',
+        }
+
+    def _message_post_after_hook(self, message, msg_vals):
+        # the cached AI suggestions are built from the logs of the lead
+        self.env['crm.ai.suggestion.cache']._invalidate_leads(self)
+        return super()._message_post_after_hook(message, msg_vals)
+
+    def _prepare_ai_suggestion_messages(self):
+        """Build the prompt of the suggestion for this lead, as a single
+        ``(messages, leads)`` pair"""
+        self.ensure_one()
+        # Fetch recent logs
+        logs = self._read_ai_recent_logs(5).get(self.id, [])
+        
+        log_text = " \\n ".join([f"({date}) {body}" for date, body in logs])
+        
+        context_data = {
+            'lead_name': self.student_name or self.name,
+            'course_interested': self.course_interested.name if self.course_interested else 'Unknown Course',
+            'contact_status': dict(self._fields['contact_status'].selection).get(self.contact_status, 'Unknown') if self.contact_status else 'Unknown',
+            'contact_remarks': self.contact_remarks or 'No remarks',
+            'stage': self.stage_id.name if self.stage_id else 'New',
+            'recent_logs': log_text
+        }
+        
+        salesperson_name = self.env.user.name or 'Salesperson'
+        company_name = self.env.company.name or 'our Institution'
+        
+        sys_prompt = (
+            f"You are an AI sales assistant for {company_name}. The salesperson handling this lead is {salesperson_name}. "
+            "Your goal is to sell admission into our courses (do not refer to 'products' or 'solutions', use 'courses' or 'programs'). "
+            "Review the context for this single lead, including their course interested, contact status, stage, and recent communication logs. "
+            "Suggest a short next action for the salesperson and a very brief, casual draft response (extremely short WhatsApp length, 1-2 sentences maximum) ready to copy. "
+            "Output carefully structured strict JSON ONLY, resolving into exactly one object with keys: `suggested_action` (string) and `draft_message` (string). "
+            "No markdown block backticks around the json."
+        )
+        user_prompt = f"Lead Context: {json.dumps(context_data)}"
+        return [([
+            {"role": "system", "content": sys_prompt},
+            {"role": "user", "content": user_prompt}
+        ], self)]
+
+    def _read_ai_recent_logs(self, limit):
+        """Return the ``limit`` latest comments and emails of each lead, as
+        ``{lead id: [(date, body)]}`` newest first, read in one query"""
+        if not self:
+            return {}
+        self.env['mail.message'].flush_model(['model', 'res_id', 'message_type', 'date', 'body'])
+        self.env.cr.execute("""
+            SELECT res_id, date, body FROM (
+                SELECT res_id, date, body,
+                       ROW_NUMBER() OVER (PARTITION BY res_id ORDER BY date DESC, id DESC) AS rank
+                FROM mail_message
+                WHERE model = %s
+                AND res_id IN %s
+                AND message_type IN ('comment', 'email')
+            ) logs
+            WHERE rank <= %s
+            ORDER BY res_id, rank
+        """, [self._name, tuple(self.ids), limit])
+        logs = {}
+        for res_id, date, body in self.env.cr.fetchall():
+            logs.setdefault(res_id, []).append((date, body))
+        return logs
+
+    def _parse_ai_suggestion(self, results):
+        leads, content = results[0]
+        if not content:
+            return False
+        parsed_data = parse_llm_json(content)
+        return {
+            'suggested_action': parsed_data.get('suggested_action', 'Could not generate action.'),
+            'draft_message': parsed_data.get('draft_message', 'Could not generate message.'),
+        }
+
+    def _get_fallback_ai_suggestion(self, error):
+        return {
+            'suggested_action': f"Failed to generate suggestion: {error}",
+            'draft_message': False,
+        }
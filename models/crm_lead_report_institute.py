@@ -1,6 +1,10 @@
 # -*- coding: utf-8 -*-
 
 from odoo import models, fields, api, tools
+from datetime import timedelta
+
+# Lead/activity pairs the report aggregates, refreshed by cron and on demand
+REPORT_DATA_TABLE = 'crm_lead_report_institute_data'
 
 
 class CrmLeadReportInstitute(models.Model):
@@ -34,65 +38,126 @@ class CrmLeadReportInstitute(models.Model):
             'view_mode': 'calendar,tree,form',
             'domain': [
                 ('res_model', '=', 'crm.lead'),
-                ('user_id', 'in', self.env['crm.lead'].search([]).mapped('user_id').ids),
+                ('user_id', 'in', list(self.env['crm.dashboard.membership']._get_salesman_user_ids())),
             ],
             'context': {
                 'default_res_model': 'crm.lead',
             }
         }
 
+    @api.model
+    def _get_report_date_range(self):
+        """Creation date range of the reported leads, from the context"""
+        date_from = self.env.context.get('report_date_from')
+        date_to = self.env.context.get('report_date_to')
+        return (fields.Date.to_date(date_from) if date_from else None,
+                fields.Date.to_date(date_to) if date_to else None)
+
+    @property
+    def _table_query(self):
+        """Aggregate the materialized lead activities per officer.
+
+        The creation date range of the context is applied to the lead rows
+        before they are aggregated, and the day-relative counters are
+        computed at read time so they never go stale.
+        """
+        date_from, date_to = self._get_report_date_range()
+        where = ['TRUE']
+        params = []
+        if date_from:
+            where.append("create_date >= %s")
+            params.append(date_from)
+        if date_to:
+            where.append("create_date < %s")
+            params.append(date_to + timedelta(days=1))
+        query = """
+            SELECT 
+                user_id as id,
+                user_id,
+                COUNT(DISTINCT lead_id) as total_count,
+                COUNT(DISTINCT CASE 
+                    WHEN activity_date < CURRENT_DATE THEN lead_id 
+                END) as overdue_count,
+                COUNT(DISTINCT CASE 
+                    WHEN activity_date = CURRENT_DATE THEN lead_id 
+                END) as today_count,
+                COUNT(DISTINCT CASE 
+                    WHEN activity_date > CURRENT_DATE THEN lead_id 
+                END) as scheduled_count,
+                COUNT(DISTINCT CASE 
+                    WHEN active = true AND probability < 100 AND probability >= 0 
+                    THEN lead_id 
+                END) as active_count,
+                COUNT(DISTINCT CASE 
+                    WHEN probability = 100 THEN lead_id 
+                END) as won_count,
+                COUNT(DISTINCT CASE 
+                    WHEN probability = 0 AND active = false THEN lead_id 
+                END) as lost_count,
+                MAX(activity_date) as date_deadline,
+                MAX(create_date) as create_date
+            FROM %s
+            WHERE %s
+            GROUP BY 
+                user_id
+        """ % (REPORT_DATA_TABLE, ' AND '.join(where))
+        return self.env.cr.mogrify(query, params).decode()
+
     def init(self):
-        """Initialize the SQL view for the report"""
+        """Initialize the materialized lead activities behind the report"""
         tools.drop_view_if_exists(self.env.cr, self._table)
-        query = """
-            CREATE OR REPLACE VIEW %s AS (
+        tools.create_index(
+            self.env.cr, 'mail_activity_res_model_res_id_user_id_date_deadline_index',
+            'mail_activity', ['res_model', 'res_id', 'user_id', 'date_deadline'])
+        self.env.cr.execute("DROP MATERIALIZED VIEW IF EXISTS %s" % REPORT_DATA_TABLE)
+        self.env.cr.execute("""
+            CREATE MATERIALIZED VIEW %s AS (
                 SELECT 
-                    ROW_NUMBER() OVER (ORDER BY user_id) as id,
-                    user_id,
-                    COUNT(DISTINCT lead_id) as total_count,
-                    COUNT(DISTINCT CASE 
-                        WHEN activity_date < CURRENT_DATE THEN lead_id 
-                    END) as overdue_count,
-                    COUNT(DISTINCT CASE 
-                        WHEN activity_date = CURRENT_DATE THEN lead_id 
-                    END) as today_count,
-                    COUNT(DISTINCT CASE 
-                        WHEN activity_date > CURRENT_DATE THEN lead_id 
-                    END) as scheduled_count,
-                    COUNT(DISTINCT CASE 
-                        WHEN active = true AND probability < 100 AND probability >= 0 
-                        THEN lead_id 
-                    END) as active_count,
-                    COUNT(DISTINCT CASE 
-                        WHEN probability = 100 THEN lead_id 
-                    END) as won_count,
-                    COUNT(DISTINCT CASE 
-                        WHEN probability = 0 AND active = false THEN lead_id 
-                    END) as lost_count,
-                    MAX(activity_date) as date_deadline,
-                    MAX(create_date) as create_date
-                FROM (
-                    SELECT 
-                        l.id as lead_id,
-                        l.user_id,
-                        l.active,
-                        l.probability,
-                        l.create_date,
-                        a.date_deadline as activity_date
-                    FROM 
-                        crm_lead l
-                    LEFT JOIN 
-                        mail_activity a ON a.res_id = l.id 
-                        AND a.res_model = 'crm.lead'
-                        AND a.user_id = l.user_id
-                    WHERE 
-                        l.user_id IS NOT NULL
-                ) as lead_activities
-                GROUP BY 
-                    user_id
+                    l.id as lead_id,
+                    COALESCE(a.id, 0) as activity_id,
+                    l.user_id,
+                    l.active,
+                    l.probability,
+                    l.create_date,
+                    a.date_deadline as activity_date
+                FROM 
+                    crm_lead l
+                LEFT JOIN 
+                    mail_activity a ON a.res_id = l.id 
+                    AND a.res_model = 'crm.lead'
+                    AND a.user_id = l.user_id
+                WHERE 
+                    l.user_id IS NOT NULL
             )
-        """ % self._table
-        self.env.cr.execute(query)
+        """ % REPORT_DATA_TABLE)
+        # the unique index allows refreshing the view concurrently
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX %s_lead_activity_index ON %s (lead_id, activity_id)
+        """ % (REPORT_DATA_TABLE, REPORT_DATA_TABLE))
+        tools.create_index(
+            self.env.cr, '%s_user_id_create_date_index' % REPORT_DATA_TABLE,
+            REPORT_DATA_TABLE, ['user_id', 'create_date'])
+
+    @api.model
+    def _refresh_report_data(self):
+        """Refresh the materialized lead activities without locking readers"""
+        self.env['crm.lead'].flush_model(['user_id', 'active', 'probability'])
+        self.env['mail.activity'].flush_model(['res_model', 'res_id', 'user_id', 'date_deadline'])
+        self.env.cr.execute("REFRESH MATERIALIZED VIEW CONCURRENTLY %s" % REPORT_DATA_TABLE)
+
+    @api.model
+    def _cron_refresh_report(self):
+        """Scheduled refresh of the officer performance report"""
+        self._refresh_report_data()
+
+    @api.model
+    def action_refresh_report(self):
+        """Refresh the report on demand and reload the view"""
+        self._refresh_report_data()
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'reload',
+        }
 
     def action_view_all_leads(self):
         """Open all leads for this admission officer"""
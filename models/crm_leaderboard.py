@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, fields, api
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Lead fields deciding whether and where a lead counts in the leaderboard
+LEADERBOARD_LEAD_FIELDS = {'user_id', 'stage_id', 'active', 'probability', 'date_closed', 'date_open'}
+
+
+class CrmLeaderboardMonth(models.Model):
+    """Won leads per salesperson and closing month, for the leaderboard.
+
+    A lead counts when it is active, in a won stage, assigned and closed.
+    The rows are maintained incrementally by the writes of the leads (the
+    contribution of the written leads is removed before the write and added
+    back after it), and rebuilt from scratch when a stage changes its won
+    flag or the module is updated.
+    """
+    _name = 'crm.leaderboard.month'
+    _description = 'CRM Monthly Leaderboard'
+    _order = 'month desc, won_count desc'
+
+    user_id = fields.Many2one('res.users', string='Salesperson', required=True, ondelete='cascade')
+    month = fields.Date(string='Month', required=True, help='First day of the closing month')
+    won_count = fields.Integer(string='Won')
+    closure_days = fields.Float(string='Closure Days', help='Sum of the days taken to close the won leads')
+    closure_count = fields.Integer(string='Closed Leads', help='Won leads having a closing duration')
+
+    _sql_constraints = [
+        ('user_month_uniq', 'unique(month, user_id)', 'The leaderboard has one row per salesperson and month.'),
+    ]
+
+    def init(self):
+        self._rebuild_leaderboard()
+
+    @api.model
+    def _contribution_query(self, where):
+        return """
+            SELECT l.user_id,
+                   DATE_TRUNC('month', l.date_closed)::date AS month,
+                   COUNT(*) AS won_count,
+                   COALESCE(SUM(l.day_close), 0) AS closure_days,
+                   COUNT(l.day_close) AS closure_count
+            FROM crm_lead l
+            JOIN crm_stage s ON s.id = l.stage_id
+            WHERE l.active AND s.is_won AND l.date_closed IS NOT NULL AND l.user_id IS NOT NULL AND %s
+            GROUP BY l.user_id, DATE_TRUNC('month', l.date_closed)
+        """ % where
+
+    @api.model
+    def _rebuild_leaderboard(self):
+        """Recompute every row from the won leads"""
+        cr = self.env.cr
+        cr.execute("DELETE FROM crm_leaderboard_month")
+        cr.execute("""
+            INSERT INTO crm_leaderboard_month (user_id, month, won_count, closure_days, closure_count,
+                                               create_uid, create_date, write_uid, write_date)
+            SELECT user_id, month, won_count, closure_days, closure_count,
+                   %%(uid)s, NOW() AT TIME ZONE 'UTC', %%(uid)s, NOW() AT TIME ZONE 'UTC'
+            FROM (%s) AS contributions
+        """ % self._contribution_query('TRUE'), {'uid': self.env.uid})
+        _logger.info("Leaderboard rebuilt with %s row(s)", cr.rowcount)
+        self.invalidate_model()
+
+    @api.model
+    def _read_contributions(self, leads):
+        """Rows of the leaderboard that ``leads`` account for, as a list of
+        ``(user_id, month, won_count, closure_days, closure_count)``"""
+        if not leads:
+            return []
+        leads.flush_model(['user_id', 'stage_id', 'active', 'date_closed', 'day_close'])
+        self.env['crm.stage'].flush_model(['is_won'])
+        self.env.cr.execute(self._contribution_query('l.id = ANY(%s)'), [leads.ids])
+        return self.env.cr.fetchall()
+
+    @api.model
+    def _apply_contributions(self, removed, added):
+        """Move the counters from the ``removed`` to the ``added`` rows, as
+        returned by :meth:`_read_contributions`"""
+        deltas = {}
+        for sign, rows in ((-1, removed), (1, added)):
+            for user_id, month, won_count, closure_days, closure_count in rows:
+                delta = deltas.setdefault((user_id, month), [0, 0.0, 0])
+                delta[0] += sign * won_count
+                delta[1] += sign * closure_days
+                delta[2] += sign * closure_count
+        rows = [(user_id, month, *delta) for (user_id, month), delta in deltas.items() if any(delta)]
+        if not rows:
+            return
+        self.flush_model()
+        # concurrent writers increment the same rows without losing updates
+        self.env.cr.execute("""
+            INSERT INTO crm_leaderboard_month (user_id, month, won_count, closure_days, closure_count,
+                                               create_uid, create_date, write_uid, write_date)
+            SELECT user_id, month, won_count, closure_days, closure_count,
+                   %%s, NOW() AT TIME ZONE 'UTC', %%s, NOW() AT TIME ZONE 'UTC'
+            FROM (VALUES %s) AS deltas (user_id, month, won_count, closure_days, closure_count)
+            ON CONFLICT (month, user_id) DO UPDATE SET
+                won_count = crm_leaderboard_month.won_count + EXCLUDED.won_count,
+                closure_days = crm_leaderboard_month.closure_days + EXCLUDED.closure_days,
+                closure_count = crm_leaderboard_month.closure_count + EXCLUDED.closure_count,
+                write_uid = EXCLUDED.write_uid,
+                write_date = EXCLUDED.write_date
+        """ % ', '.join(['(%s::integer, %s::date, %s::integer, %s::float, %s::integer)'] * len(rows)),
+            [self.env.uid, self.env.uid] + [value for row in rows for value in row])
+        self.env.cr.execute("DELETE FROM crm_leaderboard_month WHERE won_count <= 0")
+        self.invalidate_model()
+
+    @api.model
+    def _read_month(self, month):
+        """Salespersons of the leaderboard of ``month`` (a first day of
+        month), by decreasing number of won leads, as dictionaries with the
+        user, the won count and the average closing duration"""
+        self.flush_model()
+        self.env.cr.execute("""
+            SELECT user_id, won_count,
+                   CASE WHEN closure_count > 0 THEN closure_days / closure_count END AS avg_close
+            FROM crm_leaderboard_month
+            WHERE month = %s AND won_count > 0
+            ORDER BY won_count DESC, user_id
+        """, [month])
+        return self.env.cr.dictfetchall()
+
+
+class CrmStage(models.Model):
+    _inherit = 'crm.stage'
+
+    def write(self, vals):
+        res = super().write(vals)
+        if 'is_won' in vals:
+            # every lead of the stage joins or leaves the leaderboard
+            self.flush_model(['is_won'])
+            self.env['crm.leaderboard.month'].sudo()._rebuild_leaderboard()
+            self.env['crm.dashboard.data']._invalidate_dashboard_cache(everyone=True)
+        return res
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+from odoo import models, api
+
+
+class MailActivity(models.Model):
+    """Keep the CRM dashboards in sync with lead activities"""
+    _inherit = 'mail.activity'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        activities = super().create(vals_list)
+        activities._invalidate_lead_dashboard_cache()
+        return activities
+
+    def write(self, vals):
+        self._invalidate_lead_dashboard_cache()
+        res = super().write(vals)
+        self._invalidate_lead_dashboard_cache()
+        return res
+
+    def unlink(self):
+        self._invalidate_lead_dashboard_cache()
+        return super().unlink()
+
+    def _action_done(self, feedback=False, attachment_ids=None):
+        self.env['crm.activity.done']._record(self)
+        return super()._action_done(feedback=feedback, attachment_ids=attachment_ids)
+
+    def _invalidate_lead_dashboard_cache(self):
+        """Invalidate and notify the dashboards of the assignees and lead
+        owners"""
+        lead_activities = self.filtered(lambda a: a.res_model == 'crm.lead')
+        if not lead_activities:
+            return
+        leads = self.env['crm.lead'].sudo().with_context(active_test=False).browse(lead_activities.mapped('res_id'))
+        leads = leads.exists()
+        user_ids = set(lead_activities.user_id.ids) | set(leads.user_id.ids)
+        company_ids = {lead.company_id.id or 0 for lead in leads}
+        Dashboard = self.env['crm.dashboard.data']
+        Dashboard._invalidate_dashboard_cache(list(user_ids), company_ids)
+        Dashboard._notify_dashboard_delta('activity', user_ids)
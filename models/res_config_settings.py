@@ -8,3 +8,33 @@ class ResConfigSettings(models.TransientModel):
         config_parameter='institute_crm.openrouter_api_key',
         help="API Key for OpenRouter to grab LLM AI suggestions horizontally across the CRM Dashboard."
     )
+    institute_crm_ai_backend = fields.Selection(
+        [('openrouter', 'OpenRouter'), ('mock', 'Local Mock (load testing)')],
+        string='AI Backend',
+        config_parameter='institute_crm.ai_backend',
+        default='openrouter',
+        help="The local mock answers every AI suggestion request with canned suggestions, without calling OpenRouter."
+    )
+    institute_crm_ai_timeout = fields.Integer(
+        string='AI Request Timeout (seconds)',
+        config_parameter='institute_crm.ai_timeout',
+        default=30,
+        help="Maximum time spent on one AI request before it is retried or falls back to the rule-based suggestions."
+    )
+    institute_crm_dashboard_cache_ttl = fields.Integer(
+        string='Dashboard Cache Lifetime (seconds)',
+        config_parameter='institute_crm.dashboard_cache_ttl',
+        default=300,
+        help="How long a computed dashboard is reused before being recomputed. Lead and activity changes refresh it earlier. Set to 0 to disable caching."
+    )
+    institute_crm_dashboard_profiling = fields.Boolean(
+        string='Profile Dashboard Sections',
+        config_parameter='institute_crm.dashboard_profiling',
+        help="Log the SQL queries, SQL time and Python time of every computed dashboard section, and keep them for trend analysis."
+    )
+    institute_crm_admission_season_start = fields.Char(
+        string='Admission Season Start',
+        config_parameter='institute_crm.admission_season_start',
+        default='04-01',
+        help="First day of the admission season, as MM-DD. The Admission Season timeframe of the dashboard starts on its latest occurrence."
+    )
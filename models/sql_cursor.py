@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""Reading large query results in batches.
+
+Odoo cursors fetch the whole result of a query at once. The helpers here
+declare an SQL cursor in the transaction instead, and fetch its rows a
+batch at a time with plain queries of the Odoo cursor (which keeps its
+logging and bookkeeping), so that other queries may run in between.
+"""
+
+import uuid
+
+from odoo.tools import SQL
+
+# Rows fetched per round trip
+FETCH_BATCH_SIZE = 2000
+
+
+def iter_query_rows(cr, query, batch_size=FETCH_BATCH_SIZE):
+    """Yield the rows of the ``SQL`` ``query``, fetched ``batch_size`` at a
+    time from an SQL cursor declared on ``cr``"""
+    name = SQL.identifier('institute_crm_%s' % uuid.uuid4().hex)
+    cr.execute(SQL('DECLARE %s NO SCROLL CURSOR FOR %s', name, query))
+    try:
+        while True:
+            cr.execute(SQL('FETCH FORWARD %s FROM %s', batch_size, name))
+            rows = cr.fetchall()
+            yield from rows
+            if len(rows) < batch_size:
+                break
+    finally:
+        if not cr.closed:
+            cr.execute(SQL('CLOSE %s', name))
@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 from odoo import api, models
+from odoo.tools import SQL
 
 class CampusAdmissionReport(models.AbstractModel):
     _name = 'report.institute_crm.report_campus_wise'
@@ -19,42 +20,26 @@ class CampusAdmissionReport(models.AbstractModel):
         if hasattr(doc, 'branch_id') and doc.branch_id:
             domain.append(('admitted_campus', '=', doc.branch_id.name))
         
-        leads = self.env['crm.lead'].search(domain)
-        
         campus_data = {}
-        for lead in leads:
-            campus = lead.admitted_campus or 'Unknown Campus'
-            course = lead.course_interested.name if lead.course_interested else 'Unknown Course'
-            
-            batch_name = 'Unknown Batch'
-            target = 0
-            
-            try:
-                if lead.batch_id:
-                    batch_name = lead.batch_id.name
-            except Exception:
-                pass
-                
-            try:
-                target = lead.batch_target or 0
-            except Exception:
-                pass
+        # (campus, course) -> {batch name: batch entry}
+        batch_index = {}
+        for campus, course, batch, achieved, target in self._read_admission_groups(domain):
+            campus = campus or 'Unknown Campus'
+            course = course.name if course else 'Unknown Course'
+            batch_name = batch.name if batch else 'Unknown Batch'
             
-            if campus not in campus_data:
-                campus_data[campus] = {}
-            if course not in campus_data[campus]:
-                campus_data[campus][course] = []
-            
-            batch_entry = next((item for item in campus_data[campus][course] if item['batch_name'] == batch_name), None)
+            batches = batch_index.setdefault((campus, course), {})
+            batch_entry = batches.get(batch_name)
             if not batch_entry:
                 batch_entry = {
                     'batch_name': batch_name,
-                    'target': target,
+                    'target': target or 0,
                     'achieved': 0
                 }
-                campus_data[campus][course].append(batch_entry)
+                batches[batch_name] = batch_entry
+                campus_data.setdefault(campus, {}).setdefault(course, []).append(batch_entry)
                 
-            batch_entry['achieved'] += 1
+            batch_entry['achieved'] += achieved
             
         return {
             'doc_ids': docids,
@@ -62,3 +47,45 @@ class CampusAdmissionReport(models.AbstractModel):
             'docs': docs,
             'campus_data': campus_data,
         }
+
+    @api.model
+    def _read_admission_groups(self, domain):
+        """Count the admissions per campus, course and batch in the database.
+
+        Yields ``(campus, course, batch, count, target)`` tuples. The batch
+        fields come from the student management module and are optional.
+        The target of a group is the one of its first lead in the default
+        lead order, as when the leads were walked one by one.
+        """
+        Lead = self.env['crm.lead']
+        has_batch = 'batch_id' in Lead._fields
+        groupby = ['admitted_campus', 'course_interested'] + (['batch_id'] if has_batch else [])
+        targets = self._read_group_targets(domain, groupby) if 'batch_target' in Lead._fields else {}
+
+        for group in Lead._read_group(domain, groupby, ['__count'], order='admitted_campus, course_interested'):
+            campus, course = group[0], group[1]
+            batch = group[2] if has_batch else None
+            count = group[len(groupby)]
+            key = self._group_key((campus, course.id) + ((batch.id,) if has_batch else ()))
+            yield campus, course, batch, count, targets.get(key, 0)
+
+    @api.model
+    def _group_key(self, values):
+        # an empty campus is read as False by _read_group, as '' or None in SQL
+        return tuple(value or None for value in values)
+
+    @api.model
+    def _read_group_targets(self, domain, groupby):
+        """Batch target of the first lead of each group, read with one query
+        selecting these leads and one read of their targets"""
+        Lead = self.env['crm.lead']
+        query = Lead._where_calc(domain)
+        Lead._apply_ir_rules(query, 'read')
+        columns = SQL(', ').join(SQL.identifier(Lead._table, fname) for fname in groupby)
+        query.order = SQL("%s, %s", columns, Lead._order_to_sql(Lead._order, query))
+        self.env.cr.execute(query.select(SQL(
+            'DISTINCT ON (%s) %s, %s', columns, SQL.identifier(Lead._table, 'id'), columns)))
+        rows = self.env.cr.fetchall()
+        leads = Lead.browse([row[0] for row in rows])
+        targets = dict(zip(leads.ids, leads.mapped('batch_target')))
+        return {self._group_key(row[1:]): targets[row[0]] or 0 for row in rows}
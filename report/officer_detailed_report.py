@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 from odoo import api, models
+from odoo.tools import SQL
+
+from odoo.addons.institute_crm.models.sql_cursor import iter_query_rows
 
 class OfficerDetailedReport(models.AbstractModel):
     _name = 'report.institute_crm.report_officer_detailed'
@@ -19,30 +22,76 @@ class OfficerDetailedReport(models.AbstractModel):
         if hasattr(doc, 'branch_id') and doc.branch_id:
             domain.append(('branch', '=', doc.branch_id.id))
             
-        students = self.env['student.student'].search(domain)
-        
-        officer_data = {}
-        for student in students:
-            # user_id on student is 'Admitted By' -> Admission Officer
-            officer = student.user_id.name if student.user_id else 'Unknown Officer'
-            course = student.course_id.name if student.course_id else ''
-            source = student.lead_id.source_id.name if student.lead_id and student.lead_id.source_id else ''
-            campus = student.branch.name if student.branch else ''
-            amount_paid = student.paid_amount
-                    
-            if officer not in officer_data:
-                officer_data[officer] = []
-                
-            officer_data[officer].append({
-                'course': course,
-                'amount_paid': amount_paid,
-                'source': source,
-                'campus': campus,
-            })
+        subtotals = self._read_officer_subtotals(domain)
             
         return {
             'doc_ids': docids,
             'doc_model': 'institute.admission.report.wizard',
             'docs': docs,
-            'officer_data': officer_data,
+            # generator: the rows of one officer are built at a time
+            'officer_data': self._iter_officer_data(doc, domain, subtotals),
+            'has_data': bool(subtotals),
+            'total_amount': sum(amount for count, amount in subtotals.values()),
+        }
+
+    @api.model
+    def _read_officer_subtotals(self, domain):
+        """Admission count and amount paid per officer, computed in the database"""
+        groups = self.env['student.student']._read_group(
+            domain, ['user_id'], ['__count', 'paid_amount:sum'])
+        return {user.id: (count, amount or 0.0) for user, count, amount in groups}
+
+    @api.model
+    def _iter_officer_data(self, doc, domain, subtotals):
+        """Yield the report rows grouped per officer.
+
+        The columns of the report are read with one SQL join, sorted by
+        officer and fetched in batches, and each officer's group is
+        yielded as soon as it is complete with its database subtotals.
+        """
+        Student = self.env['student.student']
+        query = Student._where_calc(domain)
+        Student._apply_ir_rules(query, 'read')
+        course_model = Student._fields['course_id'].comodel_name
+        branch_model = Student._fields['branch'].comodel_name
+        rows = iter_query_rows(self.env.cr, SQL("""
+            SELECT s.user_id, officer.name, %s, s.paid_amount, %s, %s
+            FROM %s s
+            LEFT JOIN %s course ON course.id = s.course_id
+            LEFT JOIN %s branch ON branch.id = s.branch
+            LEFT JOIN crm_lead l ON l.id = s.lead_id
+            LEFT JOIN utm_source src ON src.id = l.source_id
+            LEFT JOIN res_users u ON u.id = s.user_id
+            LEFT JOIN res_partner officer ON officer.id = u.partner_id
+            WHERE s.id IN (%%s)
+            ORDER BY officer.name, s.user_id, s.id
+        """ % (doc._get_name_sql(course_model, 'course'), doc._get_name_sql('utm.source', 'src'),
+               doc._get_name_sql(branch_model, 'branch'), Student._table,
+               self.env[course_model]._table, self.env[branch_model]._table), query.subselect()))
+        user = None
+        records = []
+        for user_id, officer_name, course, amount_paid, source, campus in rows:
+            if records and user_id != user[0]:
+                yield self._prepare_officer_group(user, records, subtotals)
+                records = []
+            user = (user_id, officer_name)
+            records.append({
+                'course': course or '',
+                'amount_paid': amount_paid or 0.0,
+                'source': source or '',
+                'campus': campus or '',
+            })
+        if records:
+            yield self._prepare_officer_group(user, records, subtotals)
+
+    @api.model
+    def _prepare_officer_group(self, user, records, subtotals):
+        # user_id on student is 'Admitted By' -> Admission Officer
+        user_id, officer_name = user
+        count, amount = subtotals.get(user_id, (len(records), 0.0))
+        return {
+            'officer': officer_name or 'Unknown Officer',
+            'records': records,
+            'count': count,
+            'amount_paid': amount,
         }
@@ -1,57 +1,253 @@
 /** @odoo-module **/
 
-import { Component, useState, onWillStart } from "@odoo/owl";
+import { Component, useState, onWillStart, onWillUnmount } from "@odoo/owl";
 import { registry } from "@web/core/registry";
 import { useService } from "@web/core/utils/hooks";
 import { session } from "@web/session";
 
+const AI_POLL_INTERVAL = 5000;
+// The rule-based suggestions are shown when the job takes longer than that
+const AI_POLL_TIMEOUT = 60000;
+// Changes received within that delay are applied together
+const DELTA_DEBOUNCE = 1000;
+// Timeframes of the heatmap, besides the custom range
+const TIMEFRAMES = [
+    { key: "today", label: "Today" },
+    { key: "week", label: "This Week" },
+    { key: "month", label: "This Month" },
+    { key: "quarter", label: "This Quarter" },
+    { key: "season", label: "Admission Season" },
+    { key: "all", label: "All Time" },
+];
+
 export class CrmDashboard extends Component {
     setup() {
         this.action = useService("action");
         this.orm = useService("orm");
         this.notification = useService("notification");
+        this.busService = useService("bus_service");
+        this.loadId = 0;
+        // Latest request of each section, older answers being dropped
+        this.sectionRequests = {};
+        // In debug mode, the server returns the timings of the sections
+        this.dashboardContext = { dashboard_debug: Boolean(this.env.debug) };
+        this.changedSections = new Set();
+        // Counter deltas received for the counter sections, patched in place
+        this.pendingCounters = [];
+        this.deltaTimeout = null;
+        this.timeframes = TIMEFRAMES;
         
         this.state = useState({
             data: null,
+            loadedSections: {},
             isLoading: true,
             aiSuggestions: null,
             isAiLoading: false,
             timeframe: 'month',
+            dateFrom: '',
+            dateTo: '',
         });
 
         onWillStart(async () => {
             await this.loadData();
         });
+
+        // Resolvers of the pending waits for the AI suggestion job
+        this.aiWaiters = new Set();
+        this.isUnmounted = false;
+        this.onAiJobDone = this.onAiJobDone.bind(this);
+        this.busService.subscribe("institute_crm.ai_suggestion_job", this.onAiJobDone);
+
+        // The changes are sent on the channel of the partner of the user
+        this.onDashboardDelta = this.onDashboardDelta.bind(this);
+        this.busService.subscribe("institute_crm.dashboard_delta", this.onDashboardDelta);
+        onWillUnmount(() => {
+            this.isUnmounted = true;
+            this.wakeAiWaiters();
+            this.busService.unsubscribe("institute_crm.ai_suggestion_job", this.onAiJobDone);
+            this.busService.unsubscribe("institute_crm.dashboard_delta", this.onDashboardDelta);
+            clearTimeout(this.deltaTimeout);
+        });
     }
 
     async loadData() {
         this.state.isLoading = true;
+        const loadId = ++this.loadId;
+        let header;
         try {
-            this.state.data = await this.orm.call(
+            // Only the header blocks the first paint, the sections follow
+            header = await this.orm.call(
                 "crm.dashboard.data",
-                "get_dashboard_data",
-                [this.state.timeframe]
+                "get_dashboard_header",
+                [this.state.timeframe],
+                { ...this.getTimeframeDates(), context: this.dashboardContext }
             );
+            this.state.data = header;
+            this.state.loadedSections = {};
         } catch (e) {
             console.error("Error loading dashboard data:", e);
             this.state.data = { error: true };
         }
         this.state.isLoading = false;
+        if (header) {
+            this.loadSections(header, loadId);
+        }
+    }
+
+    async loadSections(header, loadId) {
+        // Above-the-fold sections first, then the others in parallel
+        const prioritySections = header.priority_sections;
+        await Promise.all(prioritySections.map((section) => this.loadSection(section, loadId)));
+        await Promise.all(
+            header.sections
+                .filter((section) => !prioritySections.includes(section))
+                .map((section) => this.loadSection(section, loadId))
+        );
+    }
+
+    async loadSection(section, loadId) {
+        const requestId = (this.sectionRequests[section] || 0) + 1;
+        this.sectionRequests[section] = requestId;
+        try {
+            const values = await this.orm.call(
+                "crm.dashboard.data",
+                "get_dashboard_section",
+                [section, this.state.timeframe],
+                { ...this.getTimeframeDates(), context: this.dashboardContext }
+            );
+            // Drop the answers of a reload or a request of the section
+            // (e.g. for another timeframe) superseded meanwhile
+            if (loadId !== this.loadId || requestId !== this.sectionRequests[section]) {
+                return;
+            }
+            if (values._debug_timings) {
+                console.debug(`Dashboard section ${section}:`, values._debug_timings[section]);
+                delete values._debug_timings;
+            }
+            Object.assign(this.state.data, values);
+            this.state.loadedSections[section] = true;
+        } catch (e) {
+            console.error(`Error loading dashboard section ${section}:`, e);
+        }
+    }
+
+    onDashboardDelta(delta) {
+        const data = this.state.data;
+        if (!data || data.error) {
+            return;
+        }
+        // Only the sections of this user changed by the records are sent
+        for (const section of delta.sections) {
+            if (data.sections.includes(section)) {
+                this.changedSections.add(section);
+            }
+        }
+        if (delta.counters && data.sections.includes("pipeline")) {
+            this.pendingCounters.push(delta.counters);
+        }
+        if ((this.changedSections.size || this.pendingCounters.length) && !this.deltaTimeout) {
+            this.deltaTimeout = setTimeout(() => this.applyDeltas(), DELTA_DEBOUNCE);
+        }
+    }
+
+    async applyDeltas() {
+        // Patch the counters in place, and fetch the other changed sections
+        // again, without reloading the page
+        for (const counters of this.pendingCounters) {
+            if (!this.patchCounters(counters)) {
+                this.changedSections.add("pipeline");
+            }
+        }
+        this.pendingCounters = [];
+        const sections = [...this.changedSections];
+        this.changedSections.clear();
+        this.deltaTimeout = null;
+        const loadId = this.loadId;
+        await Promise.all(sections.map((section) => this.loadSection(section, loadId)));
+    }
+
+    patchCounters(counters) {
+        // The section is fetched again when it is not loaded yet, or when
+        // the funnel gains or loses a stage
+        if (!this.isLoaded("pipeline")) {
+            return false;
+        }
+        const data = this.state.data;
+        const stages = Object.entries(counters.stages).map(([stageId, count]) => [
+            data.my_funnel.find((f) => f.stage_id === Number(stageId)),
+            count,
+        ]);
+        if (stages.some(([stage, count]) => count && (!stage || stage.count + count <= 0))) {
+            return false;
+        }
+        for (const [stage, count] of stages) {
+            if (stage) {
+                stage.count += count;
+            }
+        }
+        const pipeline = data.my_pipeline;
+        pipeline.total_leads += counters.open_total;
+        pipeline.expected_revenue += counters.open_revenue;
+        pipeline.avg_deal = pipeline.total_leads ? Math.round(pipeline.expected_revenue / pipeline.total_leads) : 0;
+        return true;
+    }
+
+    isLoaded(section) {
+        return Boolean(this.state.loadedSections[section]);
     }
     
+    getTimeframeDates() {
+        if (this.state.timeframe !== 'custom') {
+            return {};
+        }
+        return { date_from: this.state.dateFrom, date_to: this.state.dateTo };
+    }
+
     async setTimeframe(tf) {
+        if (tf === 'custom' && !(this.state.dateFrom && this.state.dateTo && this.state.dateFrom <= this.state.dateTo)) {
+            this.notification.add("Pick a start date before the end date.", { type: "warning" });
+            return;
+        }
         this.state.timeframe = tf;
-        await this.loadData();
+        // Only the sections depending on the timeframe are reloaded
+        const loadId = this.loadId;
+        await Promise.all(
+            this.state.data.timeframe_sections.map((section) => this.loadSection(section, loadId))
+        );
     }
 
     async fetchAiSuggestions() {
         this.state.isAiLoading = true;
         try {
-            this.state.aiSuggestions = await this.orm.call(
+            // The suggestions are generated in the background: wait for the
+            // bus notification of the queued job, polling as a safety net
+            let job = await this.orm.call(
                 "crm.dashboard.data",
                 "get_ai_suggestions",
                 []
             );
+            const deadline = Date.now() + AI_POLL_TIMEOUT;
+            while (job.state === 'pending' || job.state === 'running') {
+                if (Date.now() >= deadline) {
+                    // The runner is late: fall back to the rule-based suggestions
+                    job = await this.orm.call(
+                        "crm.dashboard.data",
+                        "get_ai_suggestion_fallback",
+                        []
+                    );
+                    break;
+                }
+                await this.waitAiJob(Math.min(AI_POLL_INTERVAL, deadline - Date.now()));
+                if (this.isUnmounted) {
+                    return;
+                }
+                job = await this.orm.call(
+                    "crm.dashboard.data",
+                    "get_ai_suggestion_job",
+                    [job.job_id]
+                );
+            }
+            this.state.aiSuggestions = job.result || [];
         } catch (e) {
             console.error("Error loading AI suggestions:", e);
             this.state.aiSuggestions = [];
@@ -59,6 +255,29 @@ export class CrmDashboard extends Component {
         this.state.isAiLoading = false;
     }
 
+    waitAiJob(delay) {
+        return new Promise((resolve) => {
+            const timeout = setTimeout(done, delay);
+            const waiters = this.aiWaiters;
+            function done() {
+                clearTimeout(timeout);
+                waiters.delete(done);
+                resolve();
+            }
+            waiters.add(done);
+        });
+    }
+
+    wakeAiWaiters() {
+        for (const done of [...this.aiWaiters]) {
+            done();
+        }
+    }
+
+    onAiJobDone() {
+        this.wakeAiWaiters();
+    }
+
     // Handlers
     openLead(leadId) {
         if (!leadId) return;
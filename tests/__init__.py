@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+
+from . import test_phone_duplicates
+from . import test_leaderboard
+from . import test_activity_done
+from . import test_dashboard_timeframe
+from . import test_dashboard_metrics
+from . import test_dashboard_snapshot
+from . import test_student_fields_sync
+from . import test_campus_admission_report
+from . import test_admitted_campus
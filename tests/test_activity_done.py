@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+from odoo import fields
+from odoo.tests import TransactionCase, new_test_user, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestActivityDone(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.salesman = new_test_user(cls.env, login='activity_done_salesman', groups='sales_team.group_sale_salesman')
+        cls.manager = new_test_user(cls.env, login='activity_done_manager', groups='sales_team.group_sale_manager')
+        cls.lead = cls.env['crm.lead'].with_context(mail_activity_automation_skip=True).create({
+            'name': 'Activity Ledger',
+            'user_id': cls.salesman.id,
+        })
+        cls.Ledger = cls.env['crm.activity.done'].sudo()
+
+    def test_done_activity_recorded(self):
+        activity = self.lead.activity_schedule('mail.mail_activity_data_call', user_id=self.salesman.id)
+        activity.with_user(self.salesman).action_feedback(feedback='Called back')
+
+        row = self.Ledger.search([('lead_id', '=', self.lead.id)])
+        self.assertEqual(len(row), 1)
+        self.assertEqual(row.user_id, self.salesman)
+        self.assertEqual(row.activity_type_id, self.env.ref('mail.mail_activity_data_call'))
+        self.assertTrue(row.done_date)
+
+    def test_credited_to_the_user_marking_done(self):
+        activity = self.lead.activity_schedule('mail.mail_activity_data_todo', user_id=self.salesman.id)
+        activity.with_user(self.manager).action_done()
+        self.assertEqual(self.Ledger.search([('lead_id', '=', self.lead.id)]).user_id, self.manager)
+
+    def test_batch_done(self):
+        activities = self.lead.activity_schedule('mail.mail_activity_data_todo', user_id=self.salesman.id)
+        activities |= self.lead.activity_schedule('mail.mail_activity_data_call', user_id=self.salesman.id)
+        activities.with_user(self.salesman).action_done()
+        self.assertEqual(self.Ledger.search_count([('lead_id', '=', self.lead.id)]), 2)
+
+    def test_other_activities_not_recorded(self):
+        partner = self.env['res.partner'].create({'name': 'Activity Ledger Partner'})
+        count = self.Ledger.search_count([])
+        partner.activity_schedule('mail.mail_activity_data_todo', user_id=self.salesman.id).action_done()
+        # cancelled lead activities are not done either
+        self.lead.activity_schedule('mail.mail_activity_data_todo', user_id=self.salesman.id).unlink()
+        self.assertEqual(self.Ledger.search_count([]), count)
+
+    def test_read_daily_counts(self):
+        today = fields.Datetime.now().date()
+        before = self.Ledger._read_daily_counts(today).get(today, 0)
+        self.lead.activity_schedule('mail.mail_activity_data_todo', user_id=self.salesman.id).action_done()
+        self.assertEqual(self.Ledger._read_daily_counts(today).get(today, 0), before + 1)
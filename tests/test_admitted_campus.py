@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+from unittest import SkipTest
+
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestAdmittedCampus(TransactionCase):
+    """The admitted campus cron fills the campuses the report wizard used to
+    write lead by lead"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        if 'student.student' not in cls.env:
+            raise SkipTest("The student module is not installed")
+        cls.Student = cls.env['student.student']
+        Branch = cls.env[cls.Student._fields['branch'].comodel_name]
+        cls.north, cls.south = Branch.create([{'name': 'Admitted North'}, {'name': 'Admitted South'}])
+        won_stage = cls.env['crm.stage'].create({'name': 'Admitted Won', 'is_won': True})
+        Lead = cls.env['crm.lead'].with_context(mail_activity_automation_skip=True)
+        cls.won_lead, cls.twice_lead, cls.set_lead, cls.open_lead = Lead.create([
+            {'name': 'Admitted Won', 'stage_id': won_stage.id, 'probability': 100},
+            {'name': 'Admitted Twice', 'stage_id': won_stage.id, 'probability': 100},
+            {'name': 'Admitted Already', 'stage_id': won_stage.id, 'probability': 100,
+             'admitted_campus': 'Admitted Elsewhere'},
+            {'name': 'Admitted Open', 'probability': 50},
+        ])
+        cls._create_students([
+            (cls.won_lead, cls.north),
+            (cls.twice_lead, cls.north),
+            (cls.twice_lead, cls.south),
+            (cls.set_lead, cls.north),
+            (cls.open_lead, cls.north),
+        ])
+
+    @classmethod
+    def _create_students(cls, lead_branches):
+        vals_list = []
+        for lead, branch in lead_branches:
+            vals = {'lead_id': lead.id, 'branch': branch.id, 'name': f"Student of {lead.name}"}
+            vals_list.append({key: value for key, value in vals.items() if key in cls.Student._fields})
+        cls.Student.create(vals_list)
+
+    def _expected_campus(self, lead):
+        """Campus the wizard wrote before: the branch of the latest student
+        of a won lead without campus"""
+        if lead.admitted_campus or lead.probability != 100:
+            return lead.admitted_campus
+        student = self.Student.search([('lead_id', '=', lead.id)], order='id desc', limit=1)
+        return student.branch.name or lead.admitted_campus
+
+    def test_fill_admitted_campus(self):
+        leads = self.won_lead | self.twice_lead | self.set_lead | self.open_lead
+        expected = {lead: self._expected_campus(lead) for lead in leads}
+        self.env['crm.lead']._cron_fill_admitted_campus()
+        self.assertEqual({lead: lead.admitted_campus for lead in leads}, expected)
+        self.assertEqual(self.twice_lead.admitted_campus, 'Admitted South')
+        self.assertFalse(self.open_lead.admitted_campus)
+
+    def test_incremental_run(self):
+        self.env['crm.lead']._cron_fill_admitted_campus()
+        self.won_lead.admitted_campus = False
+        self.env['crm.lead']._cron_fill_admitted_campus()
+        self.assertEqual(self.won_lead.admitted_campus, 'Admitted North')
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestCampusAdmissionReport(TransactionCase):
+    """The grouped campus report matches the former lead-by-lead report"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.won_stage = cls.env['crm.stage'].create({'name': 'Campus Admitted', 'is_won': True})
+        Product = cls.env['product.product']
+        cls.course_a = Product.create({'name': 'Campus Course A', 'type': 'service'})
+        cls.course_b = Product.create({'name': 'Campus Course B', 'type': 'service'})
+        Lead = cls.env['crm.lead'].with_context(mail_activity_automation_skip=True)
+        cls.leads = Lead.create([
+            {'name': 'Campus North A1', 'admitted_campus': 'Campus North', 'course_interested': cls.course_a.id},
+            {'name': 'Campus North A2', 'admitted_campus': 'Campus North', 'course_interested': cls.course_a.id},
+            {'name': 'Campus North B', 'admitted_campus': 'Campus North', 'course_interested': cls.course_b.id},
+            {'name': 'Campus South', 'admitted_campus': 'Campus South', 'course_interested': cls.course_a.id},
+            {'name': 'Campus Empty', 'course_interested': cls.course_a.id},
+            {'name': 'Campus Blank', 'course_interested': cls.course_a.id},
+            {'name': 'Campus No Course', 'admitted_campus': 'Campus South'},
+        ])
+        cls.leads.write({'stage_id': cls.won_stage.id, 'probability': 100})
+        cls.env.flush_all()
+        # an empty campus is stored as NULL or as an empty string
+        cls.env.cr.execute("UPDATE crm_lead SET admitted_campus = '' WHERE id = %s", [cls.leads[5].id])
+        cls.env.invalidate_all()
+        cls.wizard = cls.env['institute.admission.report.wizard'].create({
+            'date_from': fields.Date.today() - timedelta(days=1),
+            'date_to': fields.Date.today() + timedelta(days=1),
+            'report_type': 'college',
+        })
+
+    def _former_campus_data(self):
+        """The report values as computed lead by lead before"""
+        leads = self.env['crm.lead'].search([
+            ('active', '=', True),
+            ('probability', '=', 100),
+            ('date_closed', '>=', self.wizard.date_from),
+            ('date_closed', '<=', self.wizard.date_to),
+        ])
+        has_batch = 'batch_id' in leads._fields
+        has_target = 'batch_target' in leads._fields
+        campus_data = {}
+        for lead in leads:
+            campus = lead.admitted_campus or 'Unknown Campus'
+            course = lead.course_interested.name if lead.course_interested else 'Unknown Course'
+            batch_name = lead.batch_id.name if has_batch and lead.batch_id else 'Unknown Batch'
+            target = (lead.batch_target or 0) if has_target else 0
+            batches = campus_data.setdefault(campus, {}).setdefault(course, [])
+            batch_entry = next((item for item in batches if item['batch_name'] == batch_name), None)
+            if not batch_entry:
+                batch_entry = {'batch_name': batch_name, 'target': target, 'achieved': 0}
+                batches.append(batch_entry)
+            batch_entry['achieved'] += 1
+        return campus_data
+
+    def _sorted(self, campus_data):
+        return {
+            campus: {course: sorted(batches, key=lambda entry: entry['batch_name'])
+                     for course, batches in courses.items()}
+            for campus, courses in campus_data.items()
+        }
+
+    def test_campus_groups(self):
+        values = self.env['report.institute_crm.report_campus_wise']._get_report_values(self.wizard.ids)
+        campus_data = values['campus_data']
+        self.assertEqual(self._sorted(campus_data), self._sorted(self._former_campus_data()))
+
+        self.assertEqual(campus_data['Campus North']['Campus Course A'][0]['achieved'], 2)
+        self.assertEqual(campus_data['Campus South']['Unknown Course'][0]['achieved'], 1)
+        # the NULL and empty campuses make one group
+        self.assertEqual(campus_data['Unknown Campus']['Campus Course A'][0]['achieved'], 2)
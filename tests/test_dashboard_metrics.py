@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+from datetime import datetime, time, timedelta
+
+from odoo import fields
+from odoo.tests import TransactionCase, new_test_user, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestDashboardMetrics(TransactionCase):
+    """The SQL aggregates of the salesperson dashboard match the ORM counts
+    they replaced, under the record rules of the user"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.salesman = new_test_user(cls.env, login='metrics_salesman', groups='sales_team.group_sale_salesman')
+        cls.other = new_test_user(cls.env, login='metrics_other', groups='sales_team.group_sale_salesman')
+        cls.other_company = cls.env['res.company'].create({'name': 'Metrics Other Campus'})
+        cls.salesman.company_ids |= cls.other_company
+        cls.won_stage = cls.env['crm.stage'].create({'name': 'Metrics Enrolled', 'is_won': True})
+        cls.new_stage = cls.env['crm.stage'].create({'name': 'Metrics New Enquiry'})
+        cls.source = cls.env['utm.source'].create({'name': 'Metrics Fair'})
+        cls.lost_reason = cls.env['crm.lost.reason'].create({'name': 'Metrics Too Far'})
+        today = fields.Date.today()
+        cls.today = today
+
+        Lead = cls.env['crm.lead'].with_context(mail_activity_automation_skip=True)
+        cls.open_lead = Lead.create({
+            'name': 'Metrics Open', 'user_id': cls.salesman.id, 'stage_id': cls.new_stage.id,
+            'priority': '3', 'expected_revenue': 1000,
+        })
+        cls.won_lead = Lead.create({
+            'name': 'Metrics Won', 'user_id': cls.salesman.id, 'stage_id': cls.won_stage.id,
+            'priority': '3', 'source_id': cls.source.id, 'expected_revenue': 5000,
+        })
+        cls.stageless_lead = Lead.create({
+            'name': 'Metrics Stageless', 'user_id': cls.salesman.id, 'expected_revenue': 300,
+        })
+        cls.lost_lead = Lead.create({
+            'name': 'Metrics Lost', 'user_id': cls.salesman.id, 'stage_id': cls.new_stage.id,
+            'lost_reason_id': cls.lost_reason.id, 'active': False,
+        })
+        cls.other_lead = Lead.create({
+            'name': 'Metrics Colleague', 'user_id': cls.other.id, 'stage_id': cls.won_stage.id,
+        })
+        # not read by the salesman: its company is not among the allowed ones
+        cls.foreign_lead = Lead.create({
+            'name': 'Metrics Foreign Campus', 'user_id': cls.salesman.id,
+            'company_id': cls.other_company.id, 'stage_id': cls.won_stage.id,
+        })
+        # archived activities are done ones, they neither count as due nor
+        # keep a lead from being neglected
+        archived = cls.stageless_lead.activity_schedule(
+            'mail.mail_activity_data_call', user_id=cls.salesman.id, date_deadline=today)
+        archived.active = False
+        cls.open_lead.activity_schedule('mail.mail_activity_data_call', user_id=cls.salesman.id,
+                                        date_deadline=today)
+        cls.won_lead.activity_schedule('mail.mail_activity_data_todo', user_id=cls.salesman.id,
+                                       date_deadline=today - timedelta(days=1))
+        cls.won_lead.activity_schedule(
+            'mail.mail_activity_data_todo', user_id=cls.salesman.id).with_user(cls.salesman).action_done()
+
+        cls.env.flush_all()
+        # the stage would be recomputed by the ORM, and the leads not
+        # touched for two days are neglected
+        cls.env.cr.execute("UPDATE crm_lead SET stage_id = NULL WHERE id = %s", [cls.stageless_lead.id])
+        cls.env.cr.execute("""
+            UPDATE crm_lead SET write_date = %s, date_closed = %s WHERE id = ANY(%s)
+        """, [fields.Datetime.now() - timedelta(days=5), fields.Datetime.now() - timedelta(days=10),
+              [cls.open_lead.id, cls.won_lead.id, cls.stageless_lead.id]])
+        cls.env.invalidate_all()
+
+        allowed = {'allowed_company_ids': cls.env.company.ids}
+        cls.Dashboard = cls.env['crm.dashboard.data'].with_user(cls.salesman).with_context(**allowed)
+        cls.Lead = cls.env['crm.lead'].with_user(cls.salesman).with_context(**allowed)
+
+    def test_lead_metrics(self):
+        uid = self.salesman.id
+        Lead = self.Lead
+        mine = [('user_id', '=', uid)]
+        won = [('stage_id.is_won', '=', True)]
+        is_open = ['|', ('stage_id', '=', False), ('stage_id.is_won', '=', False)]
+        last_week_end = self.today - timedelta(days=7)
+        new_stage_ids = self.env['crm.stage'].search([('name', 'ilike', 'new')]).ids
+
+        metrics = self.Dashboard._get_salesperson_lead_metrics(uid, self.today)
+
+        self.assertEqual(metrics['user_total'], Lead.search_count(mine))
+        self.assertEqual(metrics['user_won'], Lead.search_count(mine + won))
+        self.assertEqual(metrics['user_won_day_close'], sum(Lead.search(mine + won).mapped('day_close')))
+        self.assertEqual(metrics['team_total'], Lead.search_count([('user_id', '!=', False)]))
+        self.assertEqual(metrics['team_won'], Lead.search_count([('user_id', '!=', False)] + won))
+        self.assertEqual(metrics['this_week_won'], Lead.search_count(
+            mine + won + [('date_closed', '>=', last_week_end)]))
+        self.assertEqual(metrics['last_week_won'], Lead.search_count(
+            mine + won + [('date_closed', '>=', self.today - timedelta(days=14)),
+                          ('date_closed', '<', last_week_end)]))
+        self.assertEqual(metrics['neglected_leads'], Lead.search_count(
+            mine + is_open + [('write_date', '<', fields.Datetime.now() - timedelta(days=2)),
+                              ('activity_ids', '=', False)]))
+        self.assertEqual(metrics['new_leads'], Lead.search_count(mine + [('stage_id', 'in', new_stage_ids)]))
+        self.assertEqual(metrics['high_priority_total'], Lead.search_count(mine + [('priority', '=', '3')]))
+        self.assertEqual(metrics['high_priority_won'], Lead.search_count(mine + won + [('priority', '=', '3')]))
+        self.assertEqual(metrics['open_total'], Lead.search_count(mine + is_open))
+        self.assertEqual(metrics['open_revenue'], sum(Lead.search(mine + is_open).mapped('expected_revenue')))
+
+        # the fixture covers the cases the review was about
+        self.assertEqual(metrics['user_total'], 3)
+        self.assertEqual(metrics['open_total'], 2)
+        self.assertEqual(metrics['neglected_leads'], 1)
+
+    def test_lead_breakdown(self):
+        leads = self.Lead.with_context(active_test=False).search([('user_id', '=', self.salesman.id)])
+        expected = {'source': {}, 'lost_reason': {}, 'stage': {}}
+        for lead in leads:
+            if lead.active and lead.stage_id.is_won and lead.source_id:
+                expected['source'][lead.source_id.id] = expected['source'].get(lead.source_id.id, 0) + 1
+            if not lead.active and lead.lost_reason_id:
+                expected['lost_reason'][lead.lost_reason_id.id] = expected['lost_reason'].get(lead.lost_reason_id.id, 0) + 1
+            if lead.active and lead.stage_id:
+                expected['stage'][lead.stage_id.id] = expected['stage'].get(lead.stage_id.id, 0) + 1
+
+        breakdown = self.Dashboard._get_salesperson_lead_breakdown(self.salesman.id)
+        self.assertEqual(breakdown, expected)
+        self.assertEqual(breakdown['lost_reason'], {self.lost_reason.id: 1})
+
+    def test_activity_counts(self):
+        uid = self.salesman.id
+        Activity = self.env['mail.activity'].with_user(self.salesman).with_context(
+            allowed_company_ids=self.env.company.ids)
+        mine = [('res_model', '=', 'crm.lead'), ('user_id', '=', uid)]
+        Ledger = self.env['crm.activity.done'].sudo()
+
+        counts = self.Dashboard._get_salesperson_activity_counts(uid, self.today)
+
+        self.assertEqual(counts['due_today'], Activity.search_count(mine + [('date_deadline', '=', self.today)]))
+        self.assertEqual(counts['missed_yesterday'], Activity.search_count(
+            mine + [('date_deadline', '=', self.today - timedelta(days=1))]))
+        self.assertEqual(counts['completed_total'], Ledger.search_count([('user_id', '=', uid)]))
+        self.assertEqual(counts['completed_today'], Ledger.search_count([
+            ('user_id', '=', uid), ('done_date', '>=', datetime.combine(self.today, time.min))]))
+        self.assertEqual(counts['due_today'], 1)
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import TransactionCase, new_test_user, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestDashboardSnapshot(TransactionCase):
+    """The snapshot plus live totals match the ORM counts of the leads and
+    completed activities of the allowed companies"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.salesman = new_test_user(cls.env, login='snapshot_salesman', groups='sales_team.group_sale_salesman')
+        cls.other_company = cls.env['res.company'].create({'name': 'Snapshot Other Campus'})
+        cls.salesman.company_ids |= cls.other_company
+        cls.won_stage = cls.env['crm.stage'].create({'name': 'Snapshot Enrolled', 'is_won': True})
+
+        Lead = cls.env['crm.lead'].with_context(mail_activity_automation_skip=True)
+        cls.leads = Lead.create([
+            {'name': 'Snapshot Won', 'user_id': cls.salesman.id, 'stage_id': cls.won_stage.id},
+            {'name': 'Snapshot Open', 'user_id': cls.salesman.id},
+            {'name': 'Snapshot Lost', 'user_id': cls.salesman.id, 'probability': 0, 'active': False},
+            {'name': 'Snapshot Foreign', 'user_id': cls.salesman.id, 'company_id': cls.other_company.id},
+        ])
+        for lead in cls.leads:
+            lead.activity_schedule('mail.mail_activity_data_todo', user_id=cls.salesman.id).action_done()
+        # the past days are served by the snapshot, today by the live rows
+        cls.env.flush_all()
+        past = fields.Datetime.now() - timedelta(days=3)
+        cls.env.cr.execute("UPDATE crm_lead SET create_date = %s WHERE id = ANY(%s)", [past, cls.leads[:3].ids])
+        cls.env.cr.execute("UPDATE crm_activity_done SET done_date = %s WHERE lead_id = ANY(%s)",
+                           [past, cls.leads[:2].ids])
+        cls.env.invalidate_all()
+        cls.Snapshot = cls.env['crm.dashboard.snapshot'].with_context(allowed_company_ids=cls.env.company.ids)
+        cls.Snapshot.action_rebuild_snapshot()
+
+    def _assert_totals(self):
+        Lead = self.env['crm.lead'].with_context(active_test=False)
+        mine = [('user_id', '=', self.salesman.id), ('company_id', 'in', [False] + self.env.company.ids)]
+        totals = [row for row in self.Snapshot._read_lead_totals() if row['user_id'] == self.salesman.id]
+        self.assertEqual(sum(row['lead_count'] for row in totals), Lead.search_count(mine))
+        self.assertEqual(sum(row['won_count'] for row in totals), Lead.search_count(
+            mine + [('active', '=', True), ('stage_id.is_won', '=', True)]))
+        self.assertEqual(sum(row['lost_count'] for row in totals), Lead.search_count(
+            mine + [('active', '=', False), ('probability', '=', 0)]))
+        self.assertEqual(self.Snapshot._read_completed_activity_count(), self.env['crm.activity.done'].search_count([
+            '|', ('lead_id.company_id', '=', False), ('lead_id.company_id', 'in', self.env.company.ids),
+        ]))
+
+    def test_totals(self):
+        self._assert_totals()
+        totals = [row for row in self.Snapshot._read_lead_totals() if row['user_id'] == self.salesman.id]
+        self.assertEqual(sum(row['lead_count'] for row in totals), 3)
+
+    def test_totals_after_deletion(self):
+        self.leads[0].unlink()
+        self.env['crm.activity.done'].search([('lead_id', '=', self.leads[1].id)]).unlink()
+        self.assertTrue(self.Snapshot.search([('dirty', '=', True), ('kind', '=', 'lead')]))
+        self.assertTrue(self.Snapshot.search([('dirty', '=', True), ('kind', '=', 'activity')]))
+        self.Snapshot._cron_refresh_snapshot()
+        self.assertFalse(self.Snapshot.search([('dirty', '=', True)]))
+        self._assert_totals()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date
+
+from odoo.exceptions import UserError
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestDashboardTimeframe(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Dashboard = cls.env['crm.dashboard.data']
+
+    def _window(self, timeframe, today, date_from=None, date_to=None):
+        return self.Dashboard._get_timeframe_window(timeframe, today, date_from, date_to)
+
+    def _set_season_start(self, season_start):
+        self.env['ir.config_parameter'].sudo().set_param('institute_crm.admission_season_start', season_start)
+
+    def test_fixed_timeframes(self):
+        today = date(2024, 5, 15)  # a Wednesday
+        self.assertEqual(self._window('today', today), (today, date(2024, 5, 16)))
+        self.assertEqual(self._window('week', today), (date(2024, 5, 13), date(2024, 5, 16)))
+        self.assertEqual(self._window('month', today), (date(2024, 5, 1), date(2024, 5, 16)))
+        self.assertIsNone(self._window('all', today))
+        with self.assertRaises(UserError):
+            self._window('year', today)
+
+    def test_quarter_boundaries(self):
+        for today, start in [
+            (date(2024, 1, 1), date(2024, 1, 1)),
+            (date(2024, 3, 31), date(2024, 1, 1)),
+            (date(2024, 4, 1), date(2024, 4, 1)),
+            (date(2024, 9, 30), date(2024, 7, 1)),
+            (date(2024, 12, 31), date(2024, 10, 1)),
+        ]:
+            self.assertEqual(self._window('quarter', today)[0], start, f"quarter of {today}")
+
+    def test_season(self):
+        self._set_season_start('04-01')
+        self.assertEqual(self._window('season', date(2024, 3, 31))[0], date(2023, 4, 1))
+        self.assertEqual(self._window('season', date(2024, 4, 1))[0], date(2024, 4, 1))
+        self.assertEqual(self._window('season', date(2024, 12, 31))[0], date(2024, 4, 1))
+
+    def test_season_starting_on_leap_day(self):
+        self._set_season_start('02-29')
+        for today, start in [
+            (date(2024, 2, 29), date(2024, 2, 29)),
+            (date(2024, 3, 1), date(2024, 2, 29)),
+            (date(2024, 2, 28), date(2023, 2, 28)),
+            (date(2023, 2, 28), date(2023, 2, 28)),
+            (date(2023, 3, 1), date(2023, 2, 28)),
+            (date(2025, 2, 27), date(2024, 2, 29)),
+        ]:
+            self.assertEqual(self._window('season', today)[0], start, f"season of {today}")
+
+    def test_invalid_season_start(self):
+        for season_start in ('13-01', '02-30', 'april', '04'):
+            self._set_season_start(season_start)
+            with self.assertRaises(UserError, msg=season_start):
+                self._window('season', date(2024, 5, 15))
+
+    def test_custom(self):
+        today = date(2024, 5, 15)
+        self.assertEqual(self._window('custom', today, '2024-01-10', '2024-02-20'),
+                         (date(2024, 1, 10), date(2024, 2, 21)))
+        self.assertEqual(self._window('custom', today, '2024-01-10', '2024-01-10'),
+                         (date(2024, 1, 10), date(2024, 1, 11)))
+        with self.assertRaises(UserError):
+            self._window('custom', today, '2024-02-20', '2024-01-10')
+        with self.assertRaises(UserError):
+            self._window('custom', today, '2024-01-10', None)
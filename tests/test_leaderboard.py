@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date
+
+from odoo import fields
+from odoo.tests import TransactionCase, new_test_user, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestLeaderboard(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user_1 = new_test_user(cls.env, login='leaderboard_user_1', groups='sales_team.group_sale_salesman')
+        cls.user_2 = new_test_user(cls.env, login='leaderboard_user_2', groups='sales_team.group_sale_salesman')
+        cls.open_stage = cls.env['crm.stage'].create({'name': 'Leaderboard Open', 'sequence': 1})
+        cls.won_stage = cls.env['crm.stage'].create({'name': 'Leaderboard Won', 'sequence': 2, 'is_won': True})
+        cls.Leaderboard = cls.env['crm.leaderboard.month'].sudo()
+        cls.Lead = cls.env['crm.lead'].with_context(mail_create_nolog=True, mail_activity_automation_skip=True)
+        cls.month = fields.Datetime.now().date().replace(day=1)
+
+    def _won_counts(self, month=None):
+        users = self.user_1 | self.user_2
+        return {
+            row['user_id']: row['won_count']
+            for row in self.Leaderboard._read_month(month or self.month)
+            if row['user_id'] in users.ids
+        }
+
+    def _create_leads(self, user, count=1):
+        return self.Lead.create([
+            {'name': f'Leaderboard {index}', 'user_id': user.id, 'stage_id': self.open_stage.id}
+            for index in range(count)
+        ])
+
+    def test_won_and_unwon(self):
+        leads = self._create_leads(self.user_1, 2)
+        self.assertEqual(self._won_counts(), {})
+
+        leads.write({'stage_id': self.won_stage.id})
+        self.assertEqual(self._won_counts(), {self.user_1.id: 2})
+
+        leads[0].write({'stage_id': self.open_stage.id})
+        self.assertEqual(self._won_counts(), {self.user_1.id: 1})
+
+        leads[1].write({'stage_id': self.open_stage.id})
+        self.assertEqual(self._won_counts(), {})
+        self.assertFalse(self.Leaderboard.search([('user_id', '=', self.user_1.id)]))
+
+    def test_reassign_won_lead(self):
+        lead = self._create_leads(self.user_1)
+        lead.write({'stage_id': self.won_stage.id})
+        lead.write({'user_id': self.user_2.id})
+        self.assertEqual(self._won_counts(), {self.user_2.id: 1})
+
+        lead.write({'user_id': False})
+        self.assertEqual(self._won_counts(), {})
+
+    def test_archive_and_unlink(self):
+        leads = self._create_leads(self.user_1, 2)
+        leads.write({'stage_id': self.won_stage.id})
+
+        leads[0].action_archive()
+        self.assertEqual(self._won_counts(), {self.user_1.id: 1})
+
+        leads[1].unlink()
+        self.assertEqual(self._won_counts(), {})
+
+    def test_stage_won_flag_rebuilds(self):
+        leads = self._create_leads(self.user_1, 2)
+        leads.write({'stage_id': self.won_stage.id})
+
+        self.won_stage.write({'is_won': False})
+        self.assertEqual(self._won_counts(), {})
+        self.won_stage.write({'is_won': True})
+        self.assertEqual(self._won_counts(), {self.user_1.id: 2})
+
+    def test_incremental_matches_rebuild(self):
+        leads = self._create_leads(self.user_1, 3) | self._create_leads(self.user_2, 2)
+        leads.write({'stage_id': self.won_stage.id})
+        leads[0].write({'user_id': self.user_2.id})
+        leads[3].write({'stage_id': self.open_stage.id})
+        leads[4].unlink()
+
+        def read_rows():
+            self.Leaderboard.flush_model()
+            self.env.cr.execute("""
+                SELECT user_id, month, won_count, closure_days, closure_count
+                FROM crm_leaderboard_month WHERE user_id IN %s ORDER BY user_id, month
+            """, [(self.user_1.id, self.user_2.id)])
+            return self.env.cr.fetchall()
+        incremental = read_rows()
+        self.Leaderboard._rebuild_leaderboard()
+        self.assertEqual(read_rows(), incremental)
+
+    def test_apply_contributions(self):
+        month = date(2020, 1, 1)
+        self.Leaderboard._apply_contributions([], [
+            (self.user_1.id, month, 2, 10.0, 2),
+            (self.user_2.id, month, 1, 0.0, 0),
+        ])
+        # the deltas of a user are merged, and emptied rows are dropped
+        self.Leaderboard._apply_contributions(
+            [(self.user_1.id, month, 1, 4.0, 1), (self.user_2.id, month, 1, 0.0, 0)],
+            [(self.user_1.id, month, 1, 6.0, 1)],
+        )
+        self.assertEqual(self._won_counts(month), {self.user_1.id: 2})
+        row = self.Leaderboard.search([('user_id', '=', self.user_1.id), ('month', '=', month)])
+        self.assertEqual((row.closure_days, row.closure_count), (12.0, 2))
+        self.assertFalse(self.Leaderboard.search([('user_id', '=', self.user_2.id), ('month', '=', month)]))
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+from unittest.mock import patch
+
+from odoo.exceptions import ValidationError
+from odoo.tests import TransactionCase, tagged
+
+from odoo.addons.institute_crm.models import crm_lead_institute
+from odoo.addons.institute_crm.models.crm_lead_institute import normalize_phone_key
+
+
+@tagged('post_install', '-at_install')
+class TestPhoneDuplicates(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Lead = cls.env['crm.lead'].with_context(mail_create_nolog=True, mail_activity_automation_skip=True)
+
+    def test_normalize_phone_key(self):
+        self.assertEqual(normalize_phone_key('+91 98765-43210'), '9876543210')
+        self.assertEqual(normalize_phone_key('0091 (987) 654 3210'), '9876543210')
+        self.assertEqual(normalize_phone_key('123 4567'), '1234567')
+        self.assertFalse(normalize_phone_key('12345'))
+        self.assertFalse(normalize_phone_key(''))
+        self.assertFalse(normalize_phone_key(False))
+
+    def test_phone_keys_follow_numbers(self):
+        lead = self.Lead.create({
+            'name': 'Inquiry',
+            'student_phone': '+91 98765 43210',
+            'alternative_phone': '98765-00000',
+        })
+        self.assertEqual(lead.phone, '+91 98765 43210')
+        self.assertEqual(lead.phone_key, '9876543210')
+        self.assertEqual(lead.student_phone_key, '9876543210')
+        self.assertEqual(lead.mobile_key, '9876500000')
+        self.assertEqual(lead.alternative_phone_key, '9876500000')
+
+        lead.write({'mobile': '12'})
+        self.assertFalse(lead.mobile_key)
+
+    def test_duplicate_blocks_create(self):
+        self.Lead.create({'name': 'Inquiry', 'student_name': 'Anu Joseph', 'phone': '9876543210'})
+        with self.assertRaises(ValidationError):
+            self.Lead.create({'name': 'Inquiry', 'student_name': ' anu joseph ', 'mobile': '+91 98765 43210'})
+
+    def test_same_phone_other_name_allowed(self):
+        self.Lead.create({'name': 'Inquiry', 'student_name': 'Anu Joseph', 'phone': '9876543210'})
+        lead = self.Lead.create({'name': 'Inquiry', 'student_name': 'Binu Joseph', 'phone': '9876543210'})
+        self.assertFalse(lead._get_phone_duplicates())
+
+    def test_duplicates_across_chunks(self):
+        existing = self.Lead.create({'name': 'Inquiry', 'student_name': 'Existing', 'phone': '9000000001'})
+        leads = self.Lead.with_context(skip_duplicate_check=True).create([
+            {'name': 'Inquiry', 'student_name': 'Chinnu', 'phone': '9000000002'},
+            {'name': 'Inquiry', 'student_name': 'Existing', 'mobile': '+91 90000 00001'},
+            {'name': 'Inquiry', 'student_name': 'Dev', 'phone': '9000000003'},
+            {'name': 'Inquiry', 'student_name': 'Chinnu', 'alternative_phone': '9000000002'},
+            {'name': 'Inquiry', 'student_name': 'Eva', 'phone': '9000000004'},
+        ])
+        # the batch duplicates of each other land in different chunks
+        with patch.object(crm_lead_institute, 'DUPLICATE_CHECK_BATCH_SIZE', 2):
+            duplicates = leads._get_phone_duplicates()
+        found = {record.id: dup_id for record, dup_id, dup_name, dup_type in duplicates}
+        self.assertEqual(found, {
+            leads[0].id: leads[3].id,
+            leads[1].id: existing.id,
+            leads[3].id: leads[0].id,
+        })
+
+    def test_inactive_leads_ignored(self):
+        archived = self.Lead.create({'name': 'Inquiry', 'student_name': 'Farah', 'phone': '9000000005'})
+        archived.action_archive()
+        lead = self.Lead.create({'name': 'Inquiry', 'student_name': 'Farah', 'phone': '9000000005'})
+        self.assertFalse(lead._get_phone_duplicates())
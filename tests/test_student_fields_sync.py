@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+from datetime import timedelta
+
+from odoo import fields
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestStudentFieldsSync(TransactionCase):
+    """action_sync_student_fields applies the corrections of the former
+    lead-by-lead loop, through the ORM"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        Partner = cls.env['res.partner']
+        cls.partner_d = Partner.create({'name': 'Sync Partner D'})
+        cls.partner_f = Partner.create({'name': 'Sync Partner F', 'phone': '9000000000'})
+        Lead = cls.env['crm.lead'].with_context(mail_activity_automation_skip=True)
+        cls.lead_a, cls.lead_b, cls.lead_c, cls.lead_d, cls.lead_e, cls.lead_f, cls.lead_g = Lead.create([
+            {'name': 'Sync A'},
+            {'name': 'Sync B'},
+            {'name': 'Sync C'},
+            {'name': 'Sync D', 'partner_id': cls.partner_d.id},
+            {'name': 'Sync E'},
+            {'name': 'Sync F', 'partner_id': cls.partner_f.id},
+            {'name': 'Sync G'},
+        ])
+        cls.leads = cls.lead_a | cls.lead_b | cls.lead_c | cls.lead_d | cls.lead_e | cls.lead_f | cls.lead_g
+        cls.env.flush_all()
+        # out of sync states, which the write of the leads would correct
+        cls.past = fields.Datetime.now() - timedelta(days=1)
+        for lead, values in [
+            (cls.lead_a, {'student_phone': '9876543210', 'phone': '9111111111'}),
+            (cls.lead_b, {'student_phone': None, 'phone': '9123456789'}),
+            (cls.lead_c, {'alternative_phone': '9222222222', 'mobile': '9333333333'}),
+            (cls.lead_d, {'student_name': None}),
+            (cls.lead_e, {'student_name': 'Sync Student E', 'contact_name': None}),
+            (cls.lead_f, {'student_name': 'Sync Student F', 'phone': '9444444444',
+                          'student_phone': '9444444444'}),
+            (cls.lead_g, {'student_name': 'Sync Student G', 'contact_name': 'Sync Student G',
+                          'phone': None, 'student_phone': None, 'mobile': None, 'alternative_phone': None}),
+        ]:
+            assignments = ', '.join('%s = %%s' % fname for fname in values)
+            cls.env.cr.execute("UPDATE crm_lead SET %s, write_date = %%s WHERE id = %%s" % assignments,
+                               list(values.values()) + [cls.past, lead.id])
+        cls.env.invalidate_all()
+
+    def test_sync(self):
+        self.leads.action_sync_student_fields()
+
+        self.assertEqual(self.lead_a.phone, '9876543210')
+        self.assertEqual(self.lead_b.student_phone, '9123456789')
+        self.assertEqual(self.lead_c.mobile, '9222222222')
+        self.assertEqual(self.lead_d.student_name, 'Sync Partner D')
+        self.assertEqual(self.lead_e.contact_name, 'Sync Student E')
+        self.assertEqual(self.partner_f.name, 'Sync Student F')
+        self.assertEqual(self.partner_f.phone, '9444444444')
+
+    def test_written_through_the_orm(self):
+        self.leads.action_sync_student_fields()
+
+        changed = self.leads - self.lead_f - self.lead_g
+        self.assertTrue(all(lead.write_date > self.past for lead in changed))
+        self.assertEqual(self.lead_g.write_date, self.past)
+        # a second run has nothing left to correct
+        self.leads.action_sync_student_fields()
+        self.assertFalse(self.leads._prepare_student_fields_corrections())
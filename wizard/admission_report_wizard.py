@@ -1,6 +1,17 @@
 # -*- coding: utf-8 -*-
 
-from odoo import models, fields, api
+from odoo import models, fields
+from odoo.exceptions import UserError
+from odoo.tools import SQL
+
+# Column used to sort the raw export of each report type
+EXPORT_ORDER = {
+    'college': 'admitted_campus, course, batch, date_closed',
+    'course': 'course, date_closed',
+    'source': 'source, date_closed',
+    'batch': 'batch, date_closed',
+    'officer': 'officer, date_closed',
+}
 
 class AdmissionReportWizard(models.TransientModel):
     _name = 'institute.admission.report.wizard'
@@ -16,23 +27,16 @@ class AdmissionReportWizard(models.TransientModel):
         ('officer', 'Admission Officer Wise Admission'),
         ('officer_detailed', 'Admission Officer Detailed Report'),
     ], string='Report Type', required=True, default='course')
+    export_format = fields.Selection([
+        ('csv', 'CSV'),
+        ('xlsx', 'Excel (XLSX)'),
+    ], string='Export Format', required=True, default='csv')
 
     def action_generate_report(self):
         self.ensure_one()
         
-        # Populate missing admitted_campus data for existing "Won/Admitted" records
-        if 'student.student' in self.env:
-            empty_campus_leads = self.env['crm.lead'].search([
-                ('admitted_campus', '=', False),
-                ('probability', '=', 100)
-            ])
-            if empty_campus_leads:
-                students = self.env['student.student'].search([
-                    ('lead_id', 'in', empty_campus_leads.ids)
-                ])
-                for student in students:
-                    if student.branch and student.lead_id:
-                        student.lead_id.admitted_campus = student.branch.name
+        # The admitted_campus of won leads is filled by the
+        # "Fill Admitted Campus" scheduled action (crm.lead._cron_fill_admitted_campus)
         
         # Filter for Admitted / Won leads within the date range
         domain = [
@@ -84,3 +88,120 @@ class AdmissionReportWizard(models.TransientModel):
                 'pivot_column_groupby': pivot_column_groupby, 
             }
         }
+
+    def action_export_report(self):
+        """Download the raw rows of the report as a CSV or XLSX file"""
+        self.ensure_one()
+        if self.report_type == 'officer_detailed' and 'student.student' not in self.env:
+            raise UserError("The Student Management module is required for this report.")
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f'/institute_crm/admission_report/export/{self.id}',
+            'target': 'self',
+        }
+
+    def _get_export_filename(self):
+        self.ensure_one()
+        return '%s_%s_%s.%s' % (
+            self.report_type, self.date_from, self.date_to, self.export_format)
+
+    def _get_name_sql(self, model_name, alias):
+        """SQL expression of the name of ``model_name`` records aliased ``alias``"""
+        if self.env[model_name]._fields['name'].translate:
+            lang = self.env.cr.mogrify('%s', [self.env.lang or 'en_US']).decode()
+            return "COALESCE(%s.name->>%s, %s.name->>'en_US')" % (alias, lang, alias)
+        return '%s.name' % alias
+
+    def _get_selection_subquery(self, model_name, domain):
+        """SQL selecting the ids of the ``model_name`` records matching
+        ``domain`` and the access rules of the user, for the export query to
+        filter on without loading the ids"""
+        Model = self.env[model_name]
+        query = Model._where_calc(domain)
+        Model._apply_ir_rules(query, 'read')
+        return query.subselect()
+
+    def _get_export_query(self):
+        """Return the column headers and the SQL query of the export.
+
+        The records are selected by the domain of the report and the access
+        rules, compiled into the query; its rows are then streamed by the
+        download route.
+        """
+        self.ensure_one()
+        if self.report_type == 'officer_detailed':
+            return self._get_officer_detailed_export_query()
+
+        Lead = self.env['crm.lead']
+        leads = self._get_selection_subquery('crm.lead', [
+            ('active', '=', True),
+            ('probability', '=', 100),
+            ('date_closed', '>=', self.date_from),
+            ('date_closed', '<=', self.date_to),
+        ])
+        batch_sql, batch_join = 'NULL', ''
+        if 'batch_id' in Lead._fields:
+            batch_model = Lead._fields['batch_id'].comodel_name
+            batch_sql = self._get_name_sql(batch_model, 'batch')
+            batch_join = 'LEFT JOIN %s batch ON batch.id = l.batch_id' % self.env[batch_model]._table
+        headers = ['Lead', 'Student Name', 'Admitted Campus', 'Course', 'Batch',
+                   'Source', 'Admission Officer', 'Closed On']
+        query = """
+            SELECT * FROM (
+                SELECT
+                    l.name AS lead,
+                    l.student_name,
+                    COALESCE(l.admitted_campus, 'Unknown Campus') AS admitted_campus,
+                    %s AS course,
+                    %s AS batch,
+                    %s AS source,
+                    officer.name AS officer,
+                    l.date_closed
+                FROM crm_lead l
+                LEFT JOIN product_product pp ON pp.id = l.course_interested
+                LEFT JOIN product_template pt ON pt.id = pp.product_tmpl_id
+                %s
+                LEFT JOIN utm_source src ON src.id = l.source_id
+                LEFT JOIN res_users u ON u.id = l.user_id
+                LEFT JOIN res_partner officer ON officer.id = u.partner_id
+                WHERE l.id IN (%%s)
+            ) export
+            ORDER BY %s
+        """ % (self._get_name_sql('product.template', 'pt'), batch_sql,
+               self._get_name_sql('utm.source', 'src'), batch_join, EXPORT_ORDER[self.report_type])
+        return headers, SQL(query, leads)
+
+    def _get_officer_detailed_export_query(self):
+        Student = self.env['student.student']
+        domain = [
+            ('enrollment_date', '>=', self.date_from),
+            ('enrollment_date', '<=', self.date_to),
+        ]
+        if hasattr(self, 'branch_id') and self.branch_id:
+            domain.append(('branch', '=', self.branch_id.id))
+        students = self._get_selection_subquery('student.student', domain)
+        course_model = Student._fields['course_id'].comodel_name
+        branch_model = Student._fields['branch'].comodel_name
+        headers = ['Admission Officer', 'Course', 'Amount Paid', 'Source',
+                   'College/Institute', 'Enrollment Date']
+        query = """
+            SELECT
+                COALESCE(officer.name, 'Unknown Officer') AS officer,
+                %s AS course,
+                s.paid_amount,
+                %s AS source,
+                %s AS campus,
+                s.enrollment_date
+            FROM %s s
+            LEFT JOIN %s course ON course.id = s.course_id
+            LEFT JOIN %s branch ON branch.id = s.branch
+            LEFT JOIN crm_lead l ON l.id = s.lead_id
+            LEFT JOIN utm_source src ON src.id = l.source_id
+            LEFT JOIN res_users u ON u.id = s.user_id
+            LEFT JOIN res_partner officer ON officer.id = u.partner_id
+            WHERE s.id IN (%%s)
+            ORDER BY officer.name, s.id
+        """ % (self._get_name_sql(course_model, 'course'), self._get_name_sql('utm.source', 'src'),
+               self._get_name_sql(branch_model, 'branch'),
+               Student._table, self.env[course_model]._table, self.env[branch_model]._table)
+        return headers, SQL(query, students)